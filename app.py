@@ -1,6 +1,9 @@
 """
 Aplicação Flask com estilo SAP Fiori
 Módulos: Embalagem, Shelf Life, Configurações
+
+create_app() monta a aplicação com o perfil de config.py. Desenvolvimento:
+``python app.py``. Produção: ``gunicorn -c gunicorn.conf.py wsgi:app``.
 """
 
 import sys
@@ -11,78 +14,146 @@ import os
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
-import os
+from flask import Flask, render_template, request, jsonify, send_file
 import logging
+import time
+
+from config import get_config
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
-
-# Configurações da aplicação
-app.config['DEBUG'] = True
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Criar diretório para exports
-os.makedirs('data', exist_ok=True)
-os.makedirs('static/exports', exist_ok=True)
-
-# Importar e registrar blueprints
-from routes.embalagem_routes import embalagem_bp
-app.register_blueprint(embalagem_bp)
-
-@app.route('/')
-def index():
-    """Página principal com cards dos módulos."""
-    return render_template('index.html', title='Dashboard Principal')
-
-@app.route('/embalagem')
-def embalagem():
-    """Módulo de Embalagem."""
-    return render_template('embalagem.html', title='Embalagem')
-
-@app.route('/shelf-life')
-def shelf_life():
-    """Módulo de Shelf Life."""
-    return render_template('shelf_life.html', title='Shelf Life')
-
-@app.route('/configuracoes')
-def configuracoes():
-    """Módulo de Configurações."""
-    return render_template('configuracoes.html', title='Configurações')
-
-@app.route('/api/theme', methods=['POST'])
-def toggle_theme():
-    """API endpoint para alternar tema."""
-    data = request.get_json()
-    theme = data.get('theme', 'light')
-    return jsonify({'theme': theme, 'status': 'success'})
-
-@app.route('/static/exports/<filename>')
-def download_export(filename):
-    """Endpoint para download de arquivos exportados"""
+# Templates compilados no warmup (o Jinja guarda o resultado em cache)
+WARMUP_TEMPLATES = ('base.html', 'index.html', 'embalagem.html', 'shelf_life.html', 'configuracoes.html')
+
+
+def create_app(config_name: str = None) -> Flask:
+    """Cria a aplicação com o perfil ``config_name`` (padrão: APP_ENV)"""
+    config = get_config(config_name)
+    app = Flask(__name__)
+    app.config.from_object(config)
+    if not app.config['DEBUG'] and app.config['SECRET_KEY'] == 'dev-key-change-in-production':
+        logging.warning("SECRET_KEY não definida: usando a chave de desenvolvimento")
+
+    # Criar diretório para exports
+    os.makedirs('data', exist_ok=True)
+    os.makedirs('static/exports', exist_ok=True)
+
+    # Importar e registrar blueprints
+    from routes.embalagem_routes import embalagem_bp
+    from routes.jobs_routes import jobs_bp
+    from routes.metrics_routes import metrics_bp
+    from services.export_store import export_store
+    app.register_blueprint(embalagem_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(metrics_bp)
+
+    @app.route('/')
+    def index():
+        """Página principal com cards dos módulos."""
+        return render_template('index.html', title='Dashboard Principal')
+
+    @app.route('/embalagem')
+    def embalagem():
+        """Módulo de Embalagem."""
+        return render_template('embalagem.html', title='Embalagem')
+
+    @app.route('/shelf-life')
+    def shelf_life():
+        """Módulo de Shelf Life."""
+        return render_template('shelf_life.html', title='Shelf Life')
+
+    @app.route('/configuracoes')
+    def configuracoes():
+        """Módulo de Configurações."""
+        return render_template('configuracoes.html', title='Configurações')
+
+    @app.route('/api/theme', methods=['POST'])
+    def toggle_theme():
+        """API endpoint para alternar tema."""
+        data = request.get_json()
+        theme = data.get('theme', 'light')
+        return jsonify({'theme': theme, 'status': 'success'})
+
+    @app.route('/static/exports/<filename>')
+    def download_export(filename):
+        """Endpoint para download de arquivos exportados (apenas os do índice do armazém)"""
+        path = export_store.resolve(filename)
+        if path is None:
+            return jsonify({'error': 'Arquivo não encontrado'}), 404
+        # .csv.gz seria enviado como text/csv; o arquivo é o gzip em si
+        mimetype = 'application/gzip' if filename.endswith('.gz') else None
+        return send_file(path, as_attachment=True, download_name=filename, mimetype=mimetype)
+
+    @app.errorhandler(404)
+    def not_found_error(error):
+        """Página de erro 404."""
+        return render_template('base.html', title='Página não encontrada'), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        """Página de erro 500."""
+        return render_template('base.html', title='Erro interno'), 500
+
+    @app.errorhandler(413)
+    def file_too_large(error):
+        """Arquivo muito grande."""
+        max_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        return jsonify({'success': False, 'error': f'Arquivo muito grande. Máximo {max_mb}MB'}), 413
+
+    return app
+
+
+def warmup(app: Flask):
+    """
+    Prepara um worker antes do primeiro pedido: compila os templates, abre
+    uma conexão do pool, detecta os índices FULLTEXT e carrega as
+    estatísticas do dashboard. Com PRELOAD_HEAVY_MODULES também importa
+    pandas/pyarrow (no gunicorn já vêm importados do mestre). Roda em cada
+    worker depois do fork (gunicorn.conf.py, post_worker_init); no processo
+    mestre as conexões abertas seriam herdadas pelos workers. Falhas não
+    impedem a subida.
+    """
+    from database import db
+    from services.embalagem_service import embalagem_service
+    from utils.lazy_imports import preload_heavy_modules
+
+    started = time.perf_counter()
     try:
-        return send_from_directory('data', filename, as_attachment=True)
-    except FileNotFoundError:
-        return jsonify({'error': 'Arquivo não encontrado'}), 404
-
-@app.errorhandler(404)
-def not_found_error(error):
-    """Página de erro 404."""
-    return render_template('base.html', title='Página não encontrada'), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    """Página de erro 500."""
-    return render_template('base.html', title='Erro interno'), 500
-
-@app.errorhandler(413)
-def file_too_large(error):
-    """Arquivo muito grande."""
-    return jsonify({'success': False, 'error': 'Arquivo muito grande. Máximo 16MB'}), 413
+        if app.config['PRELOAD_HEAVY_MODULES']:
+            preload_heavy_modules()
+        for template in WARMUP_TEMPLATES:
+            app.jinja_env.get_template(template)
+        if db.connect():
+            embalagem_service.fulltext_columns()
+            embalagem_service.get_dashboard_stats()
+    except Exception as e:
+        logging.error(f"Erro no warmup: {e}")
+    logging.info(f"Warmup do worker {os.getpid()} em {time.perf_counter() - started:.2f}s")
+
+
+def reset_after_fork():
+    """
+    Chamado em cada worker logo após o fork (gunicorn.conf.py, post_fork):
+    descarta pools de conexão, executores e conexões SQLite que o processo
+    mestre tenha criado, para que cada worker abra os seus.
+    """
+    from database import db
+    from services.embalagem_service import embalagem_service
+    from services.export_store import export_store
+    from services.job_manager import job_manager
+    from utils.upload_handler import upload_handler
+
+    db.reset_after_fork()
+    upload_handler.reset_after_fork()
+    job_manager.reset_after_fork()
+    embalagem_service.dedupe_index.reset_after_fork()
+    export_store.reset_after_fork()
+
+
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if app.config['PRELOAD_HEAVY_MODULES']:
+        warmup(app)
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=int(os.environ.get('PORT', '5000')))
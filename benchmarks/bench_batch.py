@@ -0,0 +1,118 @@
+"""
+Benchmark do lote colunar (EmbalagemBatch) x lista de tuplas por linha
+
+Mede, por 100 mil linhas, a memória retida e o pico (tracemalloc) e o tempo
+de cada etapa do upload sem banco: conversão do DataFrame, chaves de
+duplicidade + filtro e montagem dos parâmetros dos INSERTs em blocos.
+
+Uso:
+    python -m benchmarks.bench_batch --rows 200000
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from itertools import chain, repeat
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import WORKBOOK_COLUMNS, generate_records
+from utils.upload_handler import UploadHandler
+
+CHUNK_SIZE = 1000
+
+
+def build_dataframe(rows: int) -> pd.DataFrame:
+    """DataFrame equivalente ao lido da planilha (textos como object)"""
+    records = [record[:len(WORKBOOK_COLUMNS)] for record in generate_records(rows, seed=7, status='Pendente')]
+    return pd.DataFrame.from_records(records, columns=WORKBOOK_COLUMNS)
+
+
+def legacy_rows(df: pd.DataFrame) -> list:
+    """Montagem anterior: uma tupla de TempEmbalagem.to_tuple() por linha"""
+    handler = UploadHandler()
+    strings = {col: df[col].astype(str).str.strip() for col in handler.string_columns}
+    numeric = {col: pd.to_numeric(df[col], errors='coerce').fillna(0.0).astype(float)
+               for col in handler.numeric_columns}
+    ean = df['EAN'].astype(object).where(df['EAN'].notna(), None)
+    return list(zip(
+        *(strings[col].tolist() for col in ('Loja', 'Remessa', 'Local', 'Ordem', 'Posicao_Deposito',
+                                            'Codigo', 'Descricao_Produto', 'UM')),
+        *(numeric[col].tolist() for col in handler.numeric_columns),
+        ean.tolist(), repeat('Pendente'), repeat(None)
+    ))
+
+
+def legacy_unique_key(row: tuple) -> str:
+    """Chave de duplicidade a partir de uma tupla de TempEmbalagem.to_tuple() (caminho anterior)"""
+    return f"{row[1]}+{row[0]}+{row[5]}+{row[8]}"
+
+
+def legacy_pipeline(rows: list) -> int:
+    keys = [legacy_unique_key(row) for row in rows]
+    valid = [row for row, key in zip(rows, keys) if key]
+    params = 0
+    for start in range(0, len(valid), CHUNK_SIZE):
+        params += len(list(chain.from_iterable(valid[start:start + CHUNK_SIZE])))
+    return params
+
+
+def batch_pipeline(batch) -> int:
+    keys = batch.unique_keys()
+    indices = [i for i, key in enumerate(keys) if key]
+    valid = batch if len(indices) == len(batch) else batch.take(indices)
+    params = 0
+    for chunk in valid.iter_chunks(CHUNK_SIZE):
+        params += len(list(chain.from_iterable(chunk)))
+    return params
+
+
+def _measure(func):
+    """(segundos, bytes retidos pelo resultado, pico de memória, resultado)
+
+    O tempo vem de uma execução sem tracemalloc, que distorce as medições."""
+    gc.collect()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, retained, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    df = build_dataframe(args.rows)
+    handler = UploadHandler()
+    scale = 100_000 / args.rows
+
+    legacy_time, legacy_mem, legacy_peak, rows = _measure(lambda: legacy_rows(df.copy()))
+    batch_time, batch_mem, batch_peak, (batch, _) = _measure(lambda: handler.dataframe_to_batch(df.copy()))
+    legacy_rest, _, legacy_rest_peak, legacy_params = _measure(lambda: legacy_pipeline(rows))
+    batch_rest, _, batch_rest_peak, batch_params = _measure(lambda: batch_pipeline(batch))
+
+    mb = 1024 * 1024
+    print(f"linhas: {args.rows}  (valores por 100 mil linhas; resultados idênticos: "
+          f"{rows == batch.to_tuples() and legacy_params == batch_params})")
+    print(f"{'':<22} {'tuplas':>12} {'lote':>12}")
+    print(f"{'conversão (s)':<22} {legacy_time * scale:>12.3f} {batch_time * scale:>12.3f}")
+    print(f"{'memória retida (MB)':<22} {legacy_mem * scale / mb:>12.1f} {batch_mem * scale / mb:>12.1f}")
+    print(f"{'pico na conversão (MB)':<22} {legacy_peak * scale / mb:>12.1f} {batch_peak * scale / mb:>12.1f}")
+    print(f"{'chaves + INSERT (s)':<22} {legacy_rest * scale:>12.3f} {batch_rest * scale:>12.3f}")
+    print(f"{'pico chaves+INSERT (MB)':<22} {legacy_rest_peak * scale / mb:>12.1f} {batch_rest_peak * scale / mb:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
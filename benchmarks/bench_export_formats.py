@@ -0,0 +1,81 @@
+"""
+Benchmark dos formatos de exportação: xlsx x CSV x CSV gzip x Parquet
+
+Grava os mesmos itens com os writers de services/export_engine.py, em lotes
+do tamanho dos lidos do banco e com os tipos que o driver do MySQL devolve
+(Decimal nas quantidades, datetime no registro). Mede tempo de geração e
+tamanho do arquivo; não precisa de banco.
+
+Uso:
+    python -m benchmarks.bench_export_formats --rows 200000
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import iter_records
+from services.embalagem_service import EXPORT_COLUMN_TYPES
+from services.export_engine import EXPORT_CHUNK_SIZE, EXPORT_EXTENSIONS, open_writer
+
+# Colunas da exportação filtrada (EmbalagemService._export_query)
+EXPORT_COLUMNS = (
+    'ID', 'Loja', 'Remessa', 'Local', 'Ordem', 'Posição Depósito', 'Código', 'Descrição Produto', 'UM',
+    'Qtde Embalagem', 'Qtde Caixa', 'Qtde UM', 'Estoque', 'EAN', 'Status', 'Usuário', 'Data Registro',
+    'Total Pallets'
+)
+
+
+def iter_export_batches(rows: int):
+    """Lotes de linhas como o cursor devolve para a query de exportação"""
+    started = datetime.datetime(2025, 1, 1, 6, 0, 0)
+    row_id = 0
+    for chunk in iter_records(rows, chunk_size=EXPORT_CHUNK_SIZE):
+        batch = []
+        for record in chunk:
+            row_id += 1
+            batch.append(
+                (row_id,) + record[:8]
+                + tuple(Decimal(f"{value:.3f}") for value in record[8:12])
+                + record[12:15]
+                + (started + datetime.timedelta(seconds=row_id // 10), None if row_id % 7 else row_id % 30)
+            )
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--formats', nargs='+', default=list(EXPORT_EXTENSIONS), choices=list(EXPORT_EXTENSIONS))
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    batches = list(iter_export_batches(args.rows))
+    workdir = tempfile.TemporaryDirectory(prefix='bench_export_')
+
+    print(f"{args.rows} linhas")
+    print(f"{'formato':<10} {'tempo':>9} {'linhas/s':>12} {'arquivo':>10} {'x tempo':>8} {'x tamanho':>10}")
+    baseline = None
+    for export_format in args.formats:
+        path = os.path.join(workdir.name, f"exportacao.{EXPORT_EXTENSIONS[export_format]}")
+        started = time.perf_counter()
+        writer = open_writer(export_format, path, column_types=EXPORT_COLUMN_TYPES)
+        writer.write_header(EXPORT_COLUMNS)
+        for batch in batches:
+            writer.write_rows(batch)
+        writer.close()
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(path)
+        baseline = baseline or (elapsed, size)
+        print(f"{export_format:<10} {elapsed:>8.2f}s {args.rows / elapsed:>12,.0f} {size / (1024 * 1024):>8.1f}MB "
+              f"{baseline[0] / elapsed:>7.1f}x {baseline[1] / size:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark do faturamento: NOT IN + listas IN montadas em string (legado)
+x resumo por remessa + tabela temporária em uma única transação
+
+Precisa de um banco MySQL de teste: a tabela temp_embalagem desse banco é
+APAGADA e repovoada com dados sintéticos a cada execução. Preparação:
+    CREATE TABLE embalagem_bench.temp_embalagem LIKE embalagem.temp_embalagem;
+    MYSQL_DB=embalagem_bench python migrations/migrate.py
+
+Uso:
+    python -m benchmarks.bench_faturamento --database embalagem_bench --remessas 2000 --itens 25
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True,
+                        help='banco de teste (a tabela temp_embalagem dele é apagada)')
+    parser.add_argument('--remessas', type=int, default=2000)
+    parser.add_argument('--itens', type=int, default=25, help='itens por remessa')
+    parser.add_argument('--incompletas', type=float, default=0.3,
+                        help='fração de remessas com algum item ainda pendente')
+    parser.add_argument('--repeat', type=int, default=3)
+    return parser.parse_args()
+
+
+def build_records(remessas: int, itens: int, seed: int = 42) -> list:
+    """Gera os itens sintéticos no formato de TempEmbalagem.to_tuple()"""
+    from models.embalagem import TempEmbalagem
+
+    rng = random.Random(seed)
+    records = []
+    for r in range(remessas):
+        remessa = str(83344000 + r)
+        loja = f"F{rng.randint(1, 60):03d}"
+        for i in range(itens):
+            records.append(TempEmbalagem(
+                Loja=loja, Remessa=remessa, Local=f"L{rng.randint(1, 20):02d}",
+                Ordem=str(rng.randint(100000, 999999)), Posicao_Deposito=f"{rng.randint(1, 40):02d}-{i:02d}",
+                Codigo=str(100000 + i), Descricao_Produto=f"PRODUTO SINTETICO {i}", UM='UN',
+                Qtde_Emb=float(rng.randint(0, 50)), Qtde_CX=1.0, Qtde_UM=1.0,
+                Estoque=float(rng.randint(0, 1000)), EAN=None
+            ).to_tuple())
+    return records
+
+
+def populate(args):
+    """Recria os dados: todas as remessas finalizadas, exceto as incompletas"""
+    from database import db
+    from services.embalagem_service import embalagem_service
+    from services.remessa_resumo import remessa_resumo
+
+    db.execute_query("DELETE FROM temp_embalagem")
+
+    result = embalagem_service.insert_batch_records(build_records(args.remessas, args.itens))
+    if not result['success']:
+        raise SystemExit(f"Falha ao popular a tabela: {result.get('error')}")
+
+    incompletas = int(args.remessas * args.incompletas)
+    db.execute_query("UPDATE temp_embalagem SET Status = 'Finalizado'")
+    db.execute_query(
+        "UPDATE temp_embalagem SET Status = 'Pendente' WHERE Codigo = '100000' AND Remessa < %s",
+        (str(83344000 + incompletas),)
+    )
+    remessa_resumo.rebuild()
+    return result['inserted']
+
+
+def reset_faturados():
+    from database import db
+    db.execute_query("UPDATE temp_embalagem SET Status = 'Finalizado' WHERE Status = 'Faturado'")
+
+
+def legacy_faturamento(usuario: str, filepath: str) -> int:
+    """Reprodução do faturamento anterior (referência)"""
+    import pandas as pd
+    from database import db
+
+    remessas_completas = db.execute_query("""
+        SELECT DISTINCT Remessa, Loja
+        FROM temp_embalagem
+        WHERE Remessa NOT IN (
+            SELECT DISTINCT Remessa
+            FROM temp_embalagem
+            WHERE Status != 'Finalizado'
+        )
+        AND Status = 'Finalizado'
+    """)
+    if not remessas_completas:
+        return 0
+    remessas_in_clause = ','.join(f"'{row['Remessa']}'" for row in remessas_completas)
+
+    export_data = db.execute_query(f"""
+        SELECT Remessa, Loja, Codigo, Descricao_Produto, UM, Qtde_Emb as Atendido, Usuario,
+               COALESCE(Total_Pallets, 0) as Total_Pallets
+        FROM temp_embalagem
+        WHERE Remessa IN ({remessas_in_clause})
+        AND Status = 'Finalizado'
+        ORDER BY Remessa, Loja, Codigo
+    """)
+    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+        pd.DataFrame(export_data).to_excel(writer, sheet_name='Faturamento', index=False)
+
+    db.execute_query(f"""
+        UPDATE temp_embalagem
+        SET Status = 'Faturado', Usuario = %s
+        WHERE Remessa IN ({remessas_in_clause})
+        AND Status = 'Finalizado'
+    """, (usuario,))
+    return len(export_data)
+
+
+def current_faturamento(usuario: str) -> int:
+    from services.embalagem_service import embalagem_service
+
+    result = embalagem_service.export_faturamento(usuario)
+    if not result['success']:
+        raise SystemExit(f"Faturamento falhou: {result.get('error')}")
+    os.remove(os.path.join('data', result['filename']))
+    return result['total_records']
+
+
+def _timed(func, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        reset_faturados()
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    args = parse_args()
+    # Antes de importar database: o banco vem da linha de comando, não do .env
+    os.environ['MYSQL_DB'] = args.database
+    logging.disable(logging.WARNING)
+
+    inserted = populate(args)
+    filepath = os.path.join(tempfile.mkdtemp(), 'faturamento_legado.xlsx')
+
+    legacy_time, legacy_rows = _timed(lambda: legacy_faturamento('bench', filepath), args.repeat)
+    current_time, current_rows = _timed(lambda: current_faturamento('bench'), args.repeat)
+    reset_faturados()
+
+    print(f"itens: {inserted}  remessas: {args.remessas}  incompletas: {int(args.remessas * args.incompletas)}")
+    print(f"NOT IN + IN em string (legado): {legacy_time:.3f}s")
+    print(f"resumo + tabela temporária:     {current_time:.3f}s")
+    print(f"ganho: {legacy_time / current_time:.1f}x  "
+          f"(itens faturados: legado {legacy_rows}, atual {current_rows})")
+
+
+if __name__ == '__main__':
+    main()
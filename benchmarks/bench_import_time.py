@@ -0,0 +1,102 @@
+"""
+Tempo de inicialização: importação adiada x pré-carregada das bibliotecas
+pesadas (pandas, numpy, openpyxl, pyarrow; ver utils/lazy_imports.py)
+
+Cada medição roda em um processo novo (como um worker recém-criado ou
+reciclado) e informa o tempo de ``import app``, o tempo até a primeira
+resposta de ``/`` e o tempo do primeiro parse de um CSV pequeno, que é onde
+a importação adiada passa a ser paga. Em seguida, o relatório do
+``python -X importtime`` lista os módulos mais caros de ``import app``.
+
+Uso:
+    python -m benchmarks.bench_import_time --repeat 5 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# adiado: padrão do desenvolvimento; pré-carregado: o que o mestre do gunicorn faz
+MODES = {'adiado': '0', 'pré-carregado': '1'}
+
+
+def run_child(path: str):
+    """Executado no processo filho: importação, primeira resposta e primeiro parse"""
+    import logging
+
+    started = time.perf_counter()
+    from app import app
+    from utils.lazy_imports import preload_heavy_modules
+    from utils.upload_handler import upload_handler
+
+    logging.disable(logging.WARNING)
+    if app.config['PRELOAD_HEAVY_MODULES']:
+        preload_heavy_modules()
+    imported = time.perf_counter()
+    app.test_client().get('/')
+    first_response = time.perf_counter()
+    upload_handler.parse_file(path)
+    first_parse = time.perf_counter()
+    print(f"{imported - started:.4f} {first_response - started:.4f} {first_parse - first_response:.4f}")
+
+
+def import_report(top: int):
+    """Módulos com maior tempo acumulado em ``import app`` (-X importtime)"""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            capture_output=True, text=True, check=True, cwd=ROOT,
+                            env={**os.environ, 'PRELOAD_HEAVY_MODULES': '0'}).stderr
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        head, cumulative_us, name = line.split('|')
+        self_us = int(head.split(':')[1])
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(cumulative_us), self_us, depth, name.strip()))
+    total = next(cumulative for cumulative, _, _, name in entries if name == 'app')
+    print(f"\nimport app: {total / 1000:.0f} ms; {top} módulos mais caros (acumulado, ms):")
+    for cumulative, self_us, depth, name in sorted(entries, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:>8.1f} {self_us / 1000:>8.1f}  {'  ' * depth}{name}")
+    heavy = [name for *_, name in entries if name.split('.')[0] in ('pandas', 'numpy', 'pyarrow', 'openpyxl')]
+    print(f"Bibliotecas pesadas importadas por 'import app': {len(heavy)} módulos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='processos por modo (mediana)')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--child', metavar='ARQUIVO', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    from benchmarks.generator import write_csv
+
+    print(f"{'modo':<14} {'import app s':>13} {'1ª resposta s':>14} {'1º parse s':>11}")
+    with tempfile.TemporaryDirectory(prefix='bench_import_') as workdir:
+        path = os.path.join(workdir, 'itens.csv')
+        write_csv(path, 1000)
+        for mode, preload in MODES.items():
+            samples = []
+            for _ in range(args.repeat):
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_import_time', '--child', path],
+                    capture_output=True, text=True, check=True, cwd=ROOT,
+                    env={**os.environ, 'PRELOAD_HEAVY_MODULES': preload}
+                ).stdout.split()
+                samples.append([float(value) for value in output])
+            medians = [statistics.median(column) for column in zip(*samples)]
+            print(f"{mode:<14} {medians[0]:>13.3f} {medians[1]:>14.3f} {medians[2]:>11.3f}")
+    import_report(args.top)
+
+
+if __name__ == '__main__':
+    main()
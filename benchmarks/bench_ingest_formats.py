@@ -0,0 +1,85 @@
+"""
+Benchmark do parse de upload por formato: xlsx x CSV x Parquet
+
+Os mesmos itens são gravados em cada formato e lidos pelo UploadHandler
+(leitura, validação e lote colunar). O CSV é medido com o leitor do Arrow e
+com o pd.read_csv usado quando o pyarrow não está instalado.
+
+Uso:
+    python -m benchmarks.bench_ingest_formats --rows 100000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import write_csv, write_parquet, write_workbook
+from utils import file_readers
+from utils.upload_handler import UploadHandler
+
+
+def _best_of(fn, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3, help='execuções por formato (vale a melhor)')
+    parser.add_argument('--skip-xlsx', action='store_true', help='não medir o xlsx (o mais lento)')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    handler = UploadHandler()
+    workdir = tempfile.TemporaryDirectory(prefix='bench_formatos_')
+    paths = {
+        'csv': os.path.join(workdir.name, 'itens.csv'),
+        'parquet': os.path.join(workdir.name, 'itens.parquet'),
+    }
+    write_csv(paths['csv'], args.rows)
+    write_parquet(paths['parquet'], args.rows)
+
+    cases = []
+    if not args.skip_xlsx:
+        paths['xlsx'] = os.path.join(workdir.name, 'itens.xlsx')
+        write_workbook(paths['xlsx'], args.rows)
+        cases.append(('xlsx (openpyxl)', 'xlsx', lambda: handler.parse_file(paths['xlsx'])))
+    csv_pandas = file_readers.CsvFileReader(use_arrow=False)
+    cases += [
+        ('csv (pandas)', 'csv', lambda: handler.parse_chunks(
+            csv_pandas.read_chunks(paths['csv'], handler.chunk_rows, handler.numeric_columns))),
+        ('csv (arrow)', 'csv', lambda: handler.parse_file(paths['csv'])),
+        ('parquet (arrow)', 'parquet', lambda: handler.parse_file(paths['parquet'])),
+    ]
+
+    print(f"{args.rows} linhas")
+    print(f"{'formato':<18} {'arquivo':>10} {'tempo':>9} {'linhas/s':>12} {'x':>7}")
+    baseline = None
+    reference = None
+    for label, file_format, parse in cases:
+        repeat = 1 if file_format == 'xlsx' else args.repeat
+        elapsed, (batch, _) = _best_of(parse, repeat)
+        # Todos os formatos têm de chegar ao mesmo lote
+        rows = batch.to_tuples()
+        if reference is None:
+            reference = rows
+        elif rows != reference:
+            raise SystemExit(f"{label}: registros diferentes do primeiro formato")
+        baseline = baseline or elapsed
+        size_mb = os.path.getsize(paths[file_format]) / (1024 * 1024)
+        print(f"{label:<18} {size_mb:>8.1f}MB {elapsed:>8.2f}s {len(batch) / elapsed:>12,.0f} {baseline / elapsed:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark do parse de várias planilhas: sequencial x pool de processos
+
+Uso:
+    python -m benchmarks.bench_multi_upload --files 8 --rows 20000 --workers 1 2 4
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import FIRST_REMESSA, write_workbook
+from utils.upload_handler import UploadHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=20000, help='linhas por planilha')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    workdir = tempfile.TemporaryDirectory(prefix='bench_upload_')
+    workbooks = []
+    for i in range(args.files):
+        path = os.path.join(workdir.name, f'planilha_{i}.xlsx')
+        write_workbook(path, args.rows, seed=i, first_remessa=FIRST_REMESSA + i * args.rows)
+        workbooks.append((os.path.basename(path), path))
+    total_rows = args.files * args.rows
+    print(f"{args.files} planilhas x {args.rows} linhas (CPUs: {os.cpu_count()})")
+
+    baseline = None
+    for workers in args.workers:
+        handler = UploadHandler(parse_workers=workers)
+        if workers > 1:
+            handler.parse_many(workbooks[:workers])  # sobe os processos (o spawn importa o pandas)
+        started = time.perf_counter()
+        results = handler.parse_many(workbooks)
+        elapsed = time.perf_counter() - started
+        parsed = sum(len(result[0]) for result in results if result)
+        baseline = baseline or elapsed
+        print(f"workers={workers:<3} {elapsed:8.2f}s  {total_rows / elapsed:10,.0f} linhas/s  "
+              f"{baseline / elapsed:5.2f}x  ({parsed} registros)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Vazão HTTP: servidor de desenvolvimento (python app.py) x gunicorn
+(gunicorn.conf.py, wsgi:app)
+
+Sobe cada servidor em um processo separado, dispara pedidos de várias
+threads com conexões persistentes durante alguns segundos e mede pedidos por
+segundo e latência. As rotas padrão não dependem do banco (páginas
+renderizadas e arquivo estático); com um banco configurado, inclua rotas da
+API em --paths.
+
+Uso:
+    python -m benchmarks.bench_serving --concurrency 16 --seconds 10
+    python -m benchmarks.bench_serving --paths /embalagem /api/embalagem/stats
+"""
+import argparse
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'dev': lambda port: ([sys.executable, 'app.py'], {'PORT': str(port), 'APP_ENV': 'development'}),
+    # Sem reciclagem de workers na medição: o reinício derruba as conexões persistentes
+    'gunicorn': lambda port: ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                              {'GUNICORN_BIND': f'127.0.0.1:{port}', 'GUNICORN_MAX_REQUESTS': '0'}),
+}
+
+
+def wait_ready(port: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Servidor não respondeu na porta {port}")
+
+
+def load(port: int, paths, concurrency: int, seconds: float):
+    """Pedidos em laço por ``seconds``; devolve (latências, erros)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(offset: int):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        i = offset
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    errors[0] += 1
+                local.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument('--paths', nargs='+', default=['/embalagem', '/', '/static/js/embalagem.js'])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    print(f"{args.concurrency} clientes, {args.seconds:.0f}s, rotas: {' '.join(args.paths)} (CPUs: {os.cpu_count()})")
+    print(f"{'servidor':<10} {'pedidos/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6}")
+    for name in args.servers:
+        command, env = SERVERS[name](args.port)
+        process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env},
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   start_new_session=True)
+        try:
+            wait_ready(args.port)
+            load(args.port, args.paths, args.concurrency, 1.0)  # aquecimento
+            latencies, errors = load(args.port, args.paths, args.concurrency, args.seconds)
+        finally:
+            # O servidor de desenvolvimento tem o processo do reloader: encerra o grupo todo
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        print(f"{name:<10} {len(latencies) / args.seconds:>10,.0f} {statistics.median(latencies) * 1000:>8.1f} "
+              f"{p99 * 1000:>8.1f} {errors:>6}")
+
+
+if __name__ == '__main__':
+    main()
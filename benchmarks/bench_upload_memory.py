@@ -0,0 +1,84 @@
+"""
+Pico de memória do parse de uma planilha: leitura inteira x streaming
+
+Cada medição roda em um processo novo e informa o aumento do pico de
+memória residente (ru_maxrss) causado pelo parse, que inclui as alocações
+em C (lxml, pandas) que o tracemalloc não enxerga.
+
+Uso:
+    python -m benchmarks.bench_upload_memory --rows 20000 100000 200000 --chunk-rows 20000
+"""
+import argparse
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ('inteira', 'streaming')
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss é em KB no Linux (em bytes no macOS)
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_child(mode: str, path: str, chunk_rows: int):
+    """Executado no processo filho: parse da planilha e pico de memória"""
+    from io import BytesIO
+
+    import pandas as pd
+
+    from utils.upload_handler import UploadHandler
+
+    logging.disable(logging.WARNING)
+    handler = UploadHandler(chunk_rows=chunk_rows)
+    baseline = _max_rss_mb()
+    started = time.perf_counter()
+    if mode == 'inteira':
+        with open(path, 'rb') as f:
+            batch, _ = handler.dataframe_to_batch(pd.read_excel(BytesIO(f.read())))
+    else:
+        batch, _ = handler.parse_file(path)
+    elapsed = time.perf_counter() - started
+    print(f"{len(batch)} {elapsed:.3f} {_max_rss_mb() - baseline:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--chunk-rows', type=int, default=10000, help='linhas por bloco no streaming')
+    parser.add_argument('--child', nargs=2, metavar=('MODO', 'ARQUIVO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child, args.chunk_rows)
+        return
+
+    from benchmarks.generator import write_workbook
+
+    print(f"{'linhas':>10} {'arquivo':>10} " + ' '.join(f"{mode + ' (MB)':>16} {'s':>7}" for mode in MODES))
+    with tempfile.TemporaryDirectory(prefix='bench_memoria_') as workdir:
+        for rows in args.rows:
+            path = os.path.join(workdir, f'{rows}.xlsx')
+            write_workbook(path, rows)
+            cells = []
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_upload_memory', '--child', mode, path,
+                     '--chunk-rows', str(args.chunk_rows)],
+                    capture_output=True, text=True, check=True,
+                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                ).stdout.split()
+                cells.append(f"{float(output[2]):>16.1f} {float(output[1]):>7.2f}")
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{rows:>10} {size_mb:>8.1f}MB " + ' '.join(cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compara dois resultados de benchmarks/run.py (mediana de cada medição)
+
+Uso:
+    python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json
+"""
+import argparse
+import json
+from typing import Dict, Iterator, Tuple
+
+
+def iter_measurements(results: Dict, prefix: str = '') -> Iterator[Tuple[str, Dict]]:
+    """Percorre as medições (dicts com 'median'), inclusive as aninhadas por variante"""
+    for name, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        if 'median' in value:
+            yield prefix + name, value
+        else:
+            yield from iter_measurements(value, f"{prefix}{name}.")
+
+
+def load(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('novo')
+    args = parser.parse_args()
+
+    base, novo = load(args.base), load(args.novo)
+    for key in ('table_rows', 'upload_rows'):
+        if base.get(key) != novo.get(key):
+            print(f"atenção: {key} diferente ({base.get(key)} x {novo.get(key)})")
+
+    base_measurements = dict(iter_measurements(base['results']))
+    print(f"{'medição':<45} {base['commit']:>14} {novo['commit']:>14} {'variação':>10}")
+    for name, measurement in iter_measurements(novo['results']):
+        previous = base_measurements.get(name)
+        if previous is None:
+            print(f"{name:<45} {'-':>14} {measurement['median']:>13.4f}s {'novo':>10}")
+            continue
+        ratio = previous['median'] / measurement['median'] if measurement['median'] else float('inf')
+        print(f"{name:<45} {previous['median']:>13.4f}s {measurement['median']:>13.4f}s {ratio:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
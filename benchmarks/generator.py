@@ -0,0 +1,237 @@
+"""
+Gerador de dados sintéticos para temp_embalagem
+
+Produz itens no formato de TempEmbalagem.to_tuple() e planilhas no layout
+do WMS, de forma determinística (mesma semente, mesmos dados):
+
+- remessas de ~40 itens, cada uma de uma loja (F001 a F120);
+- códigos de produto sem repetição dentro da remessa (a chave de
+  duplicidade Remessa+Loja+Codigo+Qtde_Emb é única);
+- EAN de 13 dígitos, ausente em ~10% dos itens;
+- status por remessa, como na operação: pendentes, em separação (itens
+  misturados), finalizadas (prontas para faturamento) e faturadas.
+
+Uso:
+    python -m benchmarks.generator --scale 1m --xlsx data/bench_1m.xlsx
+"""
+import argparse
+import os
+import random
+import sys
+from typing import Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tamanhos de referência da suíte
+SCALES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+# Fração de remessas em cada estado
+REMESSA_STATUS_MIX = (
+    ('Pendente', 0.45),
+    ('em_separacao', 0.20),
+    ('Finalizado', 0.25),
+    ('Faturado', 0.10),
+)
+
+# Colunas da planilha de upload (mesma ordem de TempEmbalagem.to_tuple())
+WORKBOOK_COLUMNS = (
+    'Loja', 'Remessa', 'Local', 'Ordem', 'Posicao_Deposito', 'Codigo',
+    'Descricao_Produto', 'UM', 'Qtde_Emb', 'Qtde_CX', 'Qtde_UM', 'Estoque', 'EAN'
+)
+
+# Linhas de dados por arquivo xlsx (limite do formato menos o cabeçalho)
+XLSX_MAX_ROWS = 1_048_575
+
+ITEMS_PER_REMESSA = 40
+FIRST_REMESSA = 83_000_000
+OPERADORES = ('joao.silva', 'maria.souza', 'carlos.lima', 'ana.rocha', 'paulo.melo')
+
+
+class UploadedFile:
+    """Imita o FileStorage do Flask para o UploadHandler"""
+
+    def __init__(self, data: bytes, filename: str = 'bench.xlsx'):
+        self.data = data
+        self.filename = filename
+
+    def read(self):
+        return self.data
+
+    def save(self, dst: str):
+        with open(dst, 'wb') as f:
+            f.write(self.data)
+
+
+def _remessa_status(rng: random.Random) -> str:
+    value = rng.random()
+    for status, share in REMESSA_STATUS_MIX:
+        if value < share:
+            return status
+        value -= share
+    return REMESSA_STATUS_MIX[-1][0]
+
+
+def iter_records(rows: int, seed: int = 42, first_remessa: int = FIRST_REMESSA,
+                 chunk_size: int = 50_000, status: Optional[str] = None) -> Iterator[List[tuple]]:
+    """
+    Gera ``rows`` itens em lotes de ``chunk_size`` tuplas (TempEmbalagem.to_tuple()).
+    ``status`` fixa o status de todos os itens (ex.: 'Pendente', como num upload).
+    """
+    rng = random.Random(seed)
+    chunk = []
+    produced = 0
+    remessa = first_remessa
+    while produced < rows:
+        loja = f"F{rng.randint(1, 120):03d}"
+        remessa_status = status or _remessa_status(rng)
+        items = min(rows - produced, max(1, int(rng.gauss(ITEMS_PER_REMESSA, 8))))
+        codigos = rng.sample(range(100_000, 170_000), items)
+        for codigo in codigos:
+            item_status = remessa_status
+            if remessa_status == 'em_separacao':
+                item_status = rng.choice(('Pendente', 'em_separacao', 'Finalizado'))
+            ean = None if rng.random() < 0.1 else str(7_890_000_000_000 + codigo)
+            qtde_cx = float(rng.randint(1, 40))
+            chunk.append((
+                loja,
+                str(remessa),
+                f"L{rng.randint(1, 20):02d}",
+                str(rng.randint(100_000, 999_999)),
+                f"{rng.randint(1, 40):02d}-{rng.randint(1, 99):02d}-{rng.randint(1, 9)}",
+                str(codigo),
+                f"PRODUTO SINTETICO {codigo}",
+                rng.choice(('UN', 'CX', 'PC', 'KG')),
+                0.0 if rng.random() < 0.05 else qtde_cx * rng.choice((1, 6, 12)),
+                qtde_cx,
+                float(rng.randint(1, 500)),
+                float(rng.randint(0, 10_000)),
+                ean,
+                item_status,
+                None if item_status == 'Pendente' else rng.choice(OPERADORES)
+            ))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        produced += items
+        remessa += 1
+    if chunk:
+        yield chunk
+
+
+def generate_records(rows: int, seed: int = 42, first_remessa: int = FIRST_REMESSA,
+                     status: Optional[str] = None) -> List[tuple]:
+    """Todos os itens em uma lista (para tamanhos de upload, não de tabela)"""
+    records = []
+    for chunk in iter_records(rows, seed, first_remessa, status=status):
+        records.extend(chunk)
+    return records
+
+
+def _workbook_row(record: tuple) -> list:
+    row = list(record[:len(WORKBOOK_COLUMNS)])
+    row[5] = int(row[5])  # o WMS exporta o código como número
+    return row
+
+
+def write_workbook(target, rows: int, seed: int = 42, first_remessa: int = FIRST_REMESSA):
+    """Grava uma planilha de upload com ``rows`` itens em ``target`` (caminho ou arquivo)"""
+    from openpyxl import Workbook
+
+    if rows > XLSX_MAX_ROWS:
+        raise ValueError(f"Uma planilha comporta no máximo {XLSX_MAX_ROWS} linhas de dados")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(list(WORKBOOK_COLUMNS))
+    for chunk in iter_records(rows, seed, first_remessa, status='Pendente'):
+        for record in chunk:
+            sheet.append(_workbook_row(record))
+    workbook.save(target)
+
+
+def write_csv(path: str, rows: int, seed: int = 42, first_remessa: int = FIRST_REMESSA,
+              delimiter: str = ';'):
+    """
+    Mesmos itens de write_workbook em CSV UTF-8. Com ';' (padrão do Excel em
+    português) os números saem com vírgula decimal.
+    """
+    import csv
+
+    decimal_comma = delimiter == ';'
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow(WORKBOOK_COLUMNS)
+        for chunk in iter_records(rows, seed, first_remessa, status='Pendente'):
+            for record in chunk:
+                row = _workbook_row(record)
+                if decimal_comma:
+                    row[8:12] = [str(value).replace('.', ',') for value in row[8:12]]
+                writer.writerow(row)
+
+
+def write_parquet(path: str, rows: int, seed: int = 42, first_remessa: int = FIRST_REMESSA):
+    """Mesmos itens de write_workbook em Parquet (um grupo de linhas por lote do gerador)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [(name, pa.string()) for name in WORKBOOK_COLUMNS[:8]]
+        + [(name, pa.float64()) for name in WORKBOOK_COLUMNS[8:12]]
+        + [('EAN', pa.string())]
+    ).set(5, pa.field('Codigo', pa.int64()))  # o WMS exporta o código como número
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_records(rows, seed, first_remessa, status='Pendente'):
+            columns = list(zip(*(_workbook_row(record) for record in chunk)))
+            writer.write_table(pa.table(columns, schema=schema))
+
+
+def workbook_bytes(rows: int, seed: int = 42, first_remessa: int = FIRST_REMESSA) -> bytes:
+    """Planilha de upload em memória"""
+    from io import BytesIO
+
+    buffer = BytesIO()
+    write_workbook(buffer, rows, seed, first_remessa)
+    return buffer.getvalue()
+
+
+def write_workbooks(path: str, rows: int, seed: int = 42) -> List[str]:
+    """
+    Grava ``rows`` itens em uma ou mais planilhas (uma por bloco de
+    XLSX_MAX_ROWS linhas): base.xlsx ou base_parte01.xlsx, base_parte02.xlsx...
+    """
+    parts = max(1, -(-rows // XLSX_MAX_ROWS))
+    base, extension = os.path.splitext(path)
+    paths = []
+    remaining = rows
+    first_remessa = FIRST_REMESSA
+    for part in range(parts):
+        part_rows = min(remaining, XLSX_MAX_ROWS)
+        part_path = path if parts == 1 else f"{base}_parte{part + 1:02d}{extension or '.xlsx'}"
+        write_workbook(part_path, part_rows, seed + part, first_remessa)
+        paths.append(part_path)
+        remaining -= part_rows
+        # Blocos seguintes com remessas novas, como uploads distintos
+        first_remessa += part_rows
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--scale', choices=sorted(SCALES))
+    size.add_argument('--rows', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--xlsx', required=True, help='arquivo de saída (dividido em partes acima de 1.048.575 linhas)')
+    args = parser.parse_args()
+
+    rows = SCALES[args.scale] if args.scale else args.rows
+    for path in write_workbooks(args.xlsx, rows, args.seed):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Suíte de benchmarks do módulo de embalagem
+
+Popula temp_embalagem de um banco MySQL LOCAL com dados sintéticos
+(benchmarks/generator.py) e mede os caminhos principais do serviço.
+O resultado vai para um JSON, comparável entre commits com
+benchmarks/compare.py. Veja benchmarks/README.md.
+
+Uso:
+    python -m benchmarks.run --database embalagem_bench --scale 1m
+    python -m benchmarks.run --no-db --upload-rows 50000      # só parse e duplicidade
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import (
+    FIRST_REMESSA, SCALES, XLSX_MAX_ROWS, UploadedFile, generate_records, iter_records, workbook_bytes
+)
+from models.embalagem import EmbalagemBatch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# Usuário gravado pelos faturamentos do benchmark (permite desfazê-los)
+BENCH_USER = 'benchmark'
+
+DB_BENCHMARKS = ('insert', 'paginated', 'dashboard', 'export', 'faturamento')
+LOCAL_BENCHMARKS = ('parse_excel', 'dedupe')
+
+
+def measure(func, repeat: int, before=None) -> dict:
+    """
+    Executa ``func(execução)`` ``repeat`` vezes; ``before(execução)`` roda
+    fora da medição. ``func`` retorna a quantidade de linhas processadas.
+    """
+    timings = []
+    rows = 0
+    for run in range(repeat):
+        if before:
+            before(run)
+        started = time.perf_counter()
+        rows = func(run)
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    return {
+        'runs': [round(t, 6) for t in timings],
+        'min': round(min(timings), 6),
+        'median': round(median, 6),
+        'max': round(max(timings), 6),
+        'rows': rows,
+        'rows_per_sec': round(rows / median, 1) if median > 0 and rows else None,
+    }
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCH_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+
+# ---------------------------------------------------------------------------
+# Preparação do banco
+# ---------------------------------------------------------------------------
+
+def prepare_database(rows: int, reuse: bool) -> int:
+    """Cria a estrutura (se preciso), aplica as migrações e popula ``rows`` itens"""
+    from database import db
+    from migrations.migrate import apply_pending, split_statements
+    from services.embalagem_service import embalagem_service
+
+    if not db.execute_query("SELECT table_name FROM information_schema.tables "
+                            "WHERE table_schema = DATABASE() AND table_name = 'temp_embalagem'"):
+        with open(os.path.join(BENCH_DIR, 'schema.sql'), 'r', encoding='utf-8') as f:
+            for statement in split_statements(f.read()):
+                db.execute_query(statement)
+    apply_pending()
+
+    current = db.execute_query("SELECT COUNT(*) as total FROM temp_embalagem")[0]['total']
+    if reuse and current == rows:
+        print(f"  reaproveitando {current} itens já carregados")
+        return current
+
+    # TRUNCATE não dispara os triggers do resumo: os dois são zerados juntos
+    db.execute_query("TRUNCATE TABLE temp_embalagem")
+    db.execute_query("TRUNCATE TABLE temp_embalagem_resumo")
+
+    started = time.perf_counter()
+    loaded = 0
+    for chunk in iter_records(rows, seed=1, chunk_size=50_000):
+        result = embalagem_service.insert_batch_records(chunk)
+        if not result['success']:
+            raise SystemExit(f"Falha ao popular temp_embalagem: {result.get('error')}")
+        loaded += result['inserted']
+        print(f"\r  carregando: {loaded}/{rows}", end='', flush=True)
+    print(f"\r  carregados {loaded} itens em {time.perf_counter() - started:.1f}s")
+    db.execute_query("ANALYZE TABLE temp_embalagem")
+    return loaded
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def bench_parse_excel(args, context) -> dict:
+    from utils.upload_handler import upload_handler
+
+    rows = min(args.upload_rows, XLSX_MAX_ROWS)
+    workbook = workbook_bytes(rows, seed=2)
+    return measure(lambda run: len(upload_handler.parse_excel_file(UploadedFile(workbook))[0]),
+                   args.repeat)
+
+
+def bench_dedupe(args, context) -> dict:
+    from services.embalagem_service import embalagem_service
+
+    records = context['upload_records']
+    # Chaves novas (primeiro upload do dia). Dias decrescentes: o índice
+    # descarta os dias anteriores ao dia usado, e o último (01) precisa ficar
+    results = {
+        'novas': measure(lambda run: len(embalagem_service.validate_and_filter_duplicates(
+            records, f'2000-01-{args.repeat - run:02d}')[0]), args.repeat),
+    }
+    # Reenvio do mesmo arquivo: todas as chaves já existem
+    results['duplicadas'] = measure(lambda run: len(embalagem_service.validate_and_filter_duplicates(
+        records, '2000-01-01')[1]), args.repeat)
+    return results
+
+
+def bench_insert(args, context) -> dict:
+    from database import db
+    from services.embalagem_service import embalagem_service
+
+    max_id = db.execute_query("SELECT COALESCE(MAX(id), 0) as max_id FROM temp_embalagem")[0]['max_id']
+    try:
+        return measure(lambda run: embalagem_service.insert_batch_records(context['upload_records'])['inserted'],
+                       args.repeat)
+    finally:
+        # Devolve a tabela ao tamanho de referência (os triggers ajustam o resumo)
+        db.execute_query("DELETE FROM temp_embalagem WHERE id > %s", (max_id,))
+
+
+def bench_paginated(args, context) -> dict:
+    from services.embalagem_service import embalagem_service
+
+    per_page = 50
+    deep_page = max(1, min(2000, context['table_rows'] // per_page))
+    first = embalagem_service.get_paginated_data(1, per_page, {}, include_total=False)
+    cursor = first['next_cursor'] if first else None
+    invalidate = lambda run: embalagem_service.invalidate_caches()
+
+    results = {
+        'offset_primeira_pagina': measure(
+            lambda run: len(embalagem_service.get_paginated_data(1, per_page, {})['data']),
+            args.repeat, invalidate),
+        # Página profunda (até a 2000ª): o custo do OFFSET cresce com ela
+        'offset_pagina_profunda': measure(
+            lambda run: len(embalagem_service.get_paginated_data(deep_page, per_page, {}, include_total=False)['data']),
+            args.repeat, invalidate),
+        'keyset_segunda_pagina': measure(
+            lambda run: len(embalagem_service.get_paginated_data(2, per_page, {}, cursor=cursor, keyset=True,
+                                                                  include_total=False)['data']),
+            args.repeat, invalidate),
+    }
+    # Busca por remessa nos três modos (filtro "busca")
+    remessa = str(FIRST_REMESSA + 7)
+    for mode, value in (('exata', remessa), ('prefixo', remessa[:6]), ('contem', remessa[2:])):
+        results[f'filtro_remessa_{mode}'] = measure(
+            lambda run, value=value, mode=mode: len(embalagem_service.get_paginated_data(
+                1, per_page, {'remessa': value, 'busca': mode})['data']),
+            args.repeat, invalidate)
+    return results
+
+
+def bench_dashboard(args, context) -> dict:
+    from services.embalagem_service import embalagem_service
+
+    return {
+        'sem_cache': measure(lambda run: 1 if embalagem_service.get_dashboard_stats() else 0,
+                             args.repeat, lambda run: embalagem_service.invalidate_caches()),
+        'com_cache': measure(lambda run: 1 if embalagem_service.get_dashboard_stats() else 0,
+                             args.repeat),
+    }
+
+
+def bench_export(args, context) -> dict:
+    from database import db
+    from services.embalagem_service import embalagem_service
+
+    filters = {'status': 'Faturado'}
+    expected = db.execute_query("SELECT COUNT(*) as total FROM temp_embalagem WHERE Status = 'Faturado'")[0]['total']
+
+    def run_export(export_format):
+        def run(_):
+            result = embalagem_service.export_data(filters, export_format)
+            if not result:
+                return 0
+            os.remove(result['filepath'])
+            return result['total_records']
+        return run
+
+    results = {'csv': measure(run_export('csv'), args.repeat)}
+    if expected <= XLSX_MAX_ROWS:
+        results['excel'] = measure(run_export('excel'), args.repeat)
+    else:
+        results['excel'] = {'skipped': f'{expected} linhas excedem o limite do xlsx'}
+    return results
+
+
+def bench_faturamento(args, context) -> dict:
+    from database import db
+    from services.embalagem_service import embalagem_service
+
+    def reset(_=None):
+        db.execute_query("UPDATE temp_embalagem SET Status = 'Finalizado', Usuario = NULL "
+                         "WHERE Status = 'Faturado' AND Usuario = %s", (BENCH_USER,))
+
+    def run(_):
+        result = embalagem_service.export_faturamento(BENCH_USER)
+        if not result['success']:
+            raise RuntimeError(result.get('error'))
+        os.remove(os.path.join('data', result['filename']))
+        return result['total_records']
+
+    try:
+        return measure(run, args.repeat, reset)
+    finally:
+        reset()
+
+
+BENCHMARKS = {
+    'parse_excel': bench_parse_excel,
+    'dedupe': bench_dedupe,
+    'insert': bench_insert,
+    'paginated': bench_paginated,
+    'dashboard': bench_dashboard,
+    'export': bench_export,
+    'faturamento': bench_faturamento,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='banco MySQL local de benchmark (temp_embalagem é recriada)')
+    parser.add_argument('--no-db', action='store_true', help='roda apenas os benchmarks sem banco')
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--scale', choices=sorted(SCALES), default='10k', help='itens na tabela')
+    size.add_argument('--rows', type=int, help='itens na tabela (tamanho livre)')
+    parser.add_argument('--upload-rows', type=int, default=10_000, help='itens por upload simulado')
+    parser.add_argument('--repeat', type=int, default=3, choices=range(1, 29), metavar='N')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='roda apenas estes')
+    parser.add_argument('--reuse', action='store_true',
+                        help='não repopula a tabela se ela já tiver a quantidade pedida')
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: benchmarks/results/)')
+    args = parser.parse_args()
+    if not args.no_db and not args.database:
+        parser.error('informe --database ou --no-db')
+    return args
+
+
+def main():
+    args = parse_args()
+    table_rows = args.rows or SCALES[args.scale]
+
+    # Antes de importar database/serviços: banco e índice de duplicatas isolados
+    if args.database:
+        os.environ['MYSQL_DB'] = args.database
+    work_dir = tempfile.mkdtemp(prefix='embalagem_bench_')
+    os.environ['EMBALAGEM_DEDUPE_INDEX'] = os.path.join(work_dir, 'dedupe_index.sqlite3')
+    logging.basicConfig(level=logging.WARNING)
+
+    selected = args.only or list(BENCHMARKS)
+    if args.no_db:
+        selected = [name for name in selected if name in LOCAL_BENCHMARKS]
+
+    report = {
+        'commit': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'table_rows': None,
+        'upload_rows': args.upload_rows,
+        'repeat': args.repeat,
+        'results': {},
+    }
+
+    context = {
+        # Upload simulado: remessas que não existem na tabela de referência
+        'upload_records': EmbalagemBatch.from_rows(generate_records(
+            args.upload_rows, seed=3, first_remessa=FIRST_REMESSA + table_rows, status='Pendente')),
+        'table_rows': table_rows,
+    }
+
+    if any(name in DB_BENCHMARKS for name in selected):
+        from database import db
+        report['mysql_version'] = db.execute_query("SELECT VERSION() as version")[0]['version']
+        report['table_rows'] = prepare_database(table_rows, args.reuse)
+        context['table_rows'] = report['table_rows']
+
+    for name in selected:
+        print(f"{name}...", flush=True)
+        report['results'][name] = BENCHMARKS[name](args, context)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"resultados: {output}")
+
+
+if __name__ == '__main__':
+    main()
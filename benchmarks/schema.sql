@@ -0,0 +1,28 @@
+-- Estrutura de temp_embalagem para o banco LOCAL de benchmark.
+--
+-- O DDL de produção não faz parte do repositório; esta versão cobre as
+-- colunas usadas pela aplicação. Quando houver acesso ao banco real, prefira
+--     CREATE TABLE embalagem_bench.temp_embalagem LIKE embalagem.temp_embalagem;
+-- para medir com os mesmos tipos e índices. As migrações (migrations/) são
+-- aplicadas depois pelo runner em ambos os casos.
+
+CREATE TABLE IF NOT EXISTS temp_embalagem (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    Loja VARCHAR(20) NOT NULL,
+    Remessa VARCHAR(30) NOT NULL,
+    Local VARCHAR(50),
+    Ordem VARCHAR(50),
+    Posicao_Deposito VARCHAR(50),
+    Codigo VARCHAR(50) NOT NULL,
+    Descricao_Produto VARCHAR(255),
+    UM VARCHAR(10),
+    Qtde_Emb DECIMAL(14,3) NOT NULL DEFAULT 0,
+    Qtde_CX DECIMAL(14,3) NOT NULL DEFAULT 0,
+    Qtde_UM DECIMAL(14,3) NOT NULL DEFAULT 0,
+    Estoque DECIMAL(14,3) NOT NULL DEFAULT 0,
+    EAN VARCHAR(20),
+    Status VARCHAR(20) NOT NULL DEFAULT 'Pendente',
+    Usuario VARCHAR(100),
+    Total_Pallets INT,
+    Data_Registro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
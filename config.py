@@ -0,0 +1,49 @@
+"""
+Perfis de configuração da aplicação
+
+O perfil é escolhido por APP_ENV (development | production):
+
+- development (padrão de ``python app.py``): debug, reload de templates e o
+  servidor de desenvolvimento do Flask;
+- production (padrão de wsgi.py): sem debug nem reload, para rodar com
+  gunicorn (gunicorn.conf.py), vários processos e threads por processo.
+"""
+import os
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
+    DEBUG = False
+    TEMPLATES_AUTO_RELOAD = False
+    # Tamanho máximo do upload: os arquivos vão para disco e são lidos em streaming,
+    # então o limite não precisa acompanhar a memória dos workers
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_MB', '256')) * 1024 * 1024
+    # Importa pandas/pyarrow no warmup em vez de no primeiro upload ou exportação
+    # (utils/lazy_imports.py); no gunicorn o mestre faz isso antes do fork
+    PRELOAD_HEAVY_MODULES = os.environ.get('PRELOAD_HEAVY_MODULES', '0') == '1'
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    TEMPLATES_AUTO_RELOAD = True
+
+
+class ProductionConfig(Config):
+    # Arquivos de static/ em cache no navegador (o nome não muda entre deploys,
+    # então o tempo é curto)
+    SEND_FILE_MAX_AGE_DEFAULT = int(os.environ.get('STATIC_MAX_AGE', '3600'))
+    PRELOAD_HEAVY_MODULES = os.environ.get('PRELOAD_HEAVY_MODULES', '1') == '1'
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(name: str = None):
+    """Classe de configuração do perfil ``name`` (ou de APP_ENV)"""
+    name = name or os.environ.get('APP_ENV', 'development')
+    if name not in CONFIGS:
+        raise ValueError(f"Perfil de configuração desconhecido: {name} (use {', '.join(CONFIGS)})")
+    return CONFIGS[name]
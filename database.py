@@ -4,82 +4,400 @@ Configuração e conexão com banco de dados MySQL
 import mysql.connector
 from mysql.connector import Error
 import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import logging
 
+from utils.metrics import metrics, query_name
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
+
+class PoolExhaustedError(Error):
+    """Nenhuma conexão livre no pool dentro do tempo de espera"""
+
+
+class ConnectionPool:
+    """
+    Pool de conexões MySQL limitado e seguro para múltiplas threads.
+
+    Cada requisição faz checkout de uma conexão exclusiva e a devolve ao
+    final. Conexões ociosas além de ``idle_timeout`` são descartadas e
+    toda conexão é validada (ping) antes de ser entregue.
+    """
+
+    def __init__(self, connect_args: dict, size: int = 10, timeout: float = 10.0,
+                 idle_timeout: float = 300.0):
+        self.connect_args = connect_args
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()  # (conexão, instante em que foi devolvida)
+        self._in_use = 0
+        # Conexões emprestadas que não podem voltar ao pool (id da conexão)
+        self._broken = set()
+
+        # Contadores expostos em stats()
+        self._checkouts = 0
+        self._created = 0
+        self._evicted = 0
+        self._exhausted = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def _new_connection(self):
+        connection = mysql.connector.connect(**self.connect_args)
+        with self._lock:
+            self._created += 1
+        return connection
+
+    def _evict_idle(self, now: float):
+        """Remove conexões ociosas há mais tempo que idle_timeout (chamado com lock)"""
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        self._evicted += len(expired)
+        return expired
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Obtém uma conexão validada do pool, aguardando até ``timeout`` segundos"""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        connection = None
+        waited = False
+
+        with self._available:
+            expired = self._evict_idle(time.monotonic())
+            while True:
+                if self._idle:
+                    # LIFO: a conexão mais recente é a que tem menor chance de ter expirado
+                    connection = self._idle.pop()[0]
+                    break
+                if self._in_use < self.size:
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._exhausted += 1
+                    for stale in expired:
+                        self._close_quietly(stale)
+                    raise PoolExhaustedError(
+                        msg=f"Pool de conexões esgotado ({self.size} em uso)")
+                waited = True
+                self._available.wait(remaining)
+            self._in_use += 1
+            self._checkouts += 1
+            wait_time = time.perf_counter() - started
+            if waited:
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+
+        for stale in expired:
+            self._close_quietly(stale)
+
+        try:
+            if connection is None:
+                connection = self._new_connection()
+            else:
+                # Validação no checkout: reconecta se o servidor derrubou a sessão
+                connection.ping(reconnect=True, attempts=1, delay=0)
+        except Exception:
+            if connection is not None:
+                self._close_quietly(connection)
+            with self._available:
+                self._in_use -= 1
+                self._available.notify()
+            raise
+        return connection
+
+    def mark_broken(self, connection):
+        """
+        Marca uma conexão emprestada para ser descartada na devolução (ex.:
+        estado de sessão que não pôde ser limpo, como um lock nomeado)
+        """
+        with self._lock:
+            self._broken.add(id(connection))
+
+    def release(self, connection, discard: bool = False):
+        """Devolve a conexão ao pool (ou a descarta se estiver inválida)"""
+        with self._lock:
+            if id(connection) in self._broken:
+                self._broken.discard(id(connection))
+                discard = True
+        if not discard:
+            try:
+                if connection.in_transaction:
+                    connection.rollback()
+            except Exception:
+                discard = True
+
+        with self._available:
+            self._in_use -= 1
+            if not discard:
+                self._idle.append((connection, time.monotonic()))
+            self._available.notify()
+
+        if discard:
+            self._close_quietly(connection)
+
+    @contextmanager
+    def connection(self):
+        """Context manager de checkout/devolução de uma conexão"""
+        connection = self.acquire()
+        discard = False
+        try:
+            yield connection
+        except (mysql.connector.errors.OperationalError,
+                mysql.connector.errors.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(connection, discard=discard)
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas"""
+        with self._lock:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._close_quietly(connection)
+
+    def stats(self) -> dict:
+        """Contadores de uso do pool"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self._created,
+                'checkouts': self._checkouts,
+                'evicted_idle': self._evicted,
+                'exhausted': self._exhausted,
+                'wait_time_total': round(self._wait_time_total, 6),
+                'wait_time_max': round(self._wait_time_max, 6),
+            }
+
+
 class DatabaseConnection:
     def __init__(self):
         self.host = os.getenv('MYSQL_HOST')
         self.user = os.getenv('MYSQL_USER')
         self.password = os.getenv('MYSQL_PASSWORD')
         self.database = os.getenv('MYSQL_DB')
-        self.connection = None
-        
+        self.pool_size = int(os.getenv('MYSQL_POOL_SIZE', '10'))
+        self.pool_timeout = float(os.getenv('MYSQL_POOL_TIMEOUT', '10'))
+        self.pool_idle_timeout = float(os.getenv('MYSQL_POOL_IDLE_TIMEOUT', '300'))
+        # Necessário para o caminho rápido LOAD DATA LOCAL INFILE dos uploads
+        self.allow_local_infile = os.getenv('MYSQL_ALLOW_LOCAL_INFILE', '0') == '1'
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        # Pools herdados em um fork: mantidos referenciados para não serem fechados
+        self._inherited_pools = []
+
+    def _connect_args(self) -> dict:
+        return {
+            'host': self.host,
+            'user': self.user,
+            'password': self.password,
+            'database': self.database,
+            'charset': 'utf8mb4',
+            'autocommit': True,
+            'allow_local_infile': self.allow_local_infile
+        }
+
+    def _get_pool(self) -> ConnectionPool:
+        if self.pool is None:
+            with self._pool_lock:
+                if self.pool is None:
+                    self.pool = ConnectionPool(
+                        self._connect_args(),
+                        size=self.pool_size,
+                        timeout=self.pool_timeout,
+                        idle_timeout=self.pool_idle_timeout
+                    )
+        return self.pool
+
     def connect(self):
-        """Estabelece conexão com o banco de dados"""
+        """Valida a configuração abrindo (e devolvendo) uma conexão do pool"""
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset='utf8mb4',
-                autocommit=True
-            )
-            if self.connection.is_connected():
-                logging.info("Conexão com MySQL estabelecida com sucesso")
-                return True
+            pool = self._get_pool()
+            connection = pool.acquire()
+            pool.release(connection)
+            logging.info("Conexão com MySQL estabelecida com sucesso")
+            return True
         except Error as e:
             logging.error(f"Erro ao conectar com MySQL: {e}")
             return False
-        return False
-    
+
+    def reset_after_fork(self):
+        """
+        No processo filho (worker do gunicorn): abandona o pool herdado sem
+        fechar as conexões, que usam os mesmos sockets do processo pai
+        (fechá-las encerraria as conexões dele). O worker abre as suas no
+        primeiro uso.
+        """
+        if self.pool is not None:
+            self._inherited_pools.append(self.pool)
+        self.pool = None
+        self._pool_lock = threading.Lock()
+
     def disconnect(self):
-        """Fecha a conexão com o banco de dados"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logging.info("Conexão com MySQL fechada")
-    
-    def execute_query(self, query, params=None):
-        """Executa uma query e retorna os resultados"""
-        if not self.connection or not self.connection.is_connected():
-            if not self.connect():
-                return None
-        
+        """Fecha as conexões ociosas do pool"""
+        if self.pool is not None:
+            self.pool.close_all()
+            logging.info("Conexões com MySQL fechadas")
+
+    def get_connection(self):
+        """Context manager que empresta uma conexão exclusiva do pool"""
+        return self._get_pool().connection()
+
+    def discard_connection(self, connection):
+        """A conexão emprestada será fechada ao ser devolvida, em vez de voltar ao pool"""
+        self._get_pool().mark_broken(connection)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Empresta uma conexão e abre uma transação explícita.
+        Faz commit ao sair normalmente e rollback em caso de exceção.
+        """
+        with self.get_connection() as connection:
+            connection.start_transaction()
+            try:
+                yield connection
+                connection.commit()
+            except Exception:
+                try:
+                    connection.rollback()
+                except Error as e:
+                    logging.error(f"Erro ao desfazer transação: {e}")
+                raise
+
+    def pool_stats(self) -> dict:
+        """Contadores do pool (tempo de espera, esgotamentos, etc.)"""
+        if self.pool is None:
+            return {}
+        return self.pool.stats()
+
+    def execute_query(self, query, params=None, name=None):
+        """
+        Executa uma query e retorna os resultados
+        ``name`` identifica a query nas métricas (padrão: comando + tabela)
+        """
+        name = name or query_name(query)
+        started = time.perf_counter()
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params)
-            
-            if query.strip().upper().startswith('SELECT'):
-                result = cursor.fetchall()
-            else:
-                result = cursor.rowcount
-                
-            cursor.close()
+            with self.get_connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                try:
+                    cursor.execute(query, params)
+
+                    if query.strip().upper().startswith('SELECT'):
+                        result = cursor.fetchall()
+                        rows = len(result)
+                    else:
+                        # Comandos que devolvem linhas (ANALYZE, SHOW...): o resultado precisa
+                        # ser lido, senão a conexão volta ao pool com leitura pendente
+                        if cursor.with_rows:
+                            cursor.fetchall()
+                        result = cursor.rowcount
+                        rows = result
+                finally:
+                    cursor.close()
+            metrics.observe_query(name, time.perf_counter() - started, rows, query)
             return result
         except Error as e:
-            logging.error(f"Erro ao executar query: {e}")
+            metrics.observe_query(name, time.perf_counter() - started, query=query, error=True)
+            logging.error(f"Erro ao executar query [{name}]: {e}")
             return None
-    
-    def execute_many(self, query, data_list):
+
+    def iter_query(self, query, params=None, chunk_size=5000, connection=None, name=None):
+        """
+        Executa um SELECT sem carregar o resultado inteiro em memória.
+        O cursor não bufferizado recebe as linhas do servidor sob demanda;
+        gera (nomes_das_colunas, lote_de_tuplas) a cada ``chunk_size`` linhas.
+        A conexão fica emprestada até o gerador terminar ou ser fechado.
+        Com ``connection`` (ex.: a de db.transaction()) a leitura participa
+        da transação em andamento e a conexão não é devolvida ao pool aqui.
+        Nas métricas, o tempo vai da execução até a última linha lida.
+        """
+        name = name or query_name(query)
+        started = time.perf_counter()
+        total_rows = 0
+        pool = self._get_pool()
+        borrowed = connection is None
+        if borrowed:
+            connection = pool.acquire()
+        cursor = None
+        finished = False
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(query, params)
+            columns = tuple(cursor.column_names)
+            # O primeiro lote é sempre gerado (mesmo vazio) para expor as colunas
+            rows = cursor.fetchmany(chunk_size)
+            total_rows += len(rows)
+            yield columns, rows
+            while rows:
+                rows = cursor.fetchmany(chunk_size)
+                if rows:
+                    total_rows += len(rows)
+                    yield columns, rows
+            finished = True
+        except Error:
+            metrics.observe_query(name, time.perf_counter() - started, total_rows, query, error=True)
+            raise
+        finally:
+            if cursor is not None and finished:
+                cursor.close()
+            # Resultado lido pela metade deixa a conexão inutilizável: descartar
+            if borrowed:
+                pool.release(connection, discard=not finished)
+            elif cursor is not None and not finished:
+                # A conexão é de quem chamou e segue em uso: consome o restante
+                # do resultado; se não der, ela é descartada na devolução
+                try:
+                    while cursor.fetchmany(chunk_size):
+                        pass
+                    cursor.close()
+                except Exception as e:
+                    logging.error(f"Erro ao descartar resultado de [{name}]: {e}")
+                    pool.mark_broken(connection)
+            if finished:
+                metrics.observe_query(name, time.perf_counter() - started, total_rows, query)
+
+    def execute_many(self, query, data_list, name=None):
         """Executa inserção em lote"""
-        if not self.connection or not self.connection.is_connected():
-            if not self.connect():
-                return False
-        
+        name = name or query_name(query)
+        started = time.perf_counter()
         try:
-            cursor = self.connection.cursor()
-            cursor.executemany(query, data_list)
-            affected_rows = cursor.rowcount
-            cursor.close()
+            with self.get_connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.executemany(query, data_list)
+                    affected_rows = cursor.rowcount
+                finally:
+                    cursor.close()
+            metrics.observe_query(name, time.perf_counter() - started, affected_rows, query)
             logging.info(f"Inserção em lote realizada: {affected_rows} registros")
             return True
         except Error as e:
+            metrics.observe_query(name, time.perf_counter() - started, query=query, error=True)
             logging.error(f"Erro na inserção em lote: {e}")
             return False
 
 # Instância global da conexão
-db = DatabaseConnection()
\ No newline at end of file
+db = DatabaseConnection()
@@ -0,0 +1,85 @@
+"""
+Configuração do gunicorn para produção
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+A carga mistura pedidos curtos presos a I/O (listagem, estatísticas,
+downloads, streams SSE que ocupam uma thread por tela) com trabalho de CPU
+(parse de upload, geração de planilhas). Por isso: workers gthread, um
+processo por CPU para o trabalho de CPU e várias threads por processo para
+o I/O. O parse de planilhas ainda usa o próprio pool de processos
+(UPLOAD_PARSE_WORKERS), dividido entre os workers.
+
+Threads: cada tela do módulo de embalagem aberta mantém um stream SSE
+(/api/embalagem/stats/stream) que ocupa uma thread enquanto está conectado.
+Dimensione GUNICORN_THREADS para as telas abertas esperadas por worker mais
+os pedidos simultâneos. STATS_STREAM_MAX_SUBSCRIBERS (padrão: metade das
+threads) limita as threads que os streams podem ocupar; acima dele as telas
+passam a consultar as estatísticas periodicamente.
+
+Variáveis: GUNICORN_BIND, GUNICORN_WORKERS, GUNICORN_THREADS,
+GUNICORN_TIMEOUT, GUNICORN_MAX_REQUESTS. O pool de conexões MySQL de cada
+worker (MYSQL_POOL_SIZE, padrão 10) deve ser >= GUNICORN_THREADS menos as
+threads reservadas aos streams (os streams não usam conexão; o agregador usa
+uma).
+"""
+import multiprocessing
+import os
+
+_cpus = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', str(max(2, _cpus))))
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+
+# Uploads e exportações síncronas grandes podem levar minutos
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '300'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla workers aos poucos (memória retida pelo pandas após uploads grandes); 0 desliga
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+# Importa a aplicação uma vez no mestre; os workers compartilham essas páginas
+# de memória. pandas/pyarrow são importados sob demanda (utils/lazy_imports.py)
+# e, com PRELOAD_HEAVY_MODULES (padrão em produção), carregados no mestre em
+# when_ready: nem o worker novo nem o reciclado pagam essa importação. Nada de
+# conexões no mestre: o warmup roda em cada worker.
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+raw_env = ['APP_ENV=production']
+os.environ.setdefault('APP_ENV', 'production')
+# Sem isso cada worker abriria um processo de parse por CPU
+os.environ.setdefault('UPLOAD_PARSE_WORKERS', str(max(1, _cpus // workers)))
+# Streams SSE ocupam no máximo metade das threads de cada worker
+os.environ.setdefault('STATS_STREAM_MAX_SUBSCRIBERS', str(max(1, threads // 2)))
+
+
+def when_ready(server):
+    """Mestre pronto, antes de criar os workers"""
+    from app import app
+    from utils.lazy_imports import preload_heavy_modules
+
+    if app.config['PRELOAD_HEAVY_MODULES']:
+        preload_heavy_modules()
+
+
+def post_fork(server, worker):
+    """Worker recém-criado: descarta recursos herdados do mestre"""
+    from app import reset_after_fork
+
+    reset_after_fork()
+
+
+def post_worker_init(worker):
+    """Worker pronto, antes do primeiro pedido: warmup"""
+    from app import warmup
+
+    warmup(worker.wsgi)
@@ -0,0 +1,12 @@
+-- Índices compostos para os caminhos de acesso do módulo de embalagem.
+--
+-- idx_data_status: filtros por período (dashboard do dia, tela de dados e
+--   exportação), que agora usam intervalos semiabertos sobre Data_Registro.
+--   Também atende ORDER BY Data_Registro DESC, id DESC (o id é o sufixo
+--   implícito de todo índice secundário do InnoDB).
+-- idx_remessa_status: "remessa sem itens fora de Finalizado" (faturamento e
+--   card de remessas prontas) e filtro por remessa.
+
+ALTER TABLE temp_embalagem
+    ADD INDEX idx_data_status (Data_Registro, Status),
+    ADD INDEX idx_remessa_status (Remessa, Status);
@@ -0,0 +1,101 @@
+-- Resumo por remessa/loja de temp_embalagem (contagem por status, itens e
+-- pallets), mantido de forma incremental:
+--   * inserções do upload: EmbalagemService.insert_batch_records, na mesma
+--     transação do INSERT (services/remessa_resumo.py);
+--   * mudanças de status/pallets e exclusões: triggers abaixo.
+-- O card "prontas para faturamento" e a seleção do faturamento passam a
+-- consultar o índice idx_pronta em vez de agregar a tabela inteira.
+-- Conferência e reconstrução: python -m services.remessa_resumo --verify | --rebuild
+
+-- Mesmos tipos de Remessa/Loja da tabela de origem
+CREATE TABLE temp_embalagem_resumo (
+    total_itens INT NOT NULL DEFAULT 0,
+    pendentes INT NOT NULL DEFAULT 0,
+    em_separacao INT NOT NULL DEFAULT 0,
+    finalizados INT NOT NULL DEFAULT 0,
+    faturados INT NOT NULL DEFAULT 0,
+    total_pallets DECIMAL(14,3) NOT NULL DEFAULT 0,
+    pronta TINYINT(1) AS (finalizados > 0 AND finalizados = total_itens) STORED,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (Remessa, Loja),
+    KEY idx_pronta (pronta, Remessa)
+)
+SELECT Remessa, Loja FROM temp_embalagem WHERE 1 = 0;
+
+DELIMITER $$
+
+CREATE TRIGGER trg_temp_embalagem_resumo_upd
+AFTER UPDATE ON temp_embalagem
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.Status <=> NEW.Status
+            AND OLD.Remessa <=> NEW.Remessa
+            AND OLD.Loja <=> NEW.Loja
+            AND OLD.Total_Pallets <=> NEW.Total_Pallets) THEN
+        UPDATE temp_embalagem_resumo
+        SET total_itens = total_itens - 1,
+            pendentes = pendentes - (OLD.Status <=> 'Pendente'),
+            em_separacao = em_separacao - (OLD.Status <=> 'em_separacao'),
+            finalizados = finalizados - (OLD.Status <=> 'Finalizado'),
+            faturados = faturados - (OLD.Status <=> 'Faturado'),
+            total_pallets = total_pallets - COALESCE(OLD.Total_Pallets, 0)
+        WHERE Remessa = OLD.Remessa AND Loja = OLD.Loja;
+
+        INSERT INTO temp_embalagem_resumo
+            (Remessa, Loja, total_itens, pendentes, em_separacao, finalizados, faturados, total_pallets)
+        VALUES
+            (NEW.Remessa, NEW.Loja, 1, NEW.Status <=> 'Pendente', NEW.Status <=> 'em_separacao',
+             NEW.Status <=> 'Finalizado', NEW.Status <=> 'Faturado', COALESCE(NEW.Total_Pallets, 0))
+        ON DUPLICATE KEY UPDATE
+            total_itens = total_itens + 1,
+            pendentes = pendentes + (NEW.Status <=> 'Pendente'),
+            em_separacao = em_separacao + (NEW.Status <=> 'em_separacao'),
+            finalizados = finalizados + (NEW.Status <=> 'Finalizado'),
+            faturados = faturados + (NEW.Status <=> 'Faturado'),
+            total_pallets = total_pallets + COALESCE(NEW.Total_Pallets, 0);
+
+        DELETE FROM temp_embalagem_resumo
+        WHERE Remessa = OLD.Remessa AND Loja = OLD.Loja AND total_itens <= 0;
+    END IF;
+END$$
+
+CREATE TRIGGER trg_temp_embalagem_resumo_del
+AFTER DELETE ON temp_embalagem
+FOR EACH ROW
+BEGIN
+    UPDATE temp_embalagem_resumo
+    SET total_itens = total_itens - 1,
+        pendentes = pendentes - (OLD.Status <=> 'Pendente'),
+        em_separacao = em_separacao - (OLD.Status <=> 'em_separacao'),
+        finalizados = finalizados - (OLD.Status <=> 'Finalizado'),
+        faturados = faturados - (OLD.Status <=> 'Faturado'),
+        total_pallets = total_pallets - COALESCE(OLD.Total_Pallets, 0)
+    WHERE Remessa = OLD.Remessa AND Loja = OLD.Loja;
+
+    DELETE FROM temp_embalagem_resumo
+    WHERE Remessa = OLD.Remessa AND Loja = OLD.Loja AND total_itens <= 0;
+END$$
+
+DELIMITER ;
+
+-- Carga inicial (depois dos triggers, para não perder alterações feitas durante a migração)
+INSERT INTO temp_embalagem_resumo
+    (Remessa, Loja, total_itens, pendentes, em_separacao, finalizados, faturados, total_pallets)
+SELECT
+    Remessa,
+    Loja,
+    COUNT(*),
+    SUM(Status <=> 'Pendente'),
+    SUM(Status <=> 'em_separacao'),
+    SUM(Status <=> 'Finalizado'),
+    SUM(Status <=> 'Faturado'),
+    COALESCE(SUM(Total_Pallets), 0)
+FROM temp_embalagem
+GROUP BY Remessa, Loja
+ON DUPLICATE KEY UPDATE
+    total_itens = VALUES(total_itens),
+    pendentes = VALUES(pendentes),
+    em_separacao = VALUES(em_separacao),
+    finalizados = VALUES(finalizados),
+    faturados = VALUES(faturados),
+    total_pallets = VALUES(total_pallets);
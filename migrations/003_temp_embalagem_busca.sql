@@ -0,0 +1,26 @@
+-- Índices da busca por remessa, loja e código (filtro "busca" da listagem
+-- e da exportação).
+--
+-- idx_loja / idx_codigo: buscas exatas e por prefixo (Loja = 'F001',
+--   Codigo LIKE '1234%'). A remessa já é atendida por idx_remessa_status.
+-- ft_remessa / ft_loja / ft_codigo: índices FULLTEXT com o parser ngram,
+--   um por coluna, para a busca "contém" (MATCH ... AGAINST na frase). O
+--   serviço detecta esses índices em tempo de execução; sem eles a busca
+--   por substring usa LIKE '%valor%'.
+--
+-- Os tokens ngram têm ngram_token_size caracteres (padrão 2, igual a
+-- NGRAM_TOKEN_SIZE em utils/query_filters.py). A lista de stopwords em
+-- inglês é desligada na sessão: com ngram ela descartaria pares como "at"
+-- ou "be" e faria a busca perder linhas.
+
+SET SESSION innodb_ft_enable_stopword = OFF;
+
+ALTER TABLE temp_embalagem
+    ADD INDEX idx_loja (Loja),
+    ADD INDEX idx_codigo (Codigo);
+
+ALTER TABLE temp_embalagem ADD FULLTEXT INDEX ft_remessa (Remessa) WITH PARSER ngram;
+
+ALTER TABLE temp_embalagem ADD FULLTEXT INDEX ft_loja (Loja) WITH PARSER ngram;
+
+ALTER TABLE temp_embalagem ADD FULLTEXT INDEX ft_codigo (Codigo) WITH PARSER ngram;
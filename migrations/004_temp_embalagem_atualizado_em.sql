@@ -0,0 +1,14 @@
+-- Marcador de alteração dos itens: Atualizado_Em muda em toda atualização
+-- da linha (Qtde, Usuario, Status, pallets...), inclusive as feitas fora
+-- da aplicação (WMS). MAX(Atualizado_Em), pelo índice, entra em
+-- EmbalagemService.table_version: a versão que decide o reaproveitamento
+-- das exportações e o cache de páginas da listagem. Microssegundos para
+-- que duas alterações no mesmo segundo não passem despercebidas.
+--
+-- Sem esta migração table_version não detecta essas alterações e devolve
+-- None: nada é reaproveitado.
+
+ALTER TABLE temp_embalagem
+    ADD COLUMN Atualizado_Em TIMESTAMP(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_atualizado_em (Atualizado_Em);
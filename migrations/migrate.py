@@ -0,0 +1,98 @@
+"""
+Aplica as migrações de esquema (arquivos NNN_*.sql deste diretório)
+
+Uso:
+    python migrations/migrate.py            # aplica as pendentes
+    python migrations/migrate.py --list     # mostra o estado de cada migração
+
+As migrações aplicadas ficam registradas na tabela schema_migrations.
+Os arquivos aceitam a diretiva DELIMITER, como o cliente mysql, para
+definir triggers e procedures.
+"""
+import argparse
+import logging
+import os
+import sys
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(MIGRATIONS_DIR))
+
+from database import db
+
+
+def split_statements(sql: str):
+    """Divide o script em comandos respeitando a diretiva DELIMITER"""
+    delimiter = ';'
+    statements = []
+    buffer = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not buffer and (not stripped or stripped.startswith('--')):
+            continue
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(buffer).rstrip()[:-len(delimiter)].strip()
+            if statement:
+                statements.append(statement)
+            buffer = []
+    if ''.join(buffer).strip():
+        statements.append('\n'.join(buffer).strip())
+    return statements
+
+
+def available_migrations():
+    return sorted(
+        name for name in os.listdir(MIGRATIONS_DIR)
+        if name.endswith('.sql') and name[:3].isdigit()
+    )
+
+
+def applied_migrations(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            versao VARCHAR(128) NOT NULL PRIMARY KEY,
+            aplicada_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT versao FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_pending(list_only: bool = False):
+    """Aplica as migrações pendentes (ou só lista o estado de cada uma)"""
+    with db.get_connection() as connection:
+        cursor = connection.cursor()
+        applied = applied_migrations(cursor)
+
+        for name in available_migrations():
+            if list_only:
+                print(f"{'[x]' if name in applied else '[ ]'} {name}")
+                continue
+            if name in applied:
+                continue
+
+            with open(os.path.join(MIGRATIONS_DIR, name), 'r', encoding='utf-8') as f:
+                statements = split_statements(f.read())
+
+            logging.info(f"Aplicando {name} ({len(statements)} comandos)")
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (versao) VALUES (%s)", (name,))
+
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--list', action='store_true', help='apenas lista as migrações')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    apply_pending(list_only=args.list)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,10 @@
 """
 Modelo para a tabela temp_embalagem
 """
+from array import array
 from dataclasses import dataclass
-from typing import Optional
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
 from datetime import datetime
 import json
 
@@ -69,6 +71,228 @@ class TempEmbalagem:
             self.Estoque, self.EAN, self.Status, self.Usuario
         )
 
+# Campos de TempEmbalagem.to_tuple(), na mesma ordem
+STRING_FIELDS = ('Loja', 'Remessa', 'Local', 'Ordem', 'Posicao_Deposito',
+                 'Codigo', 'Descricao_Produto', 'UM')
+NUMERIC_FIELDS = ('Qtde_Emb', 'Qtde_CX', 'Qtde_UM', 'Estoque')
+COLUMN_FIELDS = STRING_FIELDS + NUMERIC_FIELDS + ('EAN',)
+ROW_FIELDS = COLUMN_FIELDS + ('Status', 'Usuario')
+
+
+class DictionaryColumn:
+    """
+    Coluna de texto codificada por dicionário: um código por linha
+    (array de inteiros) e a lista de valores distintos. Valores repetidos
+    (loja, remessa, UM...) são guardados uma única vez. None é um valor
+    como outro qualquer.
+    """
+
+    __slots__ = ('codes', 'values')
+
+    def __init__(self, codes: array, values: List[Optional[str]]):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def encode(cls, items: Iterable[Optional[str]]) -> 'DictionaryColumn':
+        index = {}
+        values = []
+        codes = array('i')
+        for item in items:
+            code = index.get(item)
+            if code is None:
+                code = index[item] = len(values)
+                values.append(item)
+            codes.append(code)
+        return cls(codes, values)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        return self.values[self.codes[i]]
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return map(self.values.__getitem__, self.codes)
+
+    def slice(self, start: int, stop: int) -> Iterator[Optional[str]]:
+        return map(self.values.__getitem__, self.codes[start:stop])
+
+    def take(self, indices: Sequence[int]) -> 'DictionaryColumn':
+        return DictionaryColumn(array('i', map(self.codes.__getitem__, indices)), self.values)
+
+    @classmethod
+    def concat(cls, parts: Sequence['DictionaryColumn']) -> 'DictionaryColumn':
+        """Une colunas de lotes diferentes em um dicionário único (só os códigos são remapeados)"""
+        index = {}
+        values = []
+        codes = array('i')
+        for part in parts:
+            remap = []
+            for value in part.values:
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(values)
+                    values.append(value)
+                remap.append(code)
+            codes.extend(map(remap.__getitem__, part.codes))
+        return cls(codes, values)
+
+
+class NumericColumn:
+    """Coluna numérica em array de doubles (8 bytes por linha, sem objetos float)"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: array):
+        self.data = data
+
+    @classmethod
+    def encode(cls, items: Iterable[float]) -> 'NumericColumn':
+        return cls(array('d', items))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, i: int) -> float:
+        return self.data[i]
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self.data)
+
+    def slice(self, start: int, stop: int) -> Iterator[float]:
+        return iter(self.data[start:stop])
+
+    def take(self, indices: Sequence[int]) -> 'NumericColumn':
+        return NumericColumn(array('d', map(self.data.__getitem__, indices)))
+
+    @classmethod
+    def concat(cls, parts: Sequence['NumericColumn']) -> 'NumericColumn':
+        data = array('d')
+        for part in parts:
+            data.extend(part.data)
+        return cls(data)
+
+
+class EmbalagemRow:
+    """Visão de uma linha de EmbalagemBatch, com os mesmos atributos de TempEmbalagem"""
+
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch: 'EmbalagemBatch', index: int):
+        self.batch = batch
+        self.index = index
+
+    def __getattr__(self, name: str):
+        if name in COLUMN_FIELDS:
+            return self.batch.columns[name][self.index]
+        if name in ('Status', 'Usuario', 'Data_Registro'):
+            return getattr(self.batch, name)
+        raise AttributeError(name)
+
+    def get_unique_key(self) -> str:
+        return f"{self.Remessa}+{self.Loja}+{self.Codigo}+{self.Qtde_Emb}"
+
+    def to_tuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in ROW_FIELDS)
+
+    def to_dict(self) -> Dict:
+        values = {name: getattr(self, name) for name in ROW_FIELDS}
+        values['Data_Registro'] = self.batch.Data_Registro
+        return values
+
+
+class EmbalagemBatch:
+    """
+    Lote de registros de temp_embalagem em colunas, do parse do upload até
+    o INSERT. Substitui um TempEmbalagem (ou uma tupla) por linha: textos
+    codificados por dicionário, números em arrays, e Status, Usuario e
+    Data_Registro únicos para o lote (um só timestamp).
+    """
+
+    __slots__ = ('columns', 'Status', 'Usuario', 'Data_Registro')
+
+    def __init__(self, columns: Dict[str, Union[DictionaryColumn, NumericColumn]],
+                 Status: str = 'Pendente', Usuario: Optional[str] = None,
+                 Data_Registro: Optional[str] = None):
+        self.columns = columns
+        self.Status = Status
+        self.Usuario = Usuario
+        self.Data_Registro = Data_Registro or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> 'EmbalagemBatch':
+        """Monta o lote a partir de tuplas de TempEmbalagem.to_tuple()"""
+        rows = rows if isinstance(rows, list) else list(rows)
+        status = rows[0][13] if rows else 'Pendente'
+        usuario = rows[0][14] if rows else None
+        if any(row[13] != status or row[14] != usuario for row in rows):
+            raise ValueError("Status e Usuario devem ser iguais em todo o lote")
+        columns = {}
+        for position, name in enumerate(COLUMN_FIELDS):
+            values = (row[position] for row in rows)
+            encoder = NumericColumn if name in NUMERIC_FIELDS else DictionaryColumn
+            columns[name] = encoder.encode(values)
+        return cls(columns, Status=status, Usuario=usuario)
+
+    @classmethod
+    def concat(cls, batches: Sequence['EmbalagemBatch']) -> 'EmbalagemBatch':
+        """Une vários lotes (ex.: um por planilha) em um só, na ordem recebida"""
+        if not batches:
+            return cls.from_rows([])
+        first = batches[0]
+        if any(batch.Status != first.Status or batch.Usuario != first.Usuario for batch in batches):
+            raise ValueError("Status e Usuario devem ser iguais em todos os lotes")
+        columns = {}
+        for name in COLUMN_FIELDS:
+            column_type = NumericColumn if name in NUMERIC_FIELDS else DictionaryColumn
+            columns[name] = column_type.concat([batch.columns[name] for batch in batches])
+        return cls(columns, Status=first.Status, Usuario=first.Usuario)
+
+    def __len__(self) -> int:
+        return len(self.columns['Remessa'])
+
+    def __getitem__(self, index: int) -> EmbalagemRow:
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return EmbalagemRow(self, index % len(self))
+
+    def __iter__(self) -> Iterator[EmbalagemRow]:
+        return (EmbalagemRow(self, i) for i in range(len(self)))
+
+    def unique_keys(self) -> List[str]:
+        """Chaves de duplicidade (mesmas de get_unique_key) de todas as linhas, por coluna"""
+        columns = self.columns
+        return list(map('{}+{}+{}+{}'.format, columns['Remessa'], columns['Loja'],
+                        columns['Codigo'], columns['Qtde_Emb']))
+
+    def take(self, indices: Sequence[int]) -> 'EmbalagemBatch':
+        """Novo lote só com as linhas ``indices`` (dicionários compartilhados)"""
+        return EmbalagemBatch({name: column.take(indices) for name, column in self.columns.items()},
+                              Status=self.Status, Usuario=self.Usuario, Data_Registro=self.Data_Registro)
+
+    def iter_rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple]:
+        """Tuplas de to_tuple() geradas sob demanda (nada fica guardado por linha)"""
+        stop = len(self) if stop is None else stop
+        columns = [self.columns[name].slice(start, stop) for name in COLUMN_FIELDS]
+        return zip(*columns, repeat(self.Status), repeat(self.Usuario))
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[List[tuple]]:
+        for start in range(0, len(self), chunk_size):
+            yield list(self.iter_rows(start, start + chunk_size))
+
+    def to_tuples(self) -> List[tuple]:
+        return list(self.iter_rows())
+
+    def nbytes(self) -> int:
+        """Memória aproximada das colunas (códigos e arrays; os textos distintos à parte)"""
+        total = 0
+        for column in self.columns.values():
+            data = column.codes if isinstance(column, DictionaryColumn) else column.data
+            total += data.itemsize * len(data)
+        return total
+
+
 @dataclass
 class EmbalagemStats:
     """Estatísticas do módulo de embalagem"""
@@ -1,14 +1,45 @@
 """
 Rotas específicas do módulo de embalagem
 """
-from flask import Blueprint, jsonify, request, render_template
+from flask import Blueprint, Response, jsonify, request, render_template
+import hashlib
 import logging
 from datetime import datetime
 
+from models.embalagem import EmbalagemBatch
 from services.embalagem_service import embalagem_service
+from services.export_engine import export_format_error
+from services.job_manager import JobQueueFullError, job_manager
+from services.stats_broadcaster import stats_broadcaster
+from utils.metrics import metrics
+from utils.query_filters import match_mode
 from utils.upload_handler import upload_handler
 
 embalagem_bp = Blueprint('embalagem', __name__)
+metrics.instrument_blueprint(embalagem_bp)
+
+def _job_accepted(kind, func, *args, **kwargs):
+    """Enfileira a tarefa e responde 202 com o ID para acompanhamento"""
+    try:
+        job_id = job_manager.submit(kind, func, *args, **kwargs)
+    except JobQueueFullError as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}'
+    }), 202
+
+def _cached_page_response(body: bytes, etag: str):
+    """Resposta JSON da listagem com ETag; 304 quando o cliente já tem a versão"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # O navegador guarda a página, mas revalida a cada uso (If-None-Match)
+    response.cache_control.no_cache = True
+    return response
 
 @embalagem_bp.route('/api/embalagem/stats')
 def get_stats():
@@ -35,47 +66,111 @@ def get_stats():
         logging.error(f"Erro na API de estatísticas: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@embalagem_bp.route('/api/embalagem/stats/stream')
+def stream_stats():
+    """Estatísticas do dashboard e do faturamento por Server-Sent Events"""
+    subscriber = stats_broadcaster.subscribe()
+    if subscriber is None:
+        # Limite de telas do worker: o cliente passa a consultar /api/embalagem/stats
+        response = jsonify({'success': False, 'error': 'Limite de conexões do stream atingido'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+    response = Response(
+        stats_broadcaster.stream(subscriber),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Também quando o cliente desconecta antes do primeiro evento
+    response.call_on_close(lambda: stats_broadcaster.unsubscribe(subscriber))
+    return response
+
 @embalagem_bp.route('/api/embalagem/upload', methods=['POST'])
 def upload_planilha():
-    """API para upload de planilha"""
+    """
+    API para upload de planilhas
+    Aceita um arquivo ('file'), vários ('files' ou 'file' repetido) e
+    arquivos .zip com planilhas. Todas são lidas em paralelo e gravadas
+    juntas (uma deduplicação, uma transação); 'files' na resposta traz o
+    resultado de cada planilha.
+    """
     try:
-        if 'file' not in request.files:
+        uploaded = request.files.getlist('file') + request.files.getlist('files')
+        if not uploaded:
             return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
+
+        uploaded = [f for f in uploaded if f.filename]
+        if not uploaded:
             return jsonify({'success': False, 'error': 'Nenhum arquivo selecionado'}), 400
         
-        # Validar formato do arquivo
-        if not upload_handler.validate_file_format(file):
+        # Validar formato dos arquivos
+        invalid = [f.filename for f in uploaded if not upload_handler.validate_file_format(f)]
+        if invalid:
             return jsonify({
                 'success': False, 
-                'error': 'Formato de arquivo inválido. Use apenas .xlsx ou .xls'
+                'error': f"Formato de arquivo inválido ({', '.join(invalid)}). Use .xlsx, .xls, .csv, .parquet ou .zip"
             }), 400
-        
-        # Processar arquivo
-        records = upload_handler.parse_excel_file(file)
-        
-        if records is None:
-            return jsonify({
-                'success': False, 
-                'error': 'Erro ao processar arquivo. Verifique o formato e colunas obrigatórias.'
-            }), 400
-        
+
+        # Arquivos gravados em disco durante o parse (apagados ao sair do bloco)
+        try:
+            with upload_handler.spool_uploads(uploaded) as workbooks:
+                # Processar arquivos (em paralelo quando houver mais de um)
+                parsed = upload_handler.parse_many(workbooks)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        multiple = len(workbooks) > 1
+
+        files_report = []
+        batches = []
+        row_errors = []
+        total_row_errors = 0
+        for (filename, _), result in zip(workbooks, parsed):
+            if result is None:
+                files_report.append({'filename': filename, 'success': False,
+                                     'error': 'Erro ao processar arquivo. Verifique o formato e colunas obrigatórias.'})
+                continue
+            batch, errors = result
+            total_row_errors += len(errors)
+            # Só os primeiros erros vão na resposta (o total é sempre informado)
+            errors_kept = errors[:max(0, upload_handler.MAX_ROW_ERRORS - len(row_errors))]
+            row_errors.extend(dict(error, arquivo=filename) if multiple else error for error in errors_kept)
+            files_report.append({'filename': filename, 'success': True, 'records': len(batch),
+                                 'rows_with_errors': len(errors)})
+            batches.append(batch)
+
+        if not batches:
+            error = files_report[0]['error'] if not multiple else 'Nenhuma planilha pôde ser processada'
+            return jsonify({'success': False, 'error': error, 'data': {'files': files_report}}), 400
+
+        records = EmbalagemBatch.concat(batches)
+        row_errors_data = {
+            'rows_with_errors': total_row_errors,
+            'row_errors': row_errors
+        }
+
         if not records:
             return jsonify({
-                'success': False, 
-                'error': 'Nenhum registro válido encontrado no arquivo'
+                'success': False,
+                'error': 'Nenhum registro válido encontrado no arquivo',
+                'data': dict(row_errors_data, files=files_report)
             }), 400
-        
+
         # Processar upload
-        result = embalagem_service.process_upload(records)
+        result = embalagem_service.process_upload(records, part_sizes=[len(batch) for batch in batches])
+        result.update(row_errors_data)
+        # Contagens por arquivo só vêm quando o upload foi gravado
+        parts = result.pop('parts', None)
+        if parts:
+            parts = iter(parts)
+            for report in files_report:
+                if report['success']:
+                    report.update(next(parts, {}))
+        result['files'] = files_report
         
         if result['success']:
             return jsonify({
                 'success': True,
-                'message': f"Upload realizado com sucesso! {result['valid_records']} registros inseridos.",
+                'message': f"Upload realizado com sucesso! {result['valid_records']} registros inseridos"
+                           + (f" de {len(workbooks)} planilhas." if multiple else "."),
                 'data': result
             })
         else:
@@ -104,16 +199,35 @@ def get_data():
             'status': request.args.get('status'),
             'remessa': request.args.get('remessa'),
             'loja': request.args.get('loja'),
-            'codigo': request.args.get('codigo')
+            'codigo': request.args.get('codigo'),
+            'busca': request.args.get('busca')
         }
         
         # Remover filtros vazios
         filters = {k: v for k, v in filters.items() if v}
-        
-        result = embalagem_service.get_paginated_data(page, per_page, filters)
-        
+
+        # Modo de paginação: 'offset' (padrão) ou 'keyset' com cursor opaco
+        keyset = request.args.get('mode', 'offset') == 'keyset'
+        cursor = request.args.get('cursor') or None
+        include_total = request.args.get('total', '1') != '0'
+
+        # Página já renderizada para os mesmos filtros e a mesma versão dos dados
+        # (compartilhada entre os workers): responde sem consultar a listagem
+        # (ou com 304, se o cliente já a tem). Sem versão, não usa o cache
+        version = embalagem_service.shared_version()
+        cache_key = (version, tuple(sorted(filters.items())), page, per_page,
+                     keyset, cursor, include_total) if version else None
+        cached = embalagem_service.page_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return _cached_page_response(*cached)
+
+        result = embalagem_service.get_paginated_data(
+            page, per_page, filters,
+            cursor=cursor, keyset=keyset, include_total=include_total
+        )
+
         if result:
-            return jsonify({
+            body = jsonify({
                 'success': True,
                 'data': result['data'],
                 'pagination': {
@@ -122,12 +236,21 @@ def get_data():
                     'total_records': result['total_records'],
                     'per_page': result['per_page'],
                     'has_next': result['has_next'],
-                    'has_prev': result['has_prev']
+                    'has_prev': result['has_prev'],
+                    'mode': result['mode'],
+                    'next_cursor': result['next_cursor']
                 }
-            })
+            }).get_data()
+            # ETag pelo conteúdo: vale entre workers e entre versões iguais
+            cached = (body, hashlib.sha1(body).hexdigest())
+            if cache_key:
+                embalagem_service.page_cache.set(cache_key, cached)
+            return _cached_page_response(*cached)
         else:
             return jsonify({'success': False, 'error': 'Erro ao obter dados'}), 500
-            
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Erro na API de dados: {e}")
         return jsonify({'success': False, 'error': str(e)}
@@ -151,6 +274,46 @@ def get_record_details(record_id):
         logging.error(f"Erro ao obter detalhes do registro: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@embalagem_bp.route('/api/embalagem/records', methods=['GET', 'POST'])
+def get_records_details():
+    """
+    API para obter detalhes de vários registros em uma consulta: por IDs
+    (?ids=1,2,3 ou JSON {"ids": [...]}) ou todos os itens de uma remessa
+    (?remessa=X ou JSON {"remessa": "X"})
+    """
+    try:
+        payload = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+        ids = payload.get('ids')
+        if ids is None and request.args.get('ids'):
+            ids = request.args.get('ids').split(',')
+        remessa = payload.get('remessa') or request.args.get('remessa')
+        limit = embalagem_service.record_batch_limit
+
+        if ids and remessa:
+            return jsonify({'success': False, 'error': 'Informe ids ou remessa, não ambos'}), 400
+        if ids:
+            if not isinstance(ids, list):
+                return jsonify({'success': False, 'error': 'ids deve ser uma lista'}), 400
+            try:
+                record_ids = [int(record_id) for record_id in ids]
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'IDs inválidos'}), 400
+            if len(record_ids) > limit:
+                return jsonify({'success': False, 'error': f'Máximo de {limit} IDs por pedido'}), 400
+            result = embalagem_service.get_records_by_ids(record_ids)
+        elif remessa:
+            result = embalagem_service.get_records_by_remessa(str(remessa).strip(), limit)
+        else:
+            return jsonify({'success': False, 'error': 'Informe ids ou remessa'}), 400
+
+        if result is None:
+            return jsonify({'success': False, 'error': 'Erro ao obter registros'}), 500
+        return jsonify({'success': True, 'total': len(result['data']), **result})
+
+    except Exception as e:
+        logging.error(f"Erro ao obter detalhes dos registros: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @embalagem_bp.route('/api/embalagem/export')
 def export_data():
     """API para exportar dados filtrados"""
@@ -162,15 +325,37 @@ def export_data():
             'status': request.args.get('status'),
             'remessa': request.args.get('remessa'),
             'loja': request.args.get('loja'),
-            'codigo': request.args.get('codigo')
+            'codigo': request.args.get('codigo'),
+            'busca': request.args.get('busca')
         }
         
         # Remover filtros vazios
         filters = {k: v for k, v in filters.items() if v}
         
+        match_mode(filters)
+
         # Formato de exportação
         export_format = request.args.get('format', 'excel')
-        
+        format_error = export_format_error(export_format)
+        if format_error:
+            return jsonify({'success': False, 'error': format_error}), 400
+
+        # stream=1: CSV enviado direto na resposta, à medida que é lido do banco
+        if request.args.get('stream') == '1':
+            filename = f"embalagem_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            return Response(
+                embalagem_service.stream_export_csv(filters),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
+
+        # async=1: roda em segundo plano e devolve o ID da tarefa
+        if request.args.get('async') == '1':
+            return _job_accepted(
+                'export',
+                lambda progress: embalagem_service.export_data(filters, export_format, progress=progress)
+            )
+
         result = embalagem_service.export_data(filters, export_format)
         
         if result:
@@ -183,6 +368,8 @@ def export_data():
         else:
             return jsonify({'success': False, 'error': 'Erro na exportação'}), 500
             
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Erro na exportação: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -197,8 +384,13 @@ def export_custom():
         remessa = data.get('remessa', '')
         data_inicio = data.get('data_inicio', '')
         data_fim = data.get('data_fim', '')
+        export_format = data.get('format', 'excel')
         
         # Validações básicas
+        format_error = export_format_error(export_format)
+        if format_error:
+            return jsonify({'success': False, 'error': format_error}), 400
+
         if export_type == 'remessa' and not remessa:
             return jsonify({
                 'success': False,
@@ -211,12 +403,26 @@ def export_custom():
                 'error': 'Pelo menos uma data deve ser informada'
             }), 400
         
+        if data.get('async'):
+            return _job_accepted(
+                'export',
+                lambda progress: embalagem_service.export_custom_data(
+                    export_type=export_type,
+                    remessa=remessa,
+                    data_inicio=data_inicio,
+                    data_fim=data_fim,
+                    export_format=export_format,
+                    progress=progress
+                )
+            )
+
         # Processar exportação
         result = embalagem_service.export_custom_data(
             export_type=export_type,
             remessa=remessa,
             data_inicio=data_inicio,
-            data_fim=data_fim
+            data_fim=data_fim,
+            export_format=export_format
         )
         
         if result:
@@ -244,6 +450,12 @@ def export_faturamento():
         data = request.get_json()
         usuario = data.get('usuario', 'Sistema')  # Usuário que está fazendo a exportação
         
+        if data.get('async'):
+            return _job_accepted(
+                'faturamento',
+                lambda progress: embalagem_service.export_faturamento(usuario, progress=progress)
+            )
+
         # Processar exportação de faturamento
         result = embalagem_service.export_faturamento(usuario)
         
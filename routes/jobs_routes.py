@@ -0,0 +1,35 @@
+"""
+Rotas de acompanhamento das tarefas em segundo plano
+"""
+from flask import Blueprint, jsonify
+import logging
+
+from services.job_manager import job_manager
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """API para consultar fase, progresso e resultado de uma tarefa"""
+    try:
+        job = job_manager.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Tarefa não encontrada'}), 404
+        return jsonify({'success': True, 'data': job})
+    except Exception as e:
+        logging.error(f"Erro ao consultar tarefa: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@jobs_bp.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@jobs_bp.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """API para cancelar uma tarefa na fila ou em execução"""
+    try:
+        if job_manager.cancel(job_id):
+            return jsonify({'success': True, 'message': 'Cancelamento solicitado'})
+        if job_manager.get(job_id) is None:
+            return jsonify({'success': False, 'error': 'Tarefa não encontrada'}), 404
+        return jsonify({'success': False, 'error': 'A tarefa já foi concluída'}), 409
+    except Exception as e:
+        logging.error(f"Erro ao cancelar tarefa: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
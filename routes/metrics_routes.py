@@ -0,0 +1,77 @@
+"""
+Exposição das métricas no formato do Prometheus
+"""
+from flask import Blueprint, Response, jsonify
+
+from database import db
+from services.embalagem_service import embalagem_service
+from services.export_store import export_store
+from services.stats_broadcaster import stats_broadcaster
+from utils.metrics import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def _gauges():
+    """Valores instantâneos: pool de conexões e caches do serviço"""
+    pool = db.pool_stats()
+    gauges = {}
+    if pool:
+        gauges['embalagem_db_pool_connections'] = (
+            'Conexões do pool por estado',
+            {'{state="in_use"}': pool['in_use'], '{state="idle"}': pool['idle'], '{state="size"}': pool['size']}
+        )
+    gauges['embalagem_stats_stream_subscribers'] = (
+        'Telas conectadas ao stream de estatísticas', {'': stats_broadcaster.subscriber_count}
+    )
+    gauges['embalagem_data_version'] = (
+        'Versão dos dados da listagem (incrementa a cada escrita da aplicação)',
+        {'': embalagem_service.data_version.value}
+    )
+    exports = export_store.stats()
+    gauges['embalagem_export_store_files'] = (
+        'Arquivos no armazém de exportações', {'{pinned="false"}': exports['entries'] - exports['pinned'],
+                                               '{pinned="true"}': exports['pinned']}
+    )
+    gauges['embalagem_export_store_bytes'] = ('Tamanho total do armazém de exportações', {'': exports['bytes']})
+    return gauges
+
+def _counters():
+    """Contagens acumuladas desde o início do processo (rate()/increase() no Prometheus)"""
+    pool = db.pool_stats()
+    counters = {}
+    if pool:
+        counters['embalagem_db_pool_exhausted_total'] = (
+            'Checkouts que estouraram o tempo de espera', {'': pool['exhausted']}
+        )
+        counters['embalagem_db_pool_wait_seconds_total'] = (
+            'Tempo de espera por conexão', {'': pool['wait_time_total']}
+        )
+    caches = {'stats': embalagem_service.stats_cache, 'count': embalagem_service.count_cache,
+              'page': embalagem_service.page_cache}
+    counters['embalagem_cache_requests_total'] = (
+        'Consultas aos caches do serviço',
+        {f'{{cache="{name}",result="{result}"}}': getattr(cache, attr)
+         for name, cache in caches.items() for result, attr in (('hit', 'hits'), ('miss', 'misses'))}
+    )
+    counters['embalagem_stats_stream_refreshes_total'] = (
+        'Cálculos de estatísticas feitos pelo agregador', {'': stats_broadcaster.refreshes}
+    )
+    counters['embalagem_stats_stream_rejected_total'] = (
+        'Conexões ao stream recusadas pelo limite de telas do processo', {'': stats_broadcaster.rejected}
+    )
+    exports = export_store.stats()
+    counters['embalagem_export_store_requests_total'] = (
+        'Pedidos de exportação atendidos com arquivo já gerado ou novo',
+        {'{result="hit"}': exports['hits'], '{result="miss"}': exports['misses']}
+    )
+    counters['embalagem_export_store_evicted_total'] = (
+        'Arquivos removidos pela limpeza do armazém', {'': exports['evicted']}
+    )
+    return counters
+
+@metrics_bp.route('/metrics')
+def get_metrics():
+    """Métricas do processo (cada worker do gunicorn expõe as suas)"""
+    if not metrics.enabled:
+        return jsonify({'success': False, 'error': 'Métricas desabilitadas (METRICS_ENABLED=0)'}), 404
+    return Response(metrics.render(_gauges(), _counters()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,19 +1,112 @@
 """
 Serviços de negócio para o módulo de embalagem
 """
-import json
 import os
 from datetime import datetime, date
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import logging
 import math
+import tempfile
+import time
+from itertools import chain, compress
 
 from database import db
-from models.embalagem import TempEmbalagem, EmbalagemStats
+from models.embalagem import EmbalagemBatch, EmbalagemStats
+from services.export_engine import EXPORT_EXTENSIONS, export_query_to_file, stream_query_as_csv
+from services.export_store import export_store
+from services.job_manager import JobCancelled
+from services.remessa_resumo import RESUMO_PRONTA_CONDITION, remessa_resumo
+from utils.cache import LRUCache, TTLCache, VersionCounter
+from utils.dedupe_index import DedupeIndex
+from utils.metrics import metrics
+from utils.query_filters import (
+    KEYSET_CONDITION, TODAY_CONDITION, build_where_clause, encode_cursor, keyset_params
+)
+
+# Colunas gravadas no upload, na ordem de TempEmbalagem.to_tuple()
+INSERT_COLUMNS = (
+    'Loja', 'Remessa', 'Local', 'Ordem', 'Posicao_Deposito', 'Codigo',
+    'Descricao_Produto', 'UM', 'Qtde_Emb', 'Qtde_CX', 'Qtde_UM',
+    'Estoque', 'EAN', 'Status', 'Usuario'
+)
+
+# Colunas devolvidas nos detalhes de um registro (individual e em lote) e na
+# listagem, que a tela reaproveita para abrir os detalhes sem novo pedido
+RECORD_DETAIL_COLUMNS = """id, Loja, Remessa, Local, Ordem, Posicao_Deposito, Codigo,
+                       Descricao_Produto, UM, Qtde_Emb, Qtde_CX, Qtde_UM,
+                       Estoque, EAN, Status, Usuario, Data_Registro"""
+
+# Lock nomeado que serializa faturamentos concorrentes (GET_LOCK do MySQL)
+FATURAMENTO_LOCK = 'embalagem_faturamento'
+# Tabela temporária (por conexão) com as remessas sendo faturadas
+FATURAMENTO_TEMP_TABLE = 'tmp_faturamento_remessas'
+
+# Tipos das colunas da exportação filtrada nos formatos tipados (Parquet, CSV gzip)
+EXPORT_COLUMN_TYPES = {
+    'ID': 'int64',
+    'Qtde Embalagem': 'float64',
+    'Qtde Caixa': 'float64',
+    'Qtde UM': 'float64',
+    'Estoque': 'float64',
+    'Data Registro': 'timestamp[s]',
+    'Total Pallets': 'int64',
+}
+
+# Tipos de arquivo no armazém de exportações (prefixo do nome do arquivo)
+EXPORT_KIND = 'embalagem_export'
+FATURAMENTO_KIND = 'faturamento'
+
+FATURAMENTO_COLUMN_WIDTHS = {
+    'A': 15,  # Remessa
+    'B': 10,  # Loja
+    'C': 15,  # Codigo
+    'D': 40,  # Descricao_Produto
+    'E': 8,   # UM
+    'F': 12,  # Atendido
+    'G': 15,  # Usuario
+    'H': 15   # Total_Pallets
+}
 
 class EmbalagemService:
     def __init__(self):
         self.duplicate_log_file = 'data/duplicate_keys.json'
+        self.dedupe_index = DedupeIndex(
+            os.getenv('EMBALAGEM_DEDUPE_INDEX', 'data/dedupe_index.sqlite3'),
+            legacy_json=self.duplicate_log_file,
+            pending_timeout=float(os.getenv('EMBALAGEM_DEDUPE_PENDING_TIMEOUT', '900')),
+            verify_pending=self._persisted_keys
+        )
+        # Quanto um upload espera por linhas que outro upload simultâneo está gravando
+        self.dedupe_wait_seconds = float(os.getenv('EMBALAGEM_DEDUPE_WAIT_SECONDS', '30'))
+        # Linhas por INSERT multi-linha (limita o tamanho do pacote enviado)
+        self.insert_chunk_size = int(os.getenv('EMBALAGEM_INSERT_CHUNK_SIZE', '1000'))
+        # A partir de quantas linhas usar LOAD DATA LOCAL INFILE (0 = desabilitado)
+        self.load_data_threshold = int(os.getenv('EMBALAGEM_LOAD_DATA_THRESHOLD', '0'))
+        # Máximo de registros por pedido de detalhes em lote
+        self.record_batch_limit = int(os.getenv('EMBALAGEM_RECORD_BATCH_LIMIT', '1000'))
+        # Estatísticas do dashboard: várias telas consultando ao mesmo tempo
+        # custam uma query por janela de TTL
+        self.stats_cache = TTLCache(ttl=float(os.getenv('EMBALAGEM_STATS_CACHE_TTL', '5')))
+        # Totais da listagem por combinação de filtros (trocas de página não recontam)
+        self.count_cache = TTLCache(ttl=float(os.getenv('EMBALAGEM_COUNT_CACHE_TTL', '60')))
+        # Escritas feitas por este processo (métrica embalagem_data_version)
+        self.data_version = VersionCounter()
+        # Versão de temp_embalagem compartilhada entre os workers (table_version),
+        # consultada no máximo uma vez por janela de TTL por processo
+        self.version_cache = TTLCache(ttl=float(os.getenv('EMBALAGEM_TABLE_VERSION_TTL', '2')))
+        # Páginas da listagem já renderizadas (JSON + ETag), por filtros e página.
+        # A versão compartilhada entra na chave: escritas de outros workers e do
+        # WMS aparecem em até EMBALAGEM_TABLE_VERSION_TTL segundos
+        self.page_cache = LRUCache(
+            maxsize=int(os.getenv('EMBALAGEM_PAGE_CACHE_SIZE', '256')),
+            ttl=float(os.getenv('EMBALAGEM_PAGE_CACHE_TTL', '30'))
+        )
+        # Chamados após cada escrita (ex.: agregador das estatísticas em tempo real)
+        self._change_listeners = []
+        # Colunas com índice FULLTEXT ngram (busca por substring); detectadas no primeiro uso
+        self._fulltext_columns = None
+        # Se temp_embalagem tem a coluna Atualizado_Em (migração 004); detectado no primeiro uso
+        self._has_change_marker = None
         self._ensure_data_directory()
     
     def _ensure_data_directory(self):
@@ -21,65 +114,49 @@ class EmbalagemService:
         os.makedirs('data', exist_ok=True)
     
     def get_dashboard_stats(self) -> Optional[EmbalagemStats]:
-        """Obtém estatísticas para o dashboard - apenas dados do dia atual"""
+        """
+        Obtém estatísticas para o dashboard - apenas dados do dia atual
+        O resultado fica em cache por alguns segundos e é invalidado por
+        uploads e faturamentos (invalidate_caches)
+        """
+        return self.stats_cache.get_or_load('dashboard', self._load_dashboard_stats)
+    
+    def _load_dashboard_stats(self) -> Optional[EmbalagemStats]:
+        """Calcula as estatísticas do dia em uma única passada pela tabela"""
         try:
-            # Total de remessas únicas do dia atual
-            query_remessas = """
-                SELECT COUNT(DISTINCT Remessa) as total 
-                FROM temp_embalagem 
-                WHERE DATE(Data_Registro) = CURDATE()
-            """
-            result_remessas = db.execute_query(query_remessas)
-            total_remessas = result_remessas[0]['total'] if result_remessas else 0
-            
-            # Contagem por status do dia atual
-            query_status = """
-                SELECT Status, COUNT(*) as count 
+            query = f"""
+                SELECT 
+                    COUNT(DISTINCT Remessa) as total_remessas,
+                    COALESCE(SUM(Status = 'Pendente'), 0) as pendentes,
+                    COALESCE(SUM(Status = 'em_separacao'), 0) as em_separacao,
+                    COALESCE(SUM(Status = 'Finalizado'), 0) as finalizados,
+                    COALESCE(SUM(Status = 'Faturado'), 0) as faturados,
+                    COALESCE(SUM(Qtde_Emb = 0 AND Status IN ('Finalizado', 'Faturado')), 0) as itens_com_corte
                 FROM temp_embalagem 
-                WHERE DATE(Data_Registro) = CURDATE()
-                GROUP BY Status
+                WHERE {TODAY_CONDITION}
             """
-            result_status = db.execute_query(query_status)
+            result = db.execute_query(query, name='dashboard_stats')
             
-            status_counts = {
-                'Pendente': 0,
-                'em_separacao': 0,
-                'Finalizado': 0,
-                'Faturado': 0
-            }
+            if result is None:
+                return None
             
-            if result_status:
-                for row in result_status:
-                    if row['Status'] in status_counts:
-                        status_counts[row['Status']] = row['count']
+            row = result[0] if result else {}
+            finalizados = int(row.get('finalizados') or 0)
+            faturados = int(row.get('faturados') or 0)
             
-            # Cálculo do percentual de corte do dia atual
-            query_corte = """
-                SELECT 
-                    COUNT(*) as total_itens,
-                    SUM(CASE WHEN Qtde_Emb = 0 AND Status IN ('Finalizado', 'Faturado') THEN 1 ELSE 0 END) as itens_com_corte
-                FROM temp_embalagem
-                WHERE DATE(Data_Registro) = CURDATE()
-                AND Status IN ('Finalizado', 'Faturado')
-            """
-            result_corte = db.execute_query(query_corte)
-            
-            total_itens = 0
-            itens_com_corte = 0
+            # Percentual de corte sobre os itens finalizados/faturados do dia
+            total_itens = finalizados + faturados
+            itens_com_corte = int(row.get('itens_com_corte') or 0)
             percentual_corte = 0.0
-            
-            if result_corte and result_corte[0]['total_itens']:
-                total_itens = result_corte[0]['total_itens']
-                itens_com_corte = result_corte[0]['itens_com_corte'] or 0
-                if total_itens > 0:
-                    percentual_corte = round((itens_com_corte / total_itens) * 100, 2)
+            if total_itens > 0:
+                percentual_corte = round((itens_com_corte / total_itens) * 100, 2)
             
             return EmbalagemStats(
-                total_remessas=total_remessas,
-                pendentes=status_counts['Pendente'],
-                em_separacao=status_counts['em_separacao'],
-                finalizados=status_counts['Finalizado'],
-                faturados=status_counts['Faturado'],
+                total_remessas=int(row.get('total_remessas') or 0),
+                pendentes=int(row.get('pendentes') or 0),
+                em_separacao=int(row.get('em_separacao') or 0),
+                finalizados=finalizados,
+                faturados=faturados,
                 percentual_corte=percentual_corte,
                 total_itens=total_itens,
                 itens_com_corte=itens_com_corte
@@ -89,101 +166,236 @@ class EmbalagemService:
             logging.error(f"Erro ao obter estatísticas: {e}")
             return None
     
-    def _load_duplicate_keys(self) -> Dict:
-        """Carrega chaves duplicadas do arquivo JSON"""
-        if os.path.exists(self.duplicate_log_file):
-            try:
-                with open(self.duplicate_log_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logging.error(f"Erro ao carregar arquivo de duplicatas: {e}")
-        return {}
-    
-    def _save_duplicate_keys(self, duplicate_keys: Dict):
-        """Salva chaves duplicadas no arquivo JSON"""
-        try:
-            with open(self.duplicate_log_file, 'w', encoding='utf-8') as f:
-                json.dump(duplicate_keys, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logging.error(f"Erro ao salvar arquivo de duplicatas: {e}")
+    def invalidate_caches(self):
+        """Descarta resultados em cache após uma escrita (upload, faturamento)"""
+        self.data_version.bump()
+        self.version_cache.invalidate()
+        self.stats_cache.invalidate()
+        self.count_cache.invalidate()
+        self.page_cache.invalidate()
+        for listener in self._change_listeners:
+            listener()
+
+    def add_change_listener(self, listener):
+        """Registra uma função chamada (sem argumentos) após cada escrita da aplicação"""
+        self._change_listeners.append(listener)
     
-    def validate_and_filter_duplicates(self, records: List[TempEmbalagem]) -> tuple[List[TempEmbalagem], List[str]]:
+    def validate_and_filter_duplicates(self, records: Union[EmbalagemBatch, List[tuple]],
+                                       day: Optional[str] = None) -> tuple[EmbalagemBatch, List[str]]:
         """
         Valida e filtra registros duplicados baseado na chave composta
-        Retorna: (registros_validos, chaves_duplicadas)
+        Recebe um EmbalagemBatch (ou tuplas no formato de TempEmbalagem.to_tuple())
+        As chaves novas entram no índice de duplicatas do dia já como gravadas
+        (sem a reserva pendente de process_upload)
+        Retorna: (lote_valido, chaves_duplicadas)
         """
-        today = date.today().isoformat()
-        duplicate_keys = self._load_duplicate_keys()
-        
-        # Limpar chaves de dias anteriores
-        if today not in duplicate_keys:
-            duplicate_keys = {today: []}
-        else:
-            # Manter apenas as chaves do dia atual
-            duplicate_keys = {today: duplicate_keys.get(today, [])}
-        
-        valid_records = []
-        duplicate_found = []
-        today_keys = set(duplicate_keys[today])
-        
-        for record in records:
-            unique_key = record.get_unique_key()
-            
-            if unique_key not in today_keys:
-                valid_records.append(record)
-                today_keys.add(unique_key)
-                duplicate_keys[today].append(unique_key)
-            else:
-                duplicate_found.append(unique_key)
-        
-        # Salvar chaves atualizadas
-        self._save_duplicate_keys(duplicate_keys)
+        batch = self._as_batch(records)
+        keys = batch.unique_keys()
+        claimed = self.dedupe_index.claim(keys, day or date.today().isoformat(), pending=False)
+        return self._split_claimed(batch, keys, [status is True for status in claimed])
+
+    @staticmethod
+    def _persisted_keys(keys: List[str], day: str) -> set:
+        """Quais chaves de duplicidade do dia ``day`` já estão gravadas em temp_embalagem"""
+        remessas = sorted({key.split('+', 1)[0] for key in keys})
+        placeholders = ', '.join(['%s'] * len(remessas))
+        with db.get_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"""
+                    SELECT Remessa, Loja, Codigo, Qtde_Emb
+                    FROM temp_embalagem
+                    WHERE Remessa IN ({placeholders})
+                      AND Data_Registro >= %s AND Data_Registro < %s + INTERVAL 1 DAY
+                """, remessas + [day, day])
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        # Mesmo formato de EmbalagemBatch.unique_keys() (quantidade como float)
+        found = {f"{remessa}+{loja}+{codigo}+{float(qtde)}" for remessa, loja, codigo, qtde in rows}
+        return found.intersection(keys)
+
+    @staticmethod
+    def _split_claimed(batch: EmbalagemBatch, keys: List[str],
+                       claimed: List[bool]) -> tuple[EmbalagemBatch, List[str]]:
+        valid_indices = list(compress(range(len(keys)), claimed))
+        duplicate_found = [key for key, is_new in zip(keys, claimed) if not is_new]
         
-        return valid_records, duplicate_found
+        valid_batch = batch if len(valid_indices) == len(keys) else batch.take(valid_indices)
+        return valid_batch, duplicate_found
+
+    @staticmethod
+    def _as_batch(records: Union[EmbalagemBatch, List[tuple]]) -> EmbalagemBatch:
+        return records if isinstance(records, EmbalagemBatch) else EmbalagemBatch.from_rows(records)
     
-    def insert_batch_records(self, records: List[TempEmbalagem]) -> bool:
-        """Insere registros em lote no banco de dados"""
-        if not records:
-            return True
-        
-        # Query ajustada para a estrutura real da tabela
-        insert_query = """
-            INSERT INTO temp_embalagem 
-            (Loja, Remessa, Local, Ordem, Posicao_Deposito, Codigo, 
-             Descricao_Produto, UM, Qtde_Emb, Qtde_CX, Qtde_UM, 
-             Estoque, EAN, Status, Usuario)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    def insert_batch_records(self, records: Union[EmbalagemBatch, List[tuple]],
+                             chunk_size: Optional[int] = None,
+                             use_load_data: Optional[bool] = None) -> Dict:
         """
-        
-        data_list = [record.to_tuple() for record in records]
-        return db.execute_many(insert_query, data_list)
-    
-    def process_upload(self, records: List[TempEmbalagem]) -> Dict:
+        Insere registros em lote no banco de dados (EmbalagemBatch ou tuplas
+        de TempEmbalagem.to_tuple())
+
+        O upload inteiro é gravado em uma única transação, junto com o resumo
+        por remessa: ou todos os registros entram, ou nenhum. Os registros
+        são enviados em blocos de ``chunk_size`` linhas, cada bloco como um
+        INSERT com VALUES multi-linha. Acima de ``load_data_threshold`` linhas (se habilitado)
+        usa LOAD DATA LOCAL INFILE.
+        Retorna as estatísticas da inserção (linhas/s) para ajuste fino.
+        """
+        if not records:
+            return {'success': True, 'inserted': 0, 'seconds': 0.0, 'rows_per_sec': 0.0,
+                    'method': 'none', 'chunks': 0}
+
+        chunk_size = max(1, chunk_size or self.insert_chunk_size)
+        if use_load_data is None:
+            use_load_data = 0 < self.load_data_threshold <= len(records)
+
+        method = 'load_data' if use_load_data else 'multi_values'
+        started = time.perf_counter()
+        chunks = 0
+
+        try:
+            with db.transaction() as connection:
+                cursor = connection.cursor()
+                try:
+                    if use_load_data:
+                        self._load_data_infile(cursor, records)
+                        chunks = 1
+                    else:
+                        full_chunk_query = self._multi_values_insert(chunk_size)
+                        for chunk in self._iter_chunks(records, chunk_size):
+                            query = full_chunk_query if len(chunk) == chunk_size else self._multi_values_insert(len(chunk))
+                            cursor.execute(query, list(chain.from_iterable(chunk)))
+                            chunks += 1
+                    remessa_resumo.apply_inserted(cursor, records)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            metrics.observe_query('upload_insert', time.perf_counter() - started, error=True)
+            logging.error(f"Erro na inserção em lote ({method}), transação desfeita: {e}")
+            return {'success': False, 'error': str(e), 'inserted': 0, 'method': method}
+
+        elapsed = time.perf_counter() - started
+        metrics.observe_query('upload_insert', elapsed, len(records))
+        rows_per_sec = round(len(records) / elapsed, 1) if elapsed > 0 else 0.0
+        logging.info(f"Inserção em lote realizada: {len(records)} registros em {chunks} blocos "
+                     f"via {method} ({elapsed:.2f}s, {rows_per_sec} linhas/s)")
+        return {
+            'success': True,
+            'inserted': len(records),
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': rows_per_sec,
+            'method': method,
+            'chunks': chunks
+        }
+
+    @staticmethod
+    def _iter_chunks(records: Union[EmbalagemBatch, List[tuple]], chunk_size: int):
+        """Blocos de tuplas; do lote colunar só o bloco atual é materializado"""
+        if isinstance(records, EmbalagemBatch):
+            return records.iter_chunks(chunk_size)
+        return (records[start:start + chunk_size] for start in range(0, len(records), chunk_size))
+
+    @staticmethod
+    def _multi_values_insert(rows: int) -> str:
+        """Monta um INSERT com VALUES para ``rows`` linhas"""
+        placeholders = '(' + ', '.join(['%s'] * len(INSERT_COLUMNS)) + ')'
+        return (f"INSERT INTO temp_embalagem ({', '.join(INSERT_COLUMNS)}) VALUES "
+                + ', '.join([placeholders] * rows))
+
+    @staticmethod
+    def _tsv_value(value) -> str:
+        """Formata um valor no formato padrão do LOAD DATA (TAB, escape com barra)"""
+        if value is None:
+            return '\\N'
+        return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+    def _load_data_infile(self, cursor, records: Union[EmbalagemBatch, List[tuple]]):
+        """Grava os registros em um TSV temporário e carrega com LOAD DATA LOCAL INFILE"""
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv',
+                                         dir='data', delete=False) as tmp:
+            rows = records.iter_rows() if isinstance(records, EmbalagemBatch) else records
+            for record in rows:
+                tmp.write('\t'.join(map(self._tsv_value, record)))
+                tmp.write('\n')
+            tmp_path = tmp.name
+        try:
+            cursor.execute(
+                "LOAD DATA LOCAL INFILE %s INTO TABLE temp_embalagem CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+                f"({', '.join(INSERT_COLUMNS)})",
+                (os.path.abspath(tmp_path),)
+            )
+            if cursor.rowcount != len(records):
+                raise ValueError(f"LOAD DATA carregou {cursor.rowcount} de {len(records)} registros")
+        finally:
+            os.remove(tmp_path)
+
+    def process_upload(self, records: Union[EmbalagemBatch, List[tuple]],
+                       part_sizes: Optional[List[int]] = None) -> Dict:
         """
         Processa upload de registros
+        ``part_sizes``: quantidade de registros de cada arquivo, na ordem do
+        lote, quando várias planilhas chegam juntas (uma só deduplicação e uma
+        só transação); o resultado traz então as contagens por arquivo em 'parts'
         Retorna resultado da operação
         """
+        today = date.today().isoformat()
+        reserved_keys = []
         try:
-            # Validar e filtrar duplicatas
-            valid_records, duplicates = self.validate_and_filter_duplicates(records)
-            
-            # Inserir registros válidos
-            success = False
-            if valid_records:
-                success = self.insert_batch_records(valid_records)
-            else:
-                success = True  # Não há registros para inserir
+            # Validar e filtrar duplicatas. As chaves novas ficam pendentes até o
+            # fim da gravação; linhas que outro upload está gravando agora são
+            # esperadas (até dedupe_wait_seconds) em vez de virarem duplicatas
+            batch = self._as_batch(records)
+            keys = batch.unique_keys()
+            statuses = self.dedupe_index.claim(keys, today, wait=self.dedupe_wait_seconds)
+            claimed = [status is True for status in statuses]
+            valid_records, _ = self._split_claimed(batch, keys, claimed)
+            reserved_keys = list(compress(keys, claimed))
+            duplicates = [key for key, status in zip(keys, statuses) if status is False]
+            in_flight = [key for key, status in zip(keys, statuses) if status is None]
+            
+            # Inserir registros válidos (uma transação por upload)
+            insert_stats = self.insert_batch_records(valid_records)
+            # Daqui em diante as reservas seguem o resultado da gravação
+            pending_keys, reserved_keys = reserved_keys, []
+            
+            if insert_stats['success'] and valid_records:
+                # A gravação já está confirmada no banco: uma falha aqui não a
+                # desfaz. As chaves seguem pendentes e, quando retomadas,
+                # são conferidas contra temp_embalagem (_persisted_keys)
+                try:
+                    self.dedupe_index.confirm(pending_keys, today)
+                except Exception as e:
+                    logging.error(f"Erro ao confirmar chaves do upload gravado: {e}")
+                self.invalidate_caches()
+            
+            # Upload desfeito: liberar as chaves para permitir o reenvio
+            elif not insert_stats['success'] and valid_records:
+                self.dedupe_index.release(pending_keys, today)
             
             return {
-                'success': success,
+                'success': insert_stats['success'],
+                'error': insert_stats.get('error'),
                 'total_received': len(records),
                 'valid_records': len(valid_records),
                 'duplicates_found': len(duplicates),
-                'duplicate_keys': duplicates
+                'duplicate_keys': duplicates,
+                # Linhas de outro upload ainda não concluído: não gravadas, podem ser reenviadas
+                'in_flight_found': len(in_flight),
+                'in_flight_keys': in_flight,
+                'insert_stats': insert_stats,
+                'parts': self._part_counts(claimed, part_sizes) if part_sizes else None
             }
             
         except Exception as e:
             logging.error(f"Erro no processamento do upload: {e}")
+            if reserved_keys:
+                try:
+                    self.dedupe_index.release(reserved_keys, today)
+                except Exception as release_error:
+                    logging.error(f"Erro ao liberar chaves do upload: {release_error}")
             return {
                 'success': False,
                 'error': str(e),
@@ -192,71 +404,80 @@ class EmbalagemService:
                 'duplicates_found': 0
             }
     
-    def get_paginated_data(self, page: int, per_page: int, filters: Dict) -> Optional[Dict]:
-        """Obtém dados paginados com filtros aplicados"""
+    @staticmethod
+    def _part_counts(claimed: List[bool], part_sizes: List[int]) -> List[Dict]:
+        """Registros válidos e duplicados de cada arquivo do lote"""
+        parts = []
+        start = 0
+        for size in part_sizes:
+            valid = sum(claimed[start:start + size])
+            parts.append({'total_received': size, 'valid_records': valid, 'duplicates_found': size - valid})
+            start += size
+        return parts
+
+    def get_paginated_data(self, page: int, per_page: int, filters: Dict,
+                           cursor: Optional[str] = None, keyset: bool = False,
+                           include_total: bool = True) -> Optional[Dict]:
+        """
+        Obtém dados paginados com filtros aplicados
+        
+        Dois modos de paginação:
+        - OFFSET (padrão, compatível): página calculada por LIMIT/OFFSET
+        - keyset (keyset=True): busca as linhas após o ``cursor`` opaco de
+          (Data_Registro, id) devolvido na página anterior; o custo não cresce
+          com a profundidade da página
+        O total de registros é opcional (include_total) e fica em cache até
+        a próxima escrita.
+        """
         try:
             # Construir WHERE clause
-            where_conditions = []
-            params = []
-            
-            if filters.get('data_inicio'):
-                where_conditions.append("DATE(Data_Registro) >= %s")
-                params.append(filters['data_inicio'])
-            
-            if filters.get('data_fim'):
-                where_conditions.append("DATE(Data_Registro) <= %s")
-                params.append(filters['data_fim'])
-            
-            if filters.get('status'):
-                where_conditions.append("Status = %s")
-                params.append(filters['status'])
-            
-            if filters.get('remessa'):
-                where_conditions.append("Remessa LIKE %s")
-                params.append(f"%{filters['remessa']}%")
-            
-            if filters.get('loja'):
-                where_conditions.append("Loja LIKE %s")
-                params.append(f"%{filters['loja']}%")
-            
-            if filters.get('codigo'):
-                where_conditions.append("Codigo LIKE %s")
-                params.append(f"%{filters['codigo']}%")
-            
-            where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-            
-            # Contar total de registros
-            count_query = f"SELECT COUNT(*) as total FROM temp_embalagem{where_clause}"
-            count_result = db.execute_query(count_query, params)
-            total_records = count_result[0]['total'] if count_result else 0
-            
-            # Calcular paginação
-            total_pages = math.ceil(total_records / per_page)
-            offset = (page - 1) * per_page
+            where_clause, params = build_where_clause(filters, self.fulltext_columns())
+            
+            total_records = None
+            total_pages = None
+            if include_total:
+                total_records = self._count_records(where_clause, params)
+                total_pages = math.ceil(total_records / per_page)
+            
+            # Buscar uma linha a mais para saber se existe próxima página
+            if keyset:
+                data_where = where_clause
+                data_params = list(params)
+                if cursor:
+                    data_where += (" AND " if where_clause else " WHERE ") + KEYSET_CONDITION
+                    data_params += keyset_params(cursor)
+                limit_clause = "LIMIT %s"
+                data_params.append(per_page + 1)
+            else:
+                data_where = where_clause
+                data_params = params + [per_page + 1, (page - 1) * per_page]
+                limit_clause = "LIMIT %s OFFSET %s"
             
             # Buscar dados paginados
             data_query = f"""
-                SELECT id, Loja, Remessa, Local, Ordem, Posicao_Deposito, Codigo, 
-                       Descricao_Produto, UM, Qtde_Emb, Qtde_CX, Qtde_UM, 
-                       Estoque, EAN, Status, Usuario, Data_Registro
+                SELECT {RECORD_DETAIL_COLUMNS}
                 FROM temp_embalagem
-                {where_clause}
+                {data_where}
                 ORDER BY Data_Registro DESC, id DESC
-                LIMIT %s OFFSET %s
+                {limit_clause}
             """
             
-            data_params = params + [per_page, offset]
-            data_result = db.execute_query(data_query, data_params)
+            data_result = db.execute_query(data_query, data_params, name='listagem_pagina') or []
+            has_next = len(data_result) > per_page
+            data_result = data_result[:per_page]
             
             # Formatar dados
             formatted_data = []
-            if data_result:
-                for row in data_result:
-                    formatted_row = dict(row)
-                    # Formatar data para display
-                    if formatted_row['Data_Registro']:
-                        formatted_row['Data_Registro_Formatted'] = formatted_row['Data_Registro'].strftime('%d/%m/%Y %H:%M')
-                    formatted_data.append(formatted_row)
+            for row in data_result:
+                formatted_row = dict(row)
+                # Formatar data para display
+                if formatted_row['Data_Registro']:
+                    formatted_row['Data_Registro_Formatted'] = formatted_row['Data_Registro'].strftime('%d/%m/%Y %H:%M')
+                formatted_data.append(formatted_row)
+            
+            next_cursor = None
+            if has_next and data_result and data_result[-1]['Data_Registro']:
+                next_cursor = encode_cursor(data_result[-1]['Data_Registro'], data_result[-1]['id'])
             
             return {
                 'data': formatted_data,
@@ -264,125 +485,274 @@ class EmbalagemService:
                 'total_pages': total_pages,
                 'total_records': total_records,
                 'per_page': per_page,
-                'has_next': page < total_pages,
-                'has_prev': page > 1
+                'has_next': has_next,
+                # Keyset: só há página anterior se a busca partiu de um cursor
+                'has_prev': bool(cursor) if keyset else page > 1,
+                'mode': 'keyset' if keyset else 'offset',
+                'next_cursor': next_cursor
             }
             
+        except ValueError:
+            raise
         except Exception as e:
             logging.error(f"Erro ao obter dados paginados: {e}")
             return None
     
+    def fulltext_columns(self) -> frozenset:
+        """
+        Colunas de temp_embalagem com índice FULLTEXT próprio (migração 003).
+        Sem os índices, a busca por substring continua funcionando via LIKE.
+        """
+        if self._fulltext_columns is None:
+            rows = db.execute_query("""
+                SELECT INDEX_NAME, COLUMN_NAME
+                FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'temp_embalagem'
+                  AND INDEX_TYPE = 'FULLTEXT'
+            """, name='indices_fulltext')
+            if rows is None:
+                return frozenset()
+            columns_by_index = {}
+            for row in rows:
+                columns_by_index.setdefault(row['INDEX_NAME'], []).append(row['COLUMN_NAME'])
+            self._fulltext_columns = frozenset(
+                columns[0] for columns in columns_by_index.values() if len(columns) == 1
+            )
+            logging.info(f"Índices FULLTEXT para busca: {sorted(self._fulltext_columns) or 'nenhum (LIKE)'}")
+        return self._fulltext_columns
+
+    def _count_records(self, where_clause: str, params: List) -> int:
+        """COUNT(*) dos filtros, reaproveitado entre trocas de página até a próxima escrita"""
+        def load():
+            count_query = f"SELECT COUNT(*) as total FROM temp_embalagem{where_clause}"
+            count_result = db.execute_query(count_query, params, name='listagem_contagem')
+            return count_result[0]['total'] if count_result else None
+        
+        total = self.count_cache.get_or_load((where_clause, tuple(params)), load)
+        return total or 0
+    
     def get_record_by_id(self, record_id: int) -> Optional[Dict]:
         """Obtém um registro específico pelo ID"""
         try:
-            query = """
-                SELECT id, Loja, Remessa, Local, Ordem, Posicao_Deposito, Codigo, 
-                       Descricao_Produto, UM, Qtde_Emb, Qtde_CX, Qtde_UM, 
-                       Estoque, EAN, Status, Usuario, Data_Registro
+            query = f"""
+                SELECT {RECORD_DETAIL_COLUMNS}
                 FROM temp_embalagem
                 WHERE id = %s
             """
             
-            result = db.execute_query(query, (record_id,))
+            result = db.execute_query(query, (record_id,), name='registro_detalhe')
             
             if result:
-                record = dict(result[0])
-                # Formatar data para display
-                if record['Data_Registro']:
-                    record['Data_Registro_Formatted'] = record['Data_Registro'].strftime('%d/%m/%Y %H:%M:%S')
-                return record
+                return self._format_record_detail(result[0])
             
             return None
             
         except Exception as e:
             logging.error(f"Erro ao obter registro por ID: {e}")
             return None
-    
-    def export_data(self, filters: Dict, export_format: str = 'excel') -> Optional[Dict]:
-        """Exporta dados filtrados"""
+
+    def get_records_by_ids(self, record_ids: List[int]) -> Optional[Dict]:
+        """
+        Detalhes de vários registros em uma consulta (pela chave primária).
+        Devolve os registros na ordem dos IDs pedidos e os IDs não encontrados.
+        """
         try:
-            import pandas as pd
-            from datetime import datetime
-            
-            # Construir WHERE clause (mesmo código da paginação)
-            where_conditions = []
-            params = []
-            
-            if filters.get('data_inicio'):
-                where_conditions.append("DATE(Data_Registro) >= %s")
-                params.append(filters['data_inicio'])
-            
-            if filters.get('data_fim'):
-                where_conditions.append("DATE(Data_Registro) <= %s")
-                params.append(filters['data_fim'])
-            
-            if filters.get('status'):
-                where_conditions.append("Status = %s")
-                params.append(filters['status'])
-            
-            if filters.get('remessa'):
-                where_conditions.append("Remessa LIKE %s")
-                params.append(f"%{filters['remessa']}%")
-            
-            if filters.get('loja'):
-                where_conditions.append("Loja LIKE %s")
-                params.append(f"%{filters['loja']}%")
-            
-            if filters.get('codigo'):
-                where_conditions.append("Codigo LIKE %s")
-                params.append(f"%{filters['codigo']}%")
-            
-            where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-            
-            # Buscar todos os dados filtrados
-            export_query = f"""
-                SELECT id as ID, Loja, Remessa, Local, Ordem, Posicao_Deposito as 'Posição Depósito', 
-                       Codigo as 'Código', Descricao_Produto as 'Descrição Produto', UM, 
-                       Qtde_Emb as 'Qtde Embalagem', Qtde_CX as 'Qtde Caixa', Qtde_UM as 'Qtde UM', 
-                       Estoque, EAN, Status, Usuario as 'Usuário', Data_Registro as 'Data Registro',
-                       Total_Pallets as 'Total Pallets'
+            record_ids = list(dict.fromkeys(record_ids))
+            if not record_ids:
+                return {'data': [], 'missing': []}
+            placeholders = ', '.join(['%s'] * len(record_ids))
+            query = f"""
+                SELECT {RECORD_DETAIL_COLUMNS}
                 FROM temp_embalagem
-                {where_clause}
-                ORDER BY Data_Registro DESC, id DESC
+                WHERE id IN ({placeholders})
             """
-            
-            result = db.execute_query(export_query, params)
-            
-            if not result:
+            result = db.execute_query(query, record_ids, name='registro_detalhe_lote')
+            if result is None:
                 return None
-            
-            # Converter para DataFrame
-            df = pd.DataFrame(result)
-            
-            # Gerar nome do arquivo
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            
-            if export_format == 'excel':
-                filename = f"embalagem_export_{timestamp}.xlsx"
-                filepath = os.path.join('data', filename)
-                df.to_excel(filepath, index=False, engine='openpyxl')
-            else:
-                filename = f"embalagem_export_{timestamp}.csv"
-                filepath = os.path.join('data', filename)
-                df.to_csv(filepath, index=False, encoding='utf-8-sig')
-            
+
+            by_id = {row['id']: self._format_record_detail(row) for row in result}
             return {
-                'download_url': f'/static/exports/{filename}',
-                'filename': filename,
-                'total_records': len(result),
-                'filepath': filepath
+                'data': [by_id[record_id] for record_id in record_ids if record_id in by_id],
+                'missing': [record_id for record_id in record_ids if record_id not in by_id]
             }
+
+        except Exception as e:
+            logging.error(f"Erro ao obter registros por ID: {e}")
+            return None
+
+    def get_records_by_remessa(self, remessa: str, limit: int) -> Optional[Dict]:
+        """
+        Todos os itens de uma remessa (índice idx_remessa_status), em ordem de
+        ID, até ``limit``; ``truncated`` indica que a remessa tem mais itens.
+        """
+        try:
+            query = f"""
+                SELECT {RECORD_DETAIL_COLUMNS}
+                FROM temp_embalagem
+                WHERE Remessa = %s
+                ORDER BY id
+                LIMIT %s
+            """
+            result = db.execute_query(query, (remessa, limit + 1), name='registro_detalhe_remessa')
+            if result is None:
+                return None
+
+            return {
+                'data': [self._format_record_detail(row) for row in result[:limit]],
+                'truncated': len(result) > limit
+            }
+
+        except Exception as e:
+            logging.error(f"Erro ao obter registros da remessa: {e}")
+            return None
+
+    @staticmethod
+    def _format_record_detail(row: Dict) -> Dict:
+        record = dict(row)
+        # Formatar data para display
+        if record['Data_Registro']:
+            record['Data_Registro_Formatted'] = record['Data_Registro'].strftime('%d/%m/%Y %H:%M:%S')
+        return record
+    
+    def table_version(self) -> Optional[str]:
+        """
+        Versão do conteúdo de temp_embalagem, compartilhada entre os workers:
+        contagens por status do resumo por remessa (mantido pelo upload e por
+        triggers, inclusive para mudanças de status feitas pelo WMS), maior id
+        e última alteração de um item (Atualizado_Em, migração 004: pega
+        edições de quantidade, usuário etc.). None se a consulta falhar ou se
+        a tabela não tiver o marcador de alteração.
+        """
+        if not self.change_marker_available():
+            return None
+        result = db.execute_query("""
+            SELECT COUNT(*) AS remessas,
+                   COALESCE(SUM(total_itens), 0) AS itens,
+                   COALESCE(SUM(pendentes), 0) AS pendentes,
+                   COALESCE(SUM(em_separacao), 0) AS em_separacao,
+                   COALESCE(SUM(finalizados), 0) AS finalizados,
+                   COALESCE(SUM(faturados), 0) AS faturados,
+                   COALESCE(SUM(total_pallets), 0) AS total_pallets,
+                   (SELECT MAX(id) FROM temp_embalagem) AS max_id,
+                   (SELECT MAX(Atualizado_Em) FROM temp_embalagem) AS atualizado_em
+            FROM temp_embalagem_resumo
+        """, name='versao_tabela')
+        if not result:
+            return None
+        return '|'.join(str(value) for value in result[0].values())
+
+    def change_marker_available(self) -> bool:
+        """Se temp_embalagem tem a coluna Atualizado_Em (migração 004)"""
+        if self._has_change_marker is None:
+            rows = db.execute_query("""
+                SELECT COUNT(*) AS total
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'temp_embalagem'
+                  AND COLUMN_NAME = 'Atualizado_Em'
+            """, name='coluna_atualizado_em')
+            if not rows:
+                return False
+            self._has_change_marker = rows[0]['total'] > 0
+            if not self._has_change_marker:
+                logging.warning("temp_embalagem sem Atualizado_Em (migração 004): "
+                                "exportações e páginas da listagem não são reaproveitadas")
+        return self._has_change_marker
+
+    def shared_version(self) -> Optional[str]:
+        """table_version() em cache por até EMBALAGEM_TABLE_VERSION_TTL segundos"""
+        return self.version_cache.get_or_load('temp_embalagem', self.table_version)
+
+    @staticmethod
+    def _export_result(entry: Dict) -> Dict:
+        return {
+            'download_url': f"/static/exports/{entry['filename']}",
+            'filename': entry['filename'],
+            'total_records': entry['total_records'],
+            'filepath': entry['filepath']
+        }
+
+    def _export_query(self, filters: Dict):
+        """Query e parâmetros da exportação filtrada"""
+        where_clause, params = build_where_clause(filters, self.fulltext_columns())
+        
+        export_query = f"""
+            SELECT id as ID, Loja, Remessa, Local, Ordem, Posicao_Deposito as 'Posição Depósito', 
+                   Codigo as 'Código', Descricao_Produto as 'Descrição Produto', UM, 
+                   Qtde_Emb as 'Qtde Embalagem', Qtde_CX as 'Qtde Caixa', Qtde_UM as 'Qtde UM', 
+                   Estoque, EAN, Status, Usuario as 'Usuário', Data_Registro as 'Data Registro',
+                   Total_Pallets as 'Total Pallets'
+            FROM temp_embalagem
+            {where_clause}
+            ORDER BY Data_Registro DESC, id DESC
+        """
+        return export_query, params
+    
+    def export_data(self, filters: Dict, export_format: str = 'excel', progress=None) -> Optional[Dict]:
+        """
+        Exporta dados filtrados
+        As linhas são lidas em lotes e gravadas no arquivo à medida que chegam
+        O arquivo fica no armazém de exportações (services/export_store.py):
+        um pedido igual, com os dados na mesma versão, recebe o mesmo arquivo
+        ``progress`` (JobContext) recebe fase e contadores quando a exportação
+        roda como tarefa em segundo plano
+        """
+        try:
+            # Construir query (mesmos filtros da paginação)
+            export_query, params = self._export_query(filters)
+            
+            if export_format not in EXPORT_EXTENSIONS:
+                export_format = 'csv'
+            extension = EXPORT_EXTENSIONS[export_format]
+            # Mesmos filtros, formato e versão dos dados: o arquivo já gerado serve
+            version = self.table_version()
+            key = export_store.make_key(EXPORT_KIND, {
+                'filters': filters, 'format': extension, 'version': version
+            }) if version else export_store.unique_key(EXPORT_KIND)
+
+            with export_store.lock(key):
+                cached = export_store.get(key)
+                if cached:
+                    if progress:
+                        progress.update(phase='Arquivo já gerado', rows_read=cached['total_records'],
+                                        rows_written=cached['total_records'])
+                    return self._export_result(cached)
+
+                on_progress = None
+                if progress:
+                    where_clause, count_params = build_where_clause(filters, self.fulltext_columns())
+                    progress.update(phase='Contando registros')
+                    progress.update(total_rows=self._count_records(where_clause, count_params))
+                    on_progress = lambda phase, read, written: progress.update(
+                        phase=phase, rows_read=read, rows_written=written)
+
+                filepath = export_store.temp_path(extension)
+                total_records = export_query_to_file(
+                    export_query, params, filepath, export_format,
+                    on_progress=on_progress, query_name='exportacao',
+                    column_types=EXPORT_COLUMN_TYPES
+                )
+
+                if not total_records:
+                    os.remove(filepath)
+                    return None
+
+                return self._export_result(export_store.put(key, EXPORT_KIND, filepath, total_records))
             
+        except JobCancelled:
+            raise
         except Exception as e:
             logging.error(f"Erro na exportação: {e}")
             return None
+    
+    def stream_export_csv(self, filters: Dict):
+        """Gera a exportação filtrada como CSV em pedaços, para resposta em streaming"""
+        export_query, params = self._export_query(filters)
+        return stream_query_as_csv(export_query, params, query_name='exportacao_stream')
 
-    def export_custom_data(self, export_type: str, remessa: str = None, data_inicio: str = None, data_fim: str = None) -> Optional[Dict]:
+    def export_custom_data(self, export_type: str, remessa: str = None, data_inicio: str = None, data_fim: str = None,
+                           export_format: str = 'excel', progress=None) -> Optional[Dict]:
         """Exporta dados com filtros customizados do card de exportação"""
         try:
-            import pandas as pd
-            from datetime import datetime
-            
             # Construir filtros baseado no tipo de exportação
             filters = {}
             
@@ -396,8 +766,10 @@ class EmbalagemService:
             # Para 'all', não adiciona filtros
             
             # Reutilizar método existente
-            return self.export_data(filters, 'excel')
+            return self.export_data(filters, export_format, progress=progress)
             
+        except JobCancelled:
+            raise
         except Exception as e:
             logging.error(f"Erro na exportação customizada: {e}")
             return None
@@ -405,24 +777,18 @@ class EmbalagemService:
     def get_remessas_finalizadas_stats(self) -> Optional[Dict]:
         """Obtém estatísticas de remessas prontas para faturamento"""
         try:
-            # Buscar remessas onde TODOS os itens estão finalizados
-            query = """
+            # Remessas onde TODOS os itens estão finalizados, direto do resumo
+            query = f"""
                 SELECT 
                     r.Remessa,
                     r.Loja,
-                    COUNT(*) as total_itens
-                FROM temp_embalagem r
-                WHERE r.Remessa NOT IN (
-                    SELECT DISTINCT Remessa 
-                    FROM temp_embalagem 
-                    WHERE Status != 'Finalizado'
-                )
-                AND r.Status = 'Finalizado'
-                GROUP BY r.Remessa, r.Loja
+                    r.finalizados as total_itens
+                FROM temp_embalagem_resumo r
+                WHERE {RESUMO_PRONTA_CONDITION}
                 ORDER BY r.Remessa, r.Loja
             """
             
-            result = db.execute_query(query)
+            result = db.execute_query(query, name='remessas_prontas')
             
             if result:
                 remessas_lista = []
@@ -452,135 +818,204 @@ class EmbalagemService:
             logging.error(f"Erro ao obter estatísticas de remessas finalizadas: {e}")
             return None
 
-    def export_faturamento(self, usuario: str) -> Optional[Dict]:
+    def export_faturamento(self, usuario: str, progress=None) -> Optional[Dict]:
         """
         Exporta faturamento de remessas completas (todos os itens finalizados)
         e atualiza status para 'Faturado'
+        Tudo roda em uma única transação: as remessas completas (lidas do
+        resumo por remessa) vão para uma tabela temporária, os itens faturados são bloqueados (FOR UPDATE),
+        lidos para a planilha e atualizados. Se qualquer passo falhar nada é
+        faturado e o arquivo é removido.
+        ``progress`` (JobContext) recebe a fase atual quando roda em segundo plano
         """
+        filepath = None
+        # Cada faturamento gera um arquivo próprio, fixado no armazém (nunca removido)
+        key = export_store.unique_key(FATURAMENTO_KIND)
+        stored = False
         try:
-            import pandas as pd
-            from datetime import datetime
-            
-            # Primeiro, identificar remessas completas (todos os itens finalizados)
-            query_remessas_completas = """
-                SELECT DISTINCT Remessa, Loja
-                FROM temp_embalagem 
-                WHERE Remessa NOT IN (
-                    SELECT DISTINCT Remessa 
-                    FROM temp_embalagem 
-                    WHERE Status != 'Finalizado'
-                )
-                AND Status = 'Finalizado'
-            """
-            
-            remessas_completas = db.execute_query(query_remessas_completas)
-            
-            if not remessas_completas:
-                return {
-                    'success': False,
-                    'error': 'Nenhuma remessa completa encontrada para faturamento'
-                }
-            
-            # Buscar dados para exportação das remessas completas
-            remessas_list = [f"'{row['Remessa']}'" for row in remessas_completas]
-            remessas_in_clause = ','.join(remessas_list)
-            
-            export_query = f"""
-                SELECT 
-                    Remessa,
-                    Loja,
-                    Codigo,
-                    Descricao_Produto,
-                    UM,
-                    Qtde_Emb as Atendido,
-                    Usuario,
-                    COALESCE(Total_Pallets, 0) as Total_Pallets
-                FROM temp_embalagem
-                WHERE Remessa IN ({remessas_in_clause})
-                AND Status = 'Finalizado'
-                ORDER BY Remessa, Loja, Codigo
-            """
-            
-            export_data = db.execute_query(export_query)
-            
-            if not export_data:
-                return {
-                    'success': False,
-                    'error': 'Nenhum dado encontrado para exportação'
-                }
-            
-            # Criar DataFrame
-            df = pd.DataFrame(export_data)
-            
-            # Gerar arquivo Excel
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"faturamento_{timestamp}.xlsx"
-            filepath = os.path.join('data', filename)
-            
-            # Configurar formatação do Excel
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Faturamento', index=False)
-                
-                # Obter workbook e worksheet para formatação
-                workbook = writer.book
-                worksheet = writer.sheets['Faturamento']
-                
-                # Ajustar largura das colunas
-                column_widths = {
-                    'A': 15,  # Remessa
-                    'B': 10,  # Loja
-                    'C': 15,  # Codigo
-                    'D': 40,  # Descricao_Produto
-                    'E': 8,   # UM
-                    'F': 12,  # Atendido
-                    'G': 15,  # Usuario
-                    'H': 15   # Total_Pallets
-                }
-                
-                for col, width in column_widths.items():
-                    worksheet.column_dimensions[col].width = width
-            
-            # Iniciar transação para atualizar status
-            try:
-                # Atualizar status para 'Faturado' e registrar usuário
-                update_query = f"""
-                    UPDATE temp_embalagem 
-                    SET Status = 'Faturado', Usuario = %s
-                    WHERE Remessa IN ({remessas_in_clause})
-                    AND Status = 'Finalizado'
-                """
-                
-                affected_rows = db.execute_query(update_query, (usuario,))
-                
-                logging.info(f"Faturamento processado: {len(remessas_completas)} remessas, {len(export_data)} itens atualizados")
-                
-                return {
-                    'success': True,
-                    'download_url': f'/static/exports/{filename}',
-                    'filename': filename,
-                    'total_records': len(export_data),
-                    'remessas_faturadas': len(remessas_completas),
-                    'affected_rows': affected_rows
-                }
-                
-            except Exception as e:
-                logging.error(f"Erro ao atualizar status para faturado: {e}")
-                # Se der erro na atualização, ainda retorna o arquivo gerado
-                return {
-                    'success': True,
-                    'download_url': f'/static/exports/{filename}',
-                    'filename': filename,
-                    'total_records': len(export_data),
-                    'remessas_faturadas': len(remessas_completas),
-                    'warning': 'Arquivo gerado, mas houve erro ao atualizar status no banco'
-                }
-                
+            filepath = export_store.temp_path('xlsx')
+
+            with db.transaction() as connection:
+                cursor = connection.cursor()
+                locked = False
+                try:
+                    cursor.execute("SELECT GET_LOCK(%s, 0)", (FATURAMENTO_LOCK,))
+                    locked = cursor.fetchone()[0] == 1
+                    if not locked:
+                        return {
+                            'success': False,
+                            'error': 'Já existe um faturamento em andamento, tente novamente em instantes'
+                        }
+
+                    if progress:
+                        progress.update(phase='Identificando remessas completas')
+
+                    summary = self._select_remessas_faturamento(cursor)
+                    if summary is None:
+                        return {
+                            'success': False,
+                            'error': 'Nenhuma remessa completa encontrada para faturamento'
+                        }
+                    remessas_faturadas, total_itens = summary
+
+                    if progress:
+                        progress.update(phase='Gerando planilha de faturamento', total_rows=total_itens)
+                        on_progress = lambda phase, read, written: progress.update(
+                            rows_read=read, rows_written=written)
+                    else:
+                        on_progress = None
+
+                    export_query = f"""
+                        SELECT 
+                            e.Remessa,
+                            e.Loja,
+                            e.Codigo,
+                            e.Descricao_Produto,
+                            e.UM,
+                            e.Qtde_Emb as Atendido,
+                            e.Usuario,
+                            COALESCE(e.Total_Pallets, 0) as Total_Pallets
+                        FROM temp_embalagem e
+                        JOIN {FATURAMENTO_TEMP_TABLE} t ON t.Remessa = e.Remessa
+                        WHERE e.Status = 'Finalizado'
+                        ORDER BY e.Remessa, e.Loja, e.Codigo
+                    """
+                    total_records = export_query_to_file(
+                        export_query, None, filepath, 'excel',
+                        on_progress=on_progress, connection=connection, query_name='faturamento_itens',
+                        sheet_name='Faturamento', column_widths=FATURAMENTO_COLUMN_WIDTHS
+                    )
+
+                    if progress:
+                        progress.update(phase='Atualizando status dos registros')
+                        # A atualização de status não pode ser interrompida no meio
+                        progress.disable_cancel()
+
+                    cursor.execute(f"""
+                        UPDATE temp_embalagem e
+                        JOIN {FATURAMENTO_TEMP_TABLE} t ON t.Remessa = e.Remessa
+                        SET e.Status = 'Faturado', e.Usuario = %s
+                        WHERE e.Status = 'Finalizado'
+                    """, (usuario,))
+                    affected_rows = cursor.rowcount
+
+                    # Linhas bloqueadas desde a seleção: a planilha e o UPDATE têm que bater
+                    if affected_rows != total_records:
+                        raise RuntimeError(
+                            f"Faturamento inconsistente: {total_records} itens exportados, "
+                            f"{affected_rows} atualizados")
+
+                    # Registrado antes do commit: se o commit falhar, o arquivo sai do armazém
+                    entry = export_store.put(key, FATURAMENTO_KIND, filepath, total_records, pinned=True)
+                    stored = True
+                finally:
+                    self._finish_faturamento(connection, cursor, locked)
+
+            self.invalidate_caches()
+
+            logging.info(f"Faturamento processado: {remessas_faturadas} remessas, {affected_rows} itens atualizados")
+
+            return {
+                'success': True,
+                'download_url': f"/static/exports/{entry['filename']}",
+                'filename': entry['filename'],
+                'total_records': total_records,
+                'remessas_faturadas': remessas_faturadas,
+                'affected_rows': affected_rows
+            }
+
+        except JobCancelled:
+            self._discard_faturamento_file(key, filepath, stored)
+            raise
         except Exception as e:
             logging.error(f"Erro na exportação de faturamento: {e}")
+            self._discard_faturamento_file(key, filepath, stored)
             return {
                 'success': False,
                 'error': str(e)
             }
 
+    def _select_remessas_faturamento(self, cursor):
+        """
+        Grava as remessas completas na tabela temporária e bloqueia seus itens.
+        Retorna (pares remessa/loja, itens) ou None se não houver remessa completa.
+        """
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {FATURAMENTO_TEMP_TABLE}")
+        # Mesmo tipo de coluna da tabela de origem, sem linhas
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {FATURAMENTO_TEMP_TABLE} (PRIMARY KEY (Remessa))
+            SELECT Remessa FROM temp_embalagem WHERE 1 = 0
+        """)
+        # Leitura com bloqueio compartilhado: mudanças de status nessas remessas
+        # (que passam pelos triggers do resumo) esperam o fim do faturamento
+        cursor.execute(f"""
+            INSERT INTO {FATURAMENTO_TEMP_TABLE} (Remessa)
+            SELECT DISTINCT r.Remessa
+            FROM temp_embalagem_resumo r
+            WHERE {RESUMO_PRONTA_CONDITION}
+        """)
+        if cursor.rowcount <= 0:
+            return None
+
+        # Conferência contra os itens: nunca faturar com base em um resumo desatualizado
+        cursor.execute(f"""
+            DELETE t FROM {FATURAMENTO_TEMP_TABLE} t
+            WHERE EXISTS (
+                SELECT 1 FROM temp_embalagem p
+                WHERE p.Remessa = t.Remessa AND p.Status <> 'Finalizado'
+            )
+        """)
+        if cursor.rowcount > 0:
+            logging.warning(f"Resumo de remessas desatualizado: {cursor.rowcount} remessas descartadas "
+                            f"do faturamento (python -m services.remessa_resumo --rebuild)")
+
+        # Bloqueio exclusivo dos itens que serão faturados até o commit
+        cursor.execute(f"""
+            SELECT COUNT(DISTINCT e.Remessa, e.Loja), COUNT(*)
+            FROM temp_embalagem e
+            JOIN {FATURAMENTO_TEMP_TABLE} t ON t.Remessa = e.Remessa
+            WHERE e.Status = 'Finalizado'
+            FOR UPDATE
+        """)
+        remessas_faturadas, total_itens = cursor.fetchone()
+        if not total_itens:
+            return None
+        return int(remessas_faturadas), int(total_itens)
+
+    def _finish_faturamento(self, connection, cursor, locked: bool):
+        """Remove a tabela temporária e libera o lock nomeado (valem pela sessão, não pela transação)"""
+        statements = [(f"DROP TEMPORARY TABLE IF EXISTS {FATURAMENTO_TEMP_TABLE}", None)]
+        if locked:
+            statements.append(("SELECT RELEASE_LOCK(%s)", (FATURAMENTO_LOCK,)))
+        clean = True
+        for statement, params in statements:
+            try:
+                cursor.execute(statement, params)
+                if cursor.with_rows:
+                    cursor.fetchall()
+            except Exception as e:
+                logging.error(f"Erro ao finalizar faturamento: {e}")
+                clean = False
+        try:
+            cursor.close()
+        except Exception as e:
+            logging.error(f"Erro ao fechar cursor do faturamento: {e}")
+            clean = False
+        # Sessão que pode ter ficado com o lock ou a tabela temporária não volta
+        # ao pool: fechada, o MySQL libera ambos
+        if not clean:
+            db.discard_connection(connection)
+
+    @staticmethod
+    def _discard_faturamento_file(key: str, filepath: Optional[str], stored: bool):
+        """Descarta a planilha de um faturamento que não foi concluído"""
+        if stored:
+            export_store.remove(key)
+        elif filepath and os.path.exists(filepath):
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+
 # Instância global do serviço
 embalagem_service = EmbalagemService()
\ No newline at end of file
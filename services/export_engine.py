@@ -0,0 +1,259 @@
+"""
+Motor de exportação em streaming
+
+Lê o resultado em lotes (cursor não bufferizado, ver db.iter_query) e grava
+cada lote assim que chega, em CSV, em xlsx no modo write-only do openpyxl
+ou, para cargas de BI, em Parquet (zstd) e CSV gzip com colunas tipadas
+via pyarrow. O consumo de memória não depende da quantidade de linhas.
+"""
+import csv
+import gzip
+import io
+import os
+import logging
+from typing import Callable, Dict, Iterator, List, Optional
+
+from database import db
+from utils.lazy_imports import is_available, lazy_module
+
+# Importados na primeira exportação tipada (ver utils/lazy_imports.py)
+if is_available('pyarrow'):
+    pa = lazy_module('pyarrow')
+    pc = lazy_module('pyarrow.compute')
+    pa_csv = lazy_module('pyarrow.csv')
+    pa_parquet = lazy_module('pyarrow.parquet')
+else:  # pyarrow é opcional: sem ele não há Parquet e o CSV gzip não é tipado
+    pa = None
+
+# Linhas lidas do banco por lote
+EXPORT_CHUNK_SIZE = int(os.getenv('EMBALAGEM_EXPORT_CHUNK_SIZE', '5000'))
+# Linhas por row group do Parquet (lotes do banco são acumulados até esse tamanho)
+EXPORT_ROW_GROUP_ROWS = int(os.getenv('EMBALAGEM_EXPORT_ROW_GROUP_ROWS', '100000'))
+# Nível do gzip: 6 comprime ~4x mais rápido que 9 com arquivo ~1% maior
+EXPORT_GZIP_LEVEL = int(os.getenv('EMBALAGEM_EXPORT_GZIP_LEVEL', '6'))
+
+EXPORT_EXTENSIONS = {
+    'excel': 'xlsx',
+    'csv': 'csv',
+    'csv_gz': 'csv.gz',
+    'parquet': 'parquet',
+}
+
+
+class CsvExportWriter:
+    """Escreve CSV UTF-8 com BOM (abre corretamente no Excel)"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.writer = csv.writer(fileobj)
+
+    def write_header(self, columns):
+        self.fileobj.write('\ufeff')
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.fileobj.close()
+
+    def discard(self):
+        self.fileobj.close()
+
+
+class XlsxExportWriter:
+    """Escreve xlsx linha a linha com openpyxl em modo write-only"""
+
+    def __init__(self, path: str, sheet_name: str = 'Sheet1',
+                 column_widths: Optional[Dict[str, float]] = None):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(sheet_name)
+        # Em write-only as larguras precisam ser definidas antes da primeira linha
+        for column, width in (column_widths or {}).items():
+            self.sheet.column_dimensions[column].width = width
+
+    def write_header(self, columns):
+        self.sheet.append(list(columns))
+
+    def write_rows(self, rows):
+        append = self.sheet.append
+        for row in rows:
+            append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+    def discard(self):
+        self.workbook.close()
+
+
+class ArrowExportWriter:
+    """
+    Parquet (zstd) ou CSV gzip com colunas tipadas: ``column_types`` mapeia
+    nome da coluna para tipo do Arrow ('int64', 'float64', 'timestamp[s]'...;
+    as demais são texto). Números saem como números e datas como timestamp
+    (ISO 8601 no CSV), não como o texto formatado pelo driver.
+    Os lotes lidos do banco são acumulados até ``row_group_rows`` linhas e
+    gravados de uma vez, um row group por bloco.
+    """
+
+    def __init__(self, path: str, export_format: str, column_types: Optional[Dict[str, str]] = None,
+                 row_group_rows: int = None):
+        self.path = path
+        self.export_format = export_format
+        self.column_types = column_types or {}
+        self.row_group_rows = row_group_rows or EXPORT_ROW_GROUP_ROWS
+        self.schema = None
+        self.writer = None
+        self.sink = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write_header(self, columns):
+        self.schema = pa.schema([
+            (name, pa.type_for_alias(self.column_types.get(name, 'string'))) for name in columns
+        ])
+        if self.export_format == 'parquet':
+            self.writer = pa_parquet.ParquetWriter(self.path, self.schema, compression='zstd')
+        else:
+            self.sink = gzip.open(self.path, 'wb', compresslevel=EXPORT_GZIP_LEVEL)
+            self.writer = pa_csv.CSVWriter(self.sink, self.schema)
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        self._pending.append(rows)
+        self._pending_rows += len(rows)
+        if self._pending_rows >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending_rows:
+            return
+        columns = zip(*(row for rows in self._pending for row in rows))
+        arrays = [self._to_array(values, field.type) for values, field in zip(columns, self.schema)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self._pending = []
+        self._pending_rows = 0
+
+    @staticmethod
+    def _to_array(values, arrow_type):
+        try:
+            return pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if pa.types.is_string(arrow_type):
+                return pa.array([None if value is None else str(value) for value in values], type=arrow_type)
+            # Ex.: DECIMAL do MySQL chega como Decimal; converte pelo tipo inferido
+            return pc.cast(pa.array(values), arrow_type)
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+    def discard(self):
+        try:
+            if self.writer is not None:
+                self.writer.close()
+            if self.sink is not None:
+                self.sink.close()
+        except Exception:
+            pass
+
+
+def export_format_error(export_format: str) -> Optional[str]:
+    """Mensagem de erro para um formato inválido ou indisponível neste ambiente (None se ok)"""
+    if export_format not in EXPORT_EXTENSIONS:
+        return f"Formato de exportação inválido. Use: {', '.join(EXPORT_EXTENSIONS)}"
+    if export_format == 'parquet' and pa is None:
+        return "Exportação em Parquet exige o pacote pyarrow"
+    return None
+
+
+def open_writer(export_format: str, path: str, column_types: Optional[Dict[str, str]] = None, **options):
+    """
+    Cria o writer do formato informado gravando em ``path``.
+    ``column_types`` só é usado pelos formatos tipados (parquet, csv_gz).
+    """
+    if export_format == 'excel':
+        return XlsxExportWriter(path, **options)
+    if export_format == 'csv':
+        return CsvExportWriter(open(path, 'w', encoding='utf-8', newline=''))
+    if export_format in ('parquet', 'csv_gz'):
+        if pa is not None:
+            return ArrowExportWriter(path, export_format, column_types)
+        if export_format == 'csv_gz':
+            return CsvExportWriter(gzip.open(path, 'wt', encoding='utf-8', newline='',
+                                             compresslevel=EXPORT_GZIP_LEVEL))
+        raise ValueError("Exportação em Parquet exige o pacote pyarrow")
+    raise ValueError(f"Formato de exportação não suportado: {export_format}")
+
+
+def export_query_to_file(query: str, params: List, path: str, export_format: str,
+                         chunk_size: int = None,
+                         on_progress: Optional[Callable[[str, int, int], None]] = None,
+                         connection=None, query_name: Optional[str] = None,
+                         **writer_options) -> int:
+    """
+    Executa a query e grava o resultado em ``path`` lote a lote.
+    ``on_progress(fase, linhas_lidas, linhas_gravadas)`` é chamado a cada
+    lote; se levantar uma exceção, a exportação é interrompida.
+    ``connection`` permite ler dentro de uma transação já aberta e
+    ``query_name`` identifica a leitura nas métricas.
+    Retorna a quantidade de linhas exportadas. Em caso de erro o arquivo
+    parcial é removido.
+    """
+    batches = db.iter_query(query, params, chunk_size or EXPORT_CHUNK_SIZE,
+                            connection=connection, name=query_name)
+    writer = open_writer(export_format, path, **writer_options)
+    rows_read = 0
+    rows_written = 0
+    try:
+        header_written = False
+        for columns, batch in batches:
+            rows_read += len(batch)
+            if on_progress:
+                on_progress('Lendo registros', rows_read, rows_written)
+            if not header_written:
+                writer.write_header(columns)
+                header_written = True
+            writer.write_rows(batch)
+            rows_written += len(batch)
+            if on_progress:
+                on_progress('Gravando arquivo', rows_read, rows_written)
+        if on_progress:
+            on_progress('Salvando arquivo', rows_read, rows_written)
+        writer.close()
+        return rows_written
+    except Exception:
+        batches.close()
+        writer.discard()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+
+
+def stream_query_as_csv(query: str, params: List, chunk_size: int = None,
+                        query_name: Optional[str] = None) -> Iterator[bytes]:
+    """Gera o CSV em pedaços para ser enviado direto na resposta HTTP"""
+    buffer = io.StringIO()
+    writer = CsvExportWriter(buffer)
+    header_written = False
+    try:
+        for columns, batch in db.iter_query(query, params, chunk_size or EXPORT_CHUNK_SIZE, name=query_name):
+            if not header_written:
+                writer.write_header(columns)
+                header_written = True
+            writer.write_rows(batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+    except Exception as e:
+        logging.error(f"Erro durante exportação em streaming: {e}")
+        raise
@@ -0,0 +1,276 @@
+"""
+Armazém endereçado por conteúdo das exportações geradas
+
+Cada exportação é identificada por um hash de (tipo, filtros, formato,
+versão da tabela) e o arquivo fica em EMBALAGEM_EXPORT_STORE_DIR com esse
+hash no nome. Um índice em SQLite (compartilhado entre os workers do
+gunicorn) guarda tamanho, linhas, data de criação e último acesso de cada
+arquivo; é por ele que o download (/static/exports/<arquivo>) encontra o
+arquivo, e só arquivos do índice são servidos.
+
+Um pedido repetido com os mesmos filtros e a mesma versão dos dados recebe o
+arquivo já gerado, sem consultar o banco. Como a versão da tabela não enxerga
+toda alteração feita fora da aplicação, o reaproveitamento vale no máximo por
+EMBALAGEM_EXPORT_REUSE_SECONDS.
+
+Limpeza: arquivos com mais de EMBALAGEM_EXPORT_STORE_MAX_AGE_HOURS são
+apagados e, acima de EMBALAGEM_EXPORT_STORE_MAX_MB no total, saem primeiro
+os acessados há mais tempo. Arquivos fixados (planilhas de faturamento, o
+registro do que foi faturado) nunca são removidos.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Nomes dos arquivos gerados antes do armazém (adotados na inicialização)
+LEGACY_PATTERNS = ('embalagem_export_*.xlsx', 'embalagem_export_*.csv', 'faturamento_*.xlsx')
+LEGACY_PINNED_PREFIX = 'faturamento_'
+
+# Temporários de exportações interrompidas mais antigos que isso são apagados
+TEMP_MAX_AGE = 6 * 3600
+
+SAFE_FILENAME = re.compile(r'^[\w.-]+$')
+
+
+class ExportStore:
+    def __init__(self, directory: str, index_path: str, max_bytes: int, max_age: float,
+                 reuse_seconds: float, legacy_dir: Optional[str] = None):
+        self.directory = directory
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.reuse_seconds = reuse_seconds
+        self.legacy_dir = legacy_dir
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._key_locks = {}
+        self._key_locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def reset_after_fork(self):
+        """No processo filho: conexões SQLite não podem ser usadas dos dois lados de um fork"""
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._key_locks = {}
+        self._key_locks_guard = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            with self._init_lock:
+                os.makedirs(self.directory, exist_ok=True)
+                os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+                connection = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+                if not self._initialized:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS exports (
+                            key TEXT PRIMARY KEY,
+                            filename TEXT NOT NULL UNIQUE,
+                            kind TEXT NOT NULL,
+                            size INTEGER NOT NULL,
+                            total_records INTEGER,
+                            pinned INTEGER NOT NULL DEFAULT 0,
+                            created_at REAL NOT NULL,
+                            last_access REAL NOT NULL
+                        )
+                    """)
+                    connection.execute(
+                        "CREATE INDEX IF NOT EXISTS idx_exports_access ON exports (pinned, last_access)")
+                    self._initialized = True
+                    if self.legacy_dir:
+                        self._adopt_legacy(connection)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(kind: str, params: Dict) -> str:
+        """Hash estável dos parâmetros da exportação (ordem das chaves não importa)"""
+        payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, default=str,
+                             separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def unique_key(kind: str) -> str:
+        """Chave de um arquivo que nunca é reaproveitado (ex.: faturamento)"""
+        return ExportStore.make_key(kind, {'id': uuid.uuid4().hex})
+
+    @staticmethod
+    def filename_for(kind: str, key: str, extension: str) -> str:
+        return f"{kind}_{key[:20]}.{extension}"
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """Serializa, no processo, a geração de uma mesma exportação"""
+        # {chave: [lock, threads usando ou esperando]}; a entrada sai com a última
+        with self._key_locks_guard:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Exportação já gerada para a chave, se ainda puder ser reaproveitada"""
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT filename, total_records, created_at FROM exports WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[2] > self.reuse_seconds or not os.path.exists(self._path(row[0])):
+            self.misses += 1
+            return None
+        self._connection().execute("UPDATE exports SET last_access = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return {'filename': row[0], 'total_records': row[1], 'filepath': self._path(row[0])}
+
+    def temp_path(self, extension: str) -> str:
+        """Caminho para gerar um arquivo; só entra no armazém com put()"""
+        self._connection()
+        return os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}.{extension}")
+
+    def put(self, key: str, kind: str, temp_path: str, total_records: int, pinned: bool = False) -> Dict:
+        """Move o arquivo gerado para o armazém, registra no índice e aplica os limites"""
+        # '.tmp-<uuid>.<extensão>' (a extensão pode ter ponto, ex.: csv.gz)
+        extension = os.path.basename(temp_path).split('.', 2)[2]
+        filename = self.filename_for(kind, key, extension)
+        path = self._path(filename)
+        os.replace(temp_path, path)
+        now = time.time()
+        self._connection().execute(
+            """
+            INSERT OR REPLACE INTO exports
+                (key, filename, kind, size, total_records, pinned, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (key, filename, kind, os.path.getsize(path), total_records, int(pinned), now, now)
+        )
+        try:
+            self.evict()
+        except Exception as e:
+            logging.error(f"Erro na limpeza das exportações: {e}")
+        return {'filename': filename, 'total_records': total_records, 'filepath': path}
+
+    def remove(self, key: str):
+        """Tira um arquivo do armazém (ex.: faturamento desfeito depois de gravado)"""
+        connection = self._connection()
+        row = connection.execute("SELECT filename FROM exports WHERE key = ?", (key,)).fetchone()
+        if row:
+            connection.execute("DELETE FROM exports WHERE key = ?", (key,))
+            self._unlink(row[0])
+
+    def resolve(self, filename: str) -> Optional[str]:
+        """Caminho de um arquivo do índice para download (None se não existir)"""
+        if not SAFE_FILENAME.match(filename):
+            return None
+        connection = self._connection()
+        if connection.execute("SELECT 1 FROM exports WHERE filename = ?", (filename,)).fetchone() is None:
+            return None
+        path = self._path(filename)
+        if not os.path.exists(path):
+            connection.execute("DELETE FROM exports WHERE filename = ?", (filename,))
+            return None
+        connection.execute("UPDATE exports SET last_access = ? WHERE filename = ?", (time.time(), filename))
+        return os.path.abspath(path)
+
+    def evict(self) -> int:
+        """Aplica idade máxima e tamanho total; arquivos fixados não entram na conta"""
+        connection = self._connection()
+        now = time.time()
+        removed = 0
+        for (filename,) in connection.execute(
+                "SELECT filename FROM exports WHERE pinned = 0 AND created_at < ?",
+                (now - self.max_age,)).fetchall():
+            removed += self._evict_file(connection, filename)
+
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM exports WHERE pinned = 0").fetchone()[0]
+        if total > self.max_bytes:
+            for filename, size in connection.execute(
+                    "SELECT filename, size FROM exports WHERE pinned = 0 ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                removed += self._evict_file(connection, filename)
+                total -= size
+
+        for temp in glob.glob(os.path.join(self.directory, '.tmp-*')):
+            try:
+                if now - os.path.getmtime(temp) > TEMP_MAX_AGE:
+                    os.remove(temp)
+            except OSError:
+                pass
+        self.evicted += removed
+        return removed
+
+    def stats(self) -> Dict:
+        entries, size, pinned = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(pinned), 0) FROM exports"
+        ).fetchone()
+        return {'entries': entries, 'bytes': size, 'pinned': pinned,
+                'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted}
+
+    def _evict_file(self, connection: sqlite3.Connection, filename: str) -> int:
+        connection.execute("DELETE FROM exports WHERE filename = ? AND pinned = 0", (filename,))
+        self._unlink(filename)
+        return 1
+
+    def _unlink(self, filename: str):
+        try:
+            os.remove(self._path(filename))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _adopt_legacy(self, connection: sqlite3.Connection):
+        """
+        Move para o armazém os arquivos gerados antes dele (nomes com data e
+        hora em data/), para que entrem na limpeza e os links já enviados
+        continuem funcionando. Os de faturamento ficam fixados.
+        """
+        for pattern in LEGACY_PATTERNS:
+            for path in glob.glob(os.path.join(self.legacy_dir, pattern)):
+                filename = os.path.basename(path)
+                try:
+                    created_at = os.path.getmtime(path)
+                    shutil.move(path, self._path(filename))
+                    connection.execute(
+                        """
+                        INSERT OR IGNORE INTO exports
+                            (key, filename, kind, size, total_records, pinned, created_at, last_access)
+                        VALUES (?, ?, ?, ?, NULL, ?, ?, ?)
+                        """,
+                        (f"legado:{filename}", filename, 'legado', os.path.getsize(self._path(filename)),
+                         int(filename.startswith(LEGACY_PINNED_PREFIX)), created_at, created_at)
+                    )
+                except OSError as e:
+                    logging.error(f"Erro ao adotar exportação antiga {filename}: {e}")
+
+
+# Instância global do armazém
+export_store = ExportStore(
+    directory=os.getenv('EMBALAGEM_EXPORT_STORE_DIR', 'data/exports'),
+    index_path=os.getenv('EMBALAGEM_EXPORT_STORE_INDEX', 'data/exports.sqlite3'),
+    max_bytes=int(os.getenv('EMBALAGEM_EXPORT_STORE_MAX_MB', '2048')) * 1024 * 1024,
+    max_age=float(os.getenv('EMBALAGEM_EXPORT_STORE_MAX_AGE_HOURS', '72')) * 3600,
+    reuse_seconds=float(os.getenv('EMBALAGEM_EXPORT_REUSE_SECONDS', '900')),
+    legacy_dir='data'
+)
@@ -0,0 +1,334 @@
+"""
+Fila local de tarefas em segundo plano (exportações e faturamento)
+
+As tarefas rodam em um pool de threads do próprio processo e a requisição
+recebe apenas o ID da tarefa. O estado de cada tarefa (fase, linhas lidas e
+gravadas, resultado) é gravado em SQLite, para que /api/jobs/<id> e o
+pedido de cancelamento funcionem em qualquer worker do gunicorn, não só
+no que executa a tarefa.
+
+Cada tarefa guarda o PID do processo dono e um heartbeat renovado enquanto
+ele tem tarefas na fila ou em execução. Se o worker morre ou é reciclado
+(max_requests do gunicorn) antes de terminar, a tarefa é marcada como falha
+em vez de ficar 'queued'/'running' para sempre.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class JobCancelled(Exception):
+    """A tarefa foi cancelada pelo usuário"""
+
+
+class JobQueueFullError(Exception):
+    """Limite de tarefas simultâneas atingido"""
+
+
+class JobContext:
+    """
+    Canal entre a tarefa em execução e o gerenciador.
+    A tarefa informa o progresso com update(); cada chamada também verifica
+    se o cancelamento foi pedido e, nesse caso, levanta JobCancelled.
+    """
+
+    def __init__(self, manager: 'JobManager', job_id: str):
+        self.manager = manager
+        self.job_id = job_id
+        self.cancellable = True
+
+    def update(self, **progress):
+        """Atualiza fase/contadores (phase, rows_read, rows_written, total_rows)"""
+        self.manager._store.update(self.job_id, **progress)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self.cancellable and self.manager._store.cancel_requested(self.job_id):
+            raise JobCancelled()
+
+    def disable_cancel(self):
+        """A partir daqui a tarefa não pode mais ser interrompida (ex.: commit em andamento)"""
+        self.cancellable = False
+
+
+class JobStore:
+    """Persistência do estado das tarefas em SQLite (compartilhado entre processos)"""
+
+    FIELDS = ('kind', 'status', 'phase', 'rows_read', 'rows_written', 'total_rows',
+              'result', 'error', 'created_at', 'started_at', 'finished_at')
+
+    INTERRUPTED_ERROR = 'Tarefa interrompida: o processo que a executava foi encerrado'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def reset_after_fork(self):
+        """No processo filho: conexões SQLite não podem ser usadas dos dois lados de um fork"""
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            with self._init_lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+                if not self._initialized:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS jobs (
+                            id TEXT PRIMARY KEY,
+                            kind TEXT NOT NULL,
+                            status TEXT NOT NULL,
+                            phase TEXT,
+                            rows_read INTEGER NOT NULL DEFAULT 0,
+                            rows_written INTEGER NOT NULL DEFAULT 0,
+                            total_rows INTEGER,
+                            result TEXT,
+                            error TEXT,
+                            cancel_requested INTEGER NOT NULL DEFAULT 0,
+                            created_at REAL NOT NULL,
+                            started_at REAL,
+                            finished_at REAL,
+                            owner_pid INTEGER,
+                            heartbeat_at REAL
+                        )
+                    """)
+                    # Arquivo criado antes do heartbeat
+                    columns = {row[1] for row in connection.execute('PRAGMA table_info(jobs)')}
+                    if 'owner_pid' not in columns:
+                        connection.execute('ALTER TABLE jobs ADD COLUMN owner_pid INTEGER')
+                        connection.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+                    self._initialized = True
+            self._local.connection = connection
+        return connection
+
+    def create(self, job_id: str, kind: str):
+        now = time.time()
+        self._connection().execute(
+            """
+            INSERT INTO jobs (id, kind, status, phase, created_at, owner_pid, heartbeat_at)
+            VALUES (?, ?, 'queued', 'Na fila', ?, ?, ?)
+            """,
+            (job_id, kind, now, os.getpid(), now)
+        )
+
+    def heartbeat(self):
+        """Renova o heartbeat das tarefas pendentes deste processo"""
+        self._connection().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE owner_pid = ? AND status IN ('queued', 'running')",
+            (time.time(), os.getpid())
+        )
+
+    def fail_interrupted(self, stale_before: float, job_id: Optional[str] = None) -> int:
+        """
+        Marca como falha as tarefas pendentes sem heartbeat desde ``stale_before``
+        e, se ``job_id`` for informado, também essa tarefa caso o processo dono
+        não exista mais (mesma máquina: o SQLite é local)
+        """
+        connection = self._connection()
+        now = time.time()
+        failed = connection.execute(
+            """
+            UPDATE jobs SET status = 'failed', phase = 'Erro', error = ?, finished_at = ?
+            WHERE status IN ('queued', 'running') AND COALESCE(heartbeat_at, created_at) < ?
+            """,
+            (self.INTERRUPTED_ERROR, now, stale_before)
+        ).rowcount
+        if job_id is not None:
+            row = connection.execute(
+                "SELECT owner_pid FROM jobs WHERE id = ? AND status IN ('queued', 'running')", (job_id,)
+            ).fetchone()
+            if row and row[0] and not _process_alive(row[0]):
+                failed += connection.execute(
+                    """
+                    UPDATE jobs SET status = 'failed', phase = 'Erro', error = ?, finished_at = ?
+                    WHERE id = ? AND status IN ('queued', 'running')
+                    """,
+                    (self.INTERRUPTED_ERROR, now, job_id)
+                ).rowcount
+        return failed
+
+    def update(self, job_id: str, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'], default=str)
+        columns = [name for name in fields if name in self.FIELDS]
+        if not columns:
+            return
+        self._connection().execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in columns)} WHERE id = ?",
+            [fields[name] for name in columns] + [job_id]
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        cursor = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip([column[0] for column in cursor.description], row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def request_cancel(self, job_id: str) -> bool:
+        cursor = self._connection().execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+            (job_id,)
+        )
+        return cursor.rowcount == 1
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._connection().execute(
+            "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def purge(self, older_than: float):
+        self._connection().execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (older_than,)
+        )
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    def __init__(self, store_path: str, max_workers: int = 2, max_pending: int = 8,
+                 retention_seconds: float = 24 * 3600, heartbeat_interval: float = 10.0):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self.retention_seconds = retention_seconds
+        self.heartbeat_interval = heartbeat_interval
+        # Sem heartbeat por esse tempo, a tarefa é considerada interrompida
+        self.stale_after = heartbeat_interval * 6
+        self._store = JobStore(store_path)
+        self._executor = None
+        self._heartbeat_thread = None
+        self._lock = threading.Lock()
+        self._active = 0  # tarefas deste processo na fila ou em execução
+
+    def reset_after_fork(self):
+        """No processo filho: as threads das tarefas ficaram no processo pai"""
+        self._executor = None
+        self._heartbeat_thread = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._store.reset_after_fork()
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat',
+                                                      daemon=True)
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            if not self._active:
+                continue
+            try:
+                self._store.heartbeat()
+            except Exception as e:
+                logging.error(f"Erro ao renovar heartbeat das tarefas: {e}")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='job')
+        return self._executor
+
+    def submit(self, kind: str, func: Callable, *args, **kwargs) -> str:
+        """
+        Enfileira ``func(context, *args, **kwargs)`` e devolve o ID da tarefa.
+        Levanta JobQueueFullError se o limite de tarefas pendentes for atingido.
+        """
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise JobQueueFullError(
+                    f"Limite de {self.max_pending} tarefas simultâneas atingido, tente novamente em instantes")
+            self._active += 1
+            executor = self._get_executor()
+            self._ensure_heartbeat()
+
+        job_id = uuid.uuid4().hex
+        try:
+            self._store.purge(time.time() - self.retention_seconds)
+            self._store.fail_interrupted(time.time() - self.stale_after)
+            self._store.create(job_id, kind)
+            executor.submit(self._run, job_id, func, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._active -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id: str, func: Callable, args, kwargs):
+        context = JobContext(self, job_id)
+        try:
+            if self._store.cancel_requested(job_id):
+                raise JobCancelled()
+            self._store.update(job_id, status='running', phase='Iniciando', started_at=time.time())
+            result = func(context, *args, **kwargs)
+
+            if result is None or (isinstance(result, dict) and result.get('success') is False):
+                error = (result or {}).get('error') or 'Nenhum registro encontrado'
+                self._store.update(job_id, status='failed', phase='Erro', error=error,
+                                   result=result, finished_at=time.time())
+            else:
+                self._store.update(job_id, status='done', phase='Concluído',
+                                   result=result, finished_at=time.time())
+        except JobCancelled:
+            logging.info(f"Tarefa {job_id} cancelada")
+            self._store.update(job_id, status='cancelled', phase='Cancelado', finished_at=time.time())
+        except Exception as e:
+            logging.error(f"Erro na tarefa {job_id}: {e}")
+            self._store.update(job_id, status='failed', phase='Erro', error=str(e),
+                               finished_at=time.time())
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Estado atual da tarefa, com percentual quando o total é conhecido"""
+        self._store.fail_interrupted(time.time() - self.stale_after, job_id)
+        job = self._store.get(job_id)
+        if job is None:
+            return None
+        job['progress'] = None
+        if job['status'] == 'done':
+            job['progress'] = 100.0
+        elif job['total_rows']:
+            job['progress'] = round(min(100.0, 100.0 * job['rows_written'] / job['total_rows']), 1)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Pede o cancelamento; a tarefa para no próximo ponto de verificação"""
+        return self._store.request_cancel(job_id)
+
+
+# Instância global do gerenciador de tarefas
+job_manager = JobManager(
+    os.getenv('EMBALAGEM_JOB_STORE', 'data/jobs.sqlite3'),
+    max_workers=int(os.getenv('EMBALAGEM_JOB_WORKERS', '2')),
+    max_pending=int(os.getenv('EMBALAGEM_JOB_MAX_PENDING', '8')),
+    heartbeat_interval=float(os.getenv('EMBALAGEM_JOB_HEARTBEAT_SECONDS', '10'))
+)
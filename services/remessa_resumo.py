@@ -0,0 +1,174 @@
+"""
+Resumo por remessa/loja (tabela temp_embalagem_resumo, migração 002)
+
+Mantido de forma incremental: os uploads somam seus itens aqui na mesma
+transação do INSERT e os triggers da migração tratam mudanças de status e
+exclusões. "Remessa pronta para faturamento" vira uma consulta ao índice
+idx_pronta em vez de uma agregação sobre temp_embalagem.
+
+Conferência e reconstrução a partir de temp_embalagem:
+    python -m services.remessa_resumo --verify
+    python -m services.remessa_resumo --rebuild
+"""
+import argparse
+import logging
+import sys
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple, Union
+
+from database import db
+from models.embalagem import EmbalagemBatch
+
+# Contadores por status, na ordem das colunas do resumo
+STATUS_COLUMNS = {
+    'Pendente': 'pendentes',
+    'em_separacao': 'em_separacao',
+    'Finalizado': 'finalizados',
+    'Faturado': 'faturados',
+}
+
+COUNTER_COLUMNS = ('total_itens',) + tuple(STATUS_COLUMNS.values()) + ('total_pallets',)
+
+# Linha r do resumo cuja remessa inteira (todas as lojas) está finalizada
+RESUMO_PRONTA_CONDITION = """
+    r.pronta = 1
+    AND NOT EXISTS (
+        SELECT 1 FROM temp_embalagem_resumo o
+        WHERE o.Remessa = r.Remessa AND o.pronta = 0
+    )
+"""
+
+# Agregado de referência, calculado direto de temp_embalagem
+AGGREGATE_QUERY = f"""
+    SELECT
+        Remessa,
+        Loja,
+        COUNT(*) as total_itens,
+        {', '.join(f"SUM(Status <=> '{status}') as {column}" for status, column in STATUS_COLUMNS.items())},
+        COALESCE(SUM(Total_Pallets), 0) as total_pallets
+    FROM temp_embalagem
+    GROUP BY Remessa, Loja
+"""
+
+
+class RemessaResumo:
+    def __init__(self, chunk_size: int = 1000):
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def summarize_records(records: Union[EmbalagemBatch, List[tuple]]) -> List[tuple]:
+        """
+        Agrega um EmbalagemBatch (ou tuplas de TempEmbalagem.to_tuple()) por (Remessa, Loja).
+        Retorna linhas (Remessa, Loja, total_itens, contadores por status...)
+        ordenadas pela chave, para que uploads concorrentes bloqueiem as
+        linhas do resumo sempre na mesma ordem.
+        """
+        status_index = {status: i for i, status in enumerate(STATUS_COLUMNS)}
+        if isinstance(records, EmbalagemBatch):
+            # Status único no lote: basta contar as chaves direto das colunas
+            index = status_index.get(records.Status)
+            rows = []
+            for key, total in sorted(Counter(zip(records.columns['Remessa'], records.columns['Loja'])).items()):
+                counters = [total] + [0] * len(STATUS_COLUMNS)
+                if index is not None:
+                    counters[1 + index] = total
+                rows.append(key + tuple(counters))
+            return rows
+        totals = defaultdict(lambda: [0] * (1 + len(STATUS_COLUMNS)))
+        for record in records:
+            counters = totals[(record[1], record[0])]
+            counters[0] += 1
+            index = status_index.get(record[13])
+            if index is not None:
+                counters[1 + index] += 1
+        return [key + tuple(counters) for key, counters in sorted(totals.items())]
+
+    def apply_inserted(self, cursor, records: Union[EmbalagemBatch, List[tuple]]):
+        """Soma ao resumo os registros recém-inseridos (chamar na transação do INSERT)"""
+        rows = self.summarize_records(records)
+        columns = ('Remessa', 'Loja', 'total_itens') + tuple(STATUS_COLUMNS.values())
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        updates = ', '.join(f"{column} = {column} + VALUES({column})" for column in columns[2:])
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            cursor.execute(
+                f"INSERT INTO temp_embalagem_resumo ({', '.join(columns)}) VALUES "
+                + ', '.join([placeholders] * len(chunk))
+                + f" ON DUPLICATE KEY UPDATE {updates}",
+                [value for row in chunk for value in row]
+            )
+
+    def rebuild(self) -> int:
+        """Recalcula o resumo inteiro a partir de temp_embalagem; retorna as linhas gravadas"""
+        with db.transaction() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("DELETE FROM temp_embalagem_resumo")
+                cursor.execute(
+                    f"INSERT INTO temp_embalagem_resumo (Remessa, Loja, {', '.join(COUNTER_COLUMNS)}) "
+                    f"{AGGREGATE_QUERY}"
+                )
+                rows = cursor.rowcount
+            finally:
+                cursor.close()
+        logging.info(f"Resumo de remessas reconstruído: {rows} linhas")
+        return rows
+
+    def verify(self) -> List[Dict]:
+        """
+        Compara o resumo com o agregado de temp_embalagem.
+        Retorna as divergências (vazio quando o resumo está correto).
+        """
+        expected = self._load(AGGREGATE_QUERY)
+        current = self._load(
+            f"SELECT Remessa, Loja, {', '.join(COUNTER_COLUMNS)} FROM temp_embalagem_resumo"
+        )
+
+        differences = []
+        for key in sorted(expected.keys() | current.keys()):
+            if expected.get(key) != current.get(key):
+                differences.append({
+                    'remessa': key[0],
+                    'loja': key[1],
+                    'esperado': expected.get(key),
+                    'resumo': current.get(key)
+                })
+        return differences
+
+    @staticmethod
+    def _load(query: str) -> Dict[Tuple, Dict]:
+        rows = db.execute_query(query, name='resumo_verificacao')
+        if rows is None:
+            raise RuntimeError("Erro ao consultar o resumo de remessas")
+        return {
+            (row['Remessa'], row['Loja']): {column: float(row[column] or 0) for column in COUNTER_COLUMNS}
+            for row in rows
+        }
+
+
+# Instância global do resumo
+remessa_resumo = RemessaResumo()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--verify', action='store_true', help='lista divergências sem alterar nada')
+    action.add_argument('--rebuild', action='store_true', help='recalcula o resumo inteiro')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.rebuild:
+        print(f"{remessa_resumo.rebuild()} linhas gravadas")
+        return
+
+    differences = remessa_resumo.verify()
+    for diff in differences[:50]:
+        print(f"{diff['remessa']} / {diff['loja']}: esperado {diff['esperado']}, resumo {diff['resumo']}")
+    print(f"{len(differences)} divergências")
+    sys.exit(1 if differences else 0)
+
+
+if __name__ == '__main__':
+    main()
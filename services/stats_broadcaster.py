@@ -0,0 +1,179 @@
+"""
+Estatísticas do dashboard enviadas por Server-Sent Events
+
+Um único agregador por processo calcula as estatísticas (cards do dashboard
+e remessas prontas para faturamento) e as distribui a todas as telas
+conectadas em /api/embalagem/stats/stream. O cálculo acontece:
+
+- logo após uma escrita da aplicação (upload, faturamento), avisado por
+  embalagem_service.invalidate_caches;
+- a cada STATS_STREAM_REFRESH segundos enquanto houver telas conectadas,
+  para pegar mudanças de status feitas fora da aplicação (WMS).
+
+Assim a carga no banco depende do número de workers, não do número de telas.
+Cada conexão recebe o estado completo ('snapshot') e depois só os campos
+alterados ('delta'). Comentários de heartbeat mantêm a conexão viva através
+de proxies; o EventSource do navegador reconecta sozinho (campo retry) e
+recebe um novo snapshot. A conexão é encerrada após STATS_STREAM_MAX_SECONDS
+para não prender uma thread do servidor indefinidamente.
+
+Cada tela conectada ocupa uma thread do worker enquanto o stream estiver
+aberto. STATS_STREAM_MAX_SUBSCRIBERS limita as telas por processo (0 = sem
+limite): acima dele o stream responde 503 e a tela passa a consultar
+/api/embalagem/stats periodicamente, deixando as demais threads livres para
+uploads, exportações e a listagem.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, Iterator, Optional
+
+from services.embalagem_service import embalagem_service
+
+
+class StatsBroadcaster:
+    def __init__(self, refresh_interval: float = 10.0, heartbeat: float = 15.0,
+                 max_seconds: float = 300.0, retry_ms: int = 5000, queue_size: int = 16,
+                 max_subscribers: int = 0):
+        self.refresh_interval = refresh_interval
+        self.heartbeat = heartbeat
+        self.max_seconds = max_seconds
+        self.max_subscribers = max_subscribers
+        self.retry_ms = retry_ms
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._subscribers = set()
+        self._latest: Optional[Dict] = None
+        self._sequence = 0
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.rejected = 0
+        embalagem_service.add_change_listener(self.notify)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def notify(self):
+        """Dados alterados: recalcular e distribuir (sem custo se ninguém estiver conectado)"""
+        self._changed.set()
+
+    def subscribe(self) -> Optional[queue.Queue]:
+        """
+        Inscreve uma tela; None se o limite de telas do processo foi atingido.
+        A inscrição deve ser desfeita com unsubscribe quando a resposta fechar.
+        """
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.max_subscribers and len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            # Sem ninguém conectado o agregador não atualiza: o último estado pode estar velho
+            if not self._subscribers:
+                self._latest = None
+            self._subscribers.add(subscriber)
+            self._ensure_thread()
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber: queue.Queue) -> Iterator[str]:
+        """Eventos SSE de uma conexão inscrita: snapshot, deltas e heartbeats"""
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            snapshot = self._latest or self._refresh()
+            if snapshot is not None:
+                yield self._format('snapshot', snapshot, self._sequence)
+
+            deadline = time.monotonic() + self.max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    yield subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='stats-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._changed.wait(self.refresh_interval)
+            self._changed.clear()
+            if not self._subscribers:
+                continue
+            try:
+                self._refresh()
+            except Exception as e:
+                logging.error(f"Erro ao atualizar estatísticas do stream: {e}")
+
+    def _refresh(self) -> Optional[Dict]:
+        """Calcula o estado atual e envia aos inscritos o que mudou desde o último"""
+        with self._refresh_lock:
+            stats = embalagem_service.get_dashboard_stats()
+            faturamento = embalagem_service.get_remessas_finalizadas_stats()
+            if stats is None or faturamento is None:
+                return self._latest
+            self.refreshes += 1
+            current = {'stats': asdict(stats), 'faturamento': faturamento}
+
+            previous = self._latest
+            self._latest = current
+            if previous is None:
+                return current
+
+            delta = {}
+            changed_stats = {key: value for key, value in current['stats'].items()
+                             if previous['stats'].get(key) != value}
+            if changed_stats:
+                delta['stats'] = changed_stats
+            if current['faturamento'] != previous['faturamento']:
+                delta['faturamento'] = current['faturamento']
+            if delta:
+                self._sequence += 1
+                self._broadcast(self._format('delta', delta, self._sequence), current)
+            return current
+
+    def _broadcast(self, event: str, current: Dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Tela que não está consumindo: descarta o acumulado e reenvia o estado completo
+                self._drain(subscriber)
+                subscriber.put_nowait(self._format('snapshot', current, self._sequence))
+
+    @staticmethod
+    def _drain(subscriber: queue.Queue):
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+
+    @staticmethod
+    def _format(event: str, data: Dict, event_id: int) -> str:
+        payload = json.dumps(data, default=str, separators=(',', ':'))
+        return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+# Instância global do agregador
+stats_broadcaster = StatsBroadcaster(
+    refresh_interval=float(os.getenv('STATS_STREAM_REFRESH', '10')),
+    heartbeat=float(os.getenv('STATS_STREAM_HEARTBEAT', '15')),
+    max_seconds=float(os.getenv('STATS_STREAM_MAX_SECONDS', '300')),
+    max_subscribers=int(os.getenv('STATS_STREAM_MAX_SUBSCRIBERS', '0'))
+)
@@ -4,14 +4,25 @@
 
 class EmbalagemModule {
     constructor() {
-        this.selectedFile = null;
+        this.selectedFiles = [];
         this.uploadInProgress = false;
         this.currentPage = 1;
         this.totalPages = 1;
         this.perPage = 50;
         this.currentFilters = {};
+        // Paginação por cursor: cursor conhecido para cada página já visitada
+        this.pageCursors = { 1: null };
+        this.knownPagination = null;
         this.exportInProgress = false;
         this.faturamentoInProgress = false;
+        // Estatísticas recebidas pelo stream (SSE): estado completo + deltas
+        this.statsStream = null;
+        this.liveStats = null;
+        // Detalhes dos registros da página visível: a listagem já traz as
+        // mesmas colunas, então o modal abre sem novo pedido. prefetchDetails
+        // (opcional) busca de novo a página em /api/embalagem/records
+        this.prefetchDetails = false;
+        this.recordDetailsCache = new Map();
         
         this.init();
     }
@@ -19,8 +30,7 @@ class EmbalagemModule {
     init() {
         this.setupEventListeners();
         this.setupExportCardListeners();
-        this.loadStats();
-        this.loadFaturamentoInfo();
+        this.connectStatsStream();
         
         console.log('🚀 Módulo de Embalagem inicializado');
     }
@@ -197,18 +207,10 @@ class EmbalagemModule {
             this.faturamentoInProgress = true;
             this.showFaturamentoProgress();
 
-            // Fazer requisição para processar faturamento
-            const response = await fetch('/api/embalagem/export-faturamento', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    usuario: 'Sistema' // Pode ser obtido do contexto do usuário logado
-                })
-            });
-
-            const result = await response.json();
+            // Processar faturamento em segundo plano acompanhando o progresso real
+            const result = await this.runJob('/api/embalagem/export-faturamento', {
+                usuario: 'Sistema' // Pode ser obtido do contexto do usuário logado
+            }, (job) => this.updateJobProgress('faturamentoProgressFill', 'faturamentoProgressText', job));
 
             this.hideFaturamentoProgress();
 
@@ -245,39 +247,11 @@ class EmbalagemModule {
         if (startBtn) startBtn.disabled = true;
         if (refreshBtn) refreshBtn.disabled = true;
 
-        // Simular progresso
-        this.animateFaturamentoProgress();
-    }
-
-    animateFaturamentoProgress() {
-        const progressFill = document.getElementById('faturamentoProgressFill');
-        const progressText = document.getElementById('faturamentoProgressText');
-        
-        let progress = 0;
-        const interval = setInterval(() => {
-            progress += Math.random() * 20;
-            if (progress > 90) progress = 90;
-            
-            if (progressFill) progressFill.style.width = `${progress}%`;
-            if (progressText) {
-                if (progress < 30) {
-                    progressText.textContent = 'Identificando remessas completas...';
-                } else if (progress < 60) {
-                    progressText.textContent = 'Gerando planilha de faturamento...';
-                } else {
-                    progressText.textContent = 'Atualizando status dos registros...';
-                }
-            }
-        }, 200);
-
-        this.faturamentoProgressInterval = interval;
+        this.updateJobProgress('faturamentoProgressFill', 'faturamentoProgressText',
+            { phase: 'Processando faturamento', progress: 0 });
     }
 
     hideFaturamentoProgress() {
-        if (this.faturamentoProgressInterval) {
-            clearInterval(this.faturamentoProgressInterval);
-        }
-
         const progress = document.getElementById('faturamentoProgress');
         if (progress) progress.style.display = 'none';
     }
@@ -458,16 +432,12 @@ class EmbalagemModule {
                 data_fim: dataFim
             };
 
-            // Fazer requisição
-            const response = await fetch('/api/embalagem/export-custom', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(exportData)
-            });
-
-            const result = await response.json();
+            // Exportar em segundo plano acompanhando o progresso real
+            const result = await this.runJob('/api/embalagem/export-custom', exportData,
+                (job) => this.updateJobProgress('exportProgressFill', 'exportProgressText', job));
+            if (result.success && !result.message) {
+                result.message = `Exportação concluída com sucesso! ${result.total_records} registros exportados.`;
+            }
 
             this.hideExportProgress();
 
@@ -499,39 +469,11 @@ class EmbalagemModule {
         if (progress) progress.style.display = 'block';
         if (startBtn) startBtn.disabled = true;
 
-        // Simular progresso
-        this.animateExportProgress();
-    }
-
-    animateExportProgress() {
-        const progressFill = document.getElementById('exportProgressFill');
-        const progressText = document.getElementById('exportProgressText');
-        
-        let progress = 0;
-        const interval = setInterval(() => {
-            progress += Math.random() * 15;
-            if (progress > 90) progress = 90;
-            
-            if (progressFill) progressFill.style.width = `${progress}%`;
-            if (progressText) {
-                if (progress < 30) {
-                    progressText.textContent = 'Coletando dados...';
-                } else if (progress < 60) {
-                    progressText.textContent = 'Processando registros...';
-                } else {
-                    progressText.textContent = 'Gerando arquivo Excel...';
-                }
-            }
-        }, 200);
-
-        this.exportProgressInterval = interval;
+        this.updateJobProgress('exportProgressFill', 'exportProgressText',
+            { phase: 'Preparando exportação', progress: 0 });
     }
 
     hideExportProgress() {
-        if (this.exportProgressInterval) {
-            clearInterval(this.exportProgressInterval);
-        }
-
         const progress = document.getElementById('exportProgress');
         if (progress) progress.style.display = 'none';
     }
@@ -673,6 +615,84 @@ class EmbalagemModule {
         if (dateEndInput) dateEndInput.value = '';
     }
 
+    // Tarefas em segundo plano (exportação e faturamento)
+    async runJob(url, body, onProgress) {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ ...body, async: true })
+        });
+
+        const accepted = await response.json();
+        if (!accepted.success || !accepted.job_id) {
+            return accepted;
+        }
+
+        this.currentJobId = accepted.job_id;
+        try {
+            const job = await this.pollJob(accepted.job_id, onProgress);
+            if (job.status === 'done') {
+                return { success: true, ...job.result };
+            }
+            if (job.status === 'cancelled') {
+                return { success: false, error: 'Operação cancelada' };
+            }
+            return { success: false, error: job.error || 'Erro no processamento' };
+        } finally {
+            this.currentJobId = null;
+        }
+    }
+
+    async pollJob(jobId, onProgress, interval = 500) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, interval));
+
+            const response = await fetch(`/api/jobs/${jobId}`);
+            const data = await response.json();
+            if (!data.success) {
+                return { status: 'failed', error: data.error };
+            }
+
+            const job = data.data;
+            if (onProgress) onProgress(job);
+
+            if (['done', 'failed', 'cancelled'].includes(job.status)) {
+                return job;
+            }
+        }
+    }
+
+    async cancelCurrentJob() {
+        if (!this.currentJobId) return;
+
+        try {
+            await fetch(`/api/jobs/${this.currentJobId}/cancel`, { method: 'POST' });
+        } catch (error) {
+            console.error('Erro ao cancelar tarefa:', error);
+        }
+    }
+
+    updateJobProgress(fillId, textId, job) {
+        const progressFill = document.getElementById(fillId);
+        const progressText = document.getElementById(textId);
+
+        if (progressFill && job.progress !== null && job.progress !== undefined) {
+            progressFill.style.width = `${job.progress}%`;
+        }
+
+        if (progressText) {
+            let text = `${job.phase || 'Processando'}...`;
+            if (job.total_rows) {
+                text += ` ${job.rows_written || 0} de ${job.total_rows} registros`;
+            } else if (job.rows_read) {
+                text += ` ${job.rows_read} registros`;
+            }
+            progressText.textContent = text;
+        }
+    }
+
     downloadExportFile(downloadUrl, filename) {
         // Criar link temporário para download
         const link = document.createElement('a');
@@ -685,6 +705,50 @@ class EmbalagemModule {
         this.showNotification('Download iniciado', 'success');
     }
 
+    // Estatísticas em tempo real: o servidor envia um snapshot ao conectar
+    // e depois só os campos alterados. Sem suporte a SSE, carrega uma vez.
+    connectStatsStream() {
+        if (!window.EventSource) {
+            this.loadStats();
+            this.loadFaturamentoInfo();
+            return;
+        }
+
+        const stream = new EventSource('/api/embalagem/stats/stream');
+        this.statsStream = stream;
+
+        stream.addEventListener('snapshot', (event) => {
+            this.liveStats = JSON.parse(event.data);
+            this.updateStatsDisplay(this.liveStats.stats);
+            this.updateFaturamentoDisplay(this.liveStats.faturamento);
+        });
+
+        stream.addEventListener('delta', (event) => {
+            if (!this.liveStats) return;
+            const delta = JSON.parse(event.data);
+            if (delta.stats) {
+                Object.assign(this.liveStats.stats, delta.stats);
+                this.updateStatsDisplay(this.liveStats.stats);
+            }
+            if (delta.faturamento) {
+                this.liveStats.faturamento = delta.faturamento;
+                this.updateFaturamentoDisplay(delta.faturamento);
+            }
+        });
+
+        // O EventSource reconecta sozinho; se desistir (CLOSED, ex.: 503 com o
+        // limite de telas do servidor atingido), consulta as estatísticas
+        // diretamente e tenta o stream de novo mais tarde
+        stream.onerror = () => {
+            if (stream.readyState === EventSource.CLOSED) {
+                this.statsStream = null;
+                this.loadStats();
+                this.loadFaturamentoInfo();
+                setTimeout(() => this.connectStatsStream(), 10000 + Math.random() * 5000);
+            }
+        };
+    }
+
     async loadStats() {
         try {
             const response = await fetch('/api/embalagem/stats');
@@ -725,47 +789,45 @@ class EmbalagemModule {
 
     // Métodos de upload (mantidos do código anterior)
     handleFileSelect(event) {
-        const file = event.target.files[0];
+        // Várias planilhas (ou .zip com planilhas) podem ser enviadas juntas
+        const files = Array.from(event.target.files || []);
         
-        if (!file) {
+        if (files.length === 0) {
             this.clearFileSelection();
             return;
         }
 
-        // Validar tipo de arquivo
-        const validTypes = [
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'application/vnd.ms-excel'
-        ];
-        
-        if (!validTypes.includes(file.type) && !file.name.match(/\.(xlsx|xls)$/i)) {
-            this.showNotification('Formato de arquivo inválido. Use apenas .xlsx ou .xls', 'error');
+        // Validar tipo dos arquivos
+        const invalid = files.filter(file => !file.name.match(/\.(xlsx|xls|csv|txt|parquet|zip)$/i));
+        if (invalid.length > 0) {
+            this.showNotification('Formato de arquivo inválido. Use .xlsx, .xls, .csv, .parquet ou .zip', 'error');
             this.clearFileSelection();
             return;
         }
 
-        // Validar tamanho (16MB)
-        const maxSize = 16 * 1024 * 1024;
-        if (file.size > maxSize) {
-            this.showNotification('Arquivo muito grande. Máximo 16MB', 'error');
+        // Validar tamanho total do envio (limite configurado no servidor)
+        const fileInput = document.getElementById('fileInput');
+        const maxSize = Number(fileInput?.dataset.maxUpload) || 16 * 1024 * 1024;
+        if (files.reduce((total, file) => total + file.size, 0) > maxSize) {
+            this.showNotification(`Arquivos muito grandes. Máximo ${this.formatFileSize(maxSize)} por envio`, 'error');
             this.clearFileSelection();
             return;
         }
 
-        this.selectedFile = file;
-        this.showFileInfo(file);
+        this.selectedFiles = files;
+        this.showFileInfo(files);
         this.enableUploadButton();
     }
 
-    showFileInfo(file) {
+    showFileInfo(files) {
         const fileInfo = document.getElementById('fileInfo');
         const fileName = document.getElementById('fileName');
         const fileSize = document.getElementById('fileSize');
         const uploadArea = document.getElementById('fileUploadArea');
 
         if (fileInfo && fileName && fileSize) {
-            fileName.textContent = file.name;
-            fileSize.textContent = this.formatFileSize(file.size);
+            fileName.textContent = files.length === 1 ? files[0].name : `${files.length} arquivos`;
+            fileSize.textContent = this.formatFileSize(files.reduce((total, file) => total + file.size, 0));
             
             fileInfo.style.display = 'block';
             uploadArea.style.display = 'none';
@@ -773,7 +835,7 @@ class EmbalagemModule {
     }
 
     clearFileSelection() {
-        this.selectedFile = null;
+        this.selectedFiles = [];
         
         const fileInput = document.getElementById('fileInput');
         const fileInfo = document.getElementById('fileInfo');
@@ -801,7 +863,7 @@ class EmbalagemModule {
     }
 
     async uploadFile() {
-        if (!this.selectedFile || this.uploadInProgress) {
+        if (this.selectedFiles.length === 0 || this.uploadInProgress) {
             return;
         }
 
@@ -809,7 +871,7 @@ class EmbalagemModule {
         this.showUploadProgress();
 
         const formData = new FormData();
-        formData.append('file', this.selectedFile);
+        this.selectedFiles.forEach(file => formData.append('files', file));
 
         try {
             const response = await fetch('/api/embalagem/upload', {
@@ -823,8 +885,11 @@ class EmbalagemModule {
             
             if (data.success) {
                 this.showUploadResult(true, data.message, data.data);
-                this.loadStats(); // Recarregar estatísticas
-                this.loadFaturamentoInfo(); // Recarregar info de faturamento
+                // Com o stream ativo as estatísticas chegam sozinhas
+                if (!this.statsStream) {
+                    this.loadStats(); // Recarregar estatísticas
+                    this.loadFaturamentoInfo(); // Recarregar info de faturamento
+                }
             } else {
                 this.showUploadResult(false, data.error, data.data);
             }
@@ -839,6 +904,11 @@ class EmbalagemModule {
     }
 
     // Métodos para visualização de dados
+    resetPagination() {
+        this.pageCursors = { 1: null };
+        this.knownPagination = null;
+    }
+
     async loadData(page = 1, filters = {}) {
         this.showTableLoading();
         
@@ -849,15 +919,35 @@ class EmbalagemModule {
                 ...filters
             });
 
+            // Páginas alcançadas sequencialmente usam o cursor (keyset);
+            // saltos para páginas ainda não visitadas usam OFFSET
+            if (page in this.pageCursors) {
+                params.set('mode', 'keyset');
+                if (this.pageCursors[page]) params.set('cursor', this.pageCursors[page]);
+                // O total só é pedido na primeira página; depois é reaproveitado
+                if (page !== 1 && this.knownPagination) params.set('total', '0');
+            }
+
             const response = await fetch(`/api/embalagem/data?${params}`);
             const data = await response.json();
             
             this.hideTableLoading();
             
             if (data.success) {
+                const pagination = data.pagination;
+                if (pagination.total_records === null && this.knownPagination) {
+                    pagination.total_records = this.knownPagination.total_records;
+                    pagination.total_pages = this.knownPagination.total_pages;
+                }
+                this.knownPagination = pagination;
+                if (pagination.next_cursor) {
+                    this.pageCursors[page + 1] = pagination.next_cursor;
+                }
+
                 this.displayTableData(data.data);
-                this.updatePaginationInfo(data.pagination);
-                this.updateDataSummary(data.pagination);
+                this.updatePaginationInfo(pagination);
+                this.updateDataSummary(pagination);
+                this.cacheRecordDetails(data.data);
             } else {
                 this.showTableEmpty();
                 this.showNotification('Erro ao carregar dados', 'error');
@@ -995,7 +1085,42 @@ class EmbalagemModule {
         if (totalPages) totalPages.textContent = pagination.total_pages;
     }
 
+    cacheRecordDetails(records) {
+        // Página nova: detalhes antigos podem estar desatualizados
+        this.recordDetailsCache.clear();
+        records.forEach(record => this.recordDetailsCache.set(record.id, record));
+        if (this.prefetchDetails) {
+            this.prefetchRecordDetails(records.map(record => record.id));
+        }
+    }
+
+    async prefetchRecordDetails(recordIds) {
+        if (recordIds.length === 0) return;
+
+        try {
+            const response = await fetch('/api/embalagem/records', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ids: recordIds })
+            });
+            const data = await response.json();
+
+            if (data.success) {
+                data.data.forEach(record => this.recordDetailsCache.set(record.id, record));
+            }
+        } catch (error) {
+            // Fica valendo o que veio na listagem
+            console.warn('Prefetch dos detalhes falhou:', error);
+        }
+    }
+
     async viewRecordDetails(recordId) {
+        const cached = this.recordDetailsCache.get(recordId);
+        if (cached) {
+            this.displayRecordDetails(cached);
+            return;
+        }
+
         try {
             const response = await fetch(`/api/embalagem/record/${recordId}`);
             const data = await response.json();
@@ -1126,7 +1251,8 @@ class EmbalagemModule {
             status: document.getElementById('filterStatus')?.value || '',
             remessa: document.getElementById('filterRemessa')?.value || '',
             loja: document.getElementById('filterLoja')?.value || '',
-            codigo: document.getElementById('filterCodigo')?.value || ''
+            codigo: document.getElementById('filterCodigo')?.value || '',
+            busca: document.getElementById('filterBusca')?.value || ''
         };
         
         // Remover filtros vazios
@@ -1135,6 +1261,7 @@ class EmbalagemModule {
         );
         
         this.currentPage = 1; // Reset para primeira página
+        this.resetPagination();
         this.loadData(this.currentPage, this.currentFilters);
     }
 
@@ -1142,7 +1269,7 @@ class EmbalagemModule {
         // Limpar campos de filtro
         const filterInputs = [
             'filterDataInicio', 'filterDataFim', 'filterStatus',
-            'filterRemessa', 'filterLoja', 'filterCodigo'
+            'filterRemessa', 'filterLoja', 'filterCodigo', 'filterBusca'
         ];
         
         filterInputs.forEach(id => {
@@ -1152,6 +1279,7 @@ class EmbalagemModule {
         
         this.currentFilters = {};
         this.currentPage = 1;
+        this.resetPagination();
         this.loadData(this.currentPage, this.currentFilters);
     }
 
@@ -1286,7 +1414,36 @@ class EmbalagemModule {
                     <span class="summary-value">${data.duplicates_found}</span>
                 </div>`;
             }
-            
+
+            if (data.in_flight_found) {
+                detailsHtml += `<div class="summary-item warning" title="Linhas sendo gravadas por outro upload; reenvie se ele falhar">
+                    <span class="summary-label">Em processamento por outro upload:</span>
+                    <span class="summary-value">${data.in_flight_found}</span>
+                </div>`;
+            }
+
+            if (data.rows_with_errors !== undefined && data.rows_with_errors > 0) {
+                const firstErrors = (data.row_errors || []).slice(0, 5)
+                    .map(err => `${err.arquivo ? err.arquivo + ' - ' : ''}Linha ${err.linha}: ${err.erro}`).join('\n');
+                detailsHtml += `<div class="summary-item warning" title="${firstErrors}">
+                    <span class="summary-label">Linhas com problemas:</span>
+                    <span class="summary-value">${data.rows_with_errors}</span>
+                </div>`;
+            }
+
+            // Resultado por planilha quando várias foram enviadas
+            if (data.files && data.files.length > 1) {
+                data.files.forEach(file => {
+                    const value = file.success
+                        ? `${file.valid_records ?? 0} válidos / ${file.duplicates_found ?? 0} duplicados`
+                        : 'erro';
+                    detailsHtml += `<div class="summary-item${file.success ? '' : ' warning'}" title="${file.error || ''}">
+                        <span class="summary-label">${file.filename}:</span>
+                        <span class="summary-value">${value}</span>
+                    </div>`;
+                });
+            }
+
             detailsHtml += '</div>';
             resultDetails.innerHTML = detailsHtml;
         }
@@ -1391,7 +1548,8 @@ function openDataModal() {
         
         // Carregar dados na primeira abertura
         if (window.embalagemModule) {
-            window.embalagemModule.loadData();
+            window.embalagemModule.resetPagination();
+            window.embalagemModule.loadData(1, window.embalagemModule.currentFilters);
         }
     }
 }
@@ -1480,6 +1638,12 @@ function startExport() {
     }
 }
 
+function cancelExport() {
+    if (window.embalagemModule) {
+        window.embalagemModule.cancelCurrentJob();
+    }
+}
+
 // Funções específicas do card de faturamento
 function refreshFaturamentoInfo() {
     if (window.embalagemModule) {
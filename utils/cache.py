@@ -0,0 +1,164 @@
+"""
+Caches em memória do processo
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Cache com expiração por tempo (TTL) e invalidação explícita.
+
+    ``get_or_load`` garante que, para uma mesma chave, apenas uma thread
+    execute o carregamento por vez: requisições simultâneas aguardam e
+    reaproveitam o mesmo resultado. Um resultado carregado antes de uma
+    invalidação não é guardado, para não devolver dados anteriores à escrita.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = {}       # chave -> (expira_em, valor)
+        # chave -> [Lock do carregamento, threads usando ou esperando]; a entrada sai com a última
+        self._key_locks = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any):
+        if len(self._entries) >= self.maxsize and key not in self._entries:
+            now = time.monotonic()
+            for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            if len(self._entries) >= self.maxsize:
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Devolve o valor em cache ou o carrega (uma única vez por chave)"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry and entry[0] > time.monotonic():
+                        return entry[1]
+                    generation = self._generation
+
+                value = loader()
+
+                # Resultados nulos (erro no carregamento) não são guardados
+                if value is not None:
+                    with self._lock:
+                        if generation == self._generation:
+                            self._store(key, value)
+                return value
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def invalidate(self, key: Hashable = None):
+        """Descarta uma chave (ou todo o cache, se nenhuma for informada)"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class LRUCache:
+    """
+    Cache limitado por quantidade de entradas: ao encher, descarta a usada
+    há mais tempo. O TTL opcional limita a idade de cada entrada (mudanças
+    feitas fora do processo, que não passam por invalidate).
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chave -> (expira_em, valor)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable = None):
+        """Descarta uma chave (ou todo o cache, se nenhuma for informada)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class VersionCounter:
+    """
+    Versão dos dados de uma tabela: incrementada a cada escrita feita pela
+    aplicação. Entra na chave dos caches, então uma escrita torna todas as
+    entradas anteriores inalcançáveis de uma vez.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+        self.modified_at = time.time()
+
+    def bump(self) -> int:
+        with self._lock:
+            self.value += 1
+            self.modified_at = time.time()
+            return self.value
+
+    def snapshot(self) -> Tuple[int, float]:
+        """(versão, momento da última mudança em epoch)"""
+        with self._lock:
+            return self.value, self.modified_at
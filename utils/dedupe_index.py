@@ -0,0 +1,228 @@
+"""
+Índice persistente de chaves já recebidas para validação de duplicidade
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Set
+
+
+class DedupeIndex:
+    """
+    Índice de chaves únicas por dia, gravado em SQLite (modo WAL).
+
+    Cada upload apenas acrescenta as suas chaves, com busca O(1) pela chave
+    primária (dia, chave). A reserva das chaves roda em uma transação
+    ``BEGIN IMMEDIATE``, que serializa uploads simultâneos inclusive entre
+    processos (workers do gunicorn): duas requisições nunca aceitam a mesma
+    linha. A virada do dia não reescreve nada — chaves de dias anteriores
+    são apenas removidas com um DELETE pela chave primária.
+
+    A reserva é feita antes do INSERT no MySQL, então a chave fica
+    pendente até ``confirm`` (gravada) ou ``release`` (upload desfeito). Um
+    upload simultâneo com as mesmas linhas distingue "em processamento" de
+    "já gravada" e espera a outra resolver em vez de descartá-las como
+    duplicatas. Reservas pendentes há mais de ``pending_timeout`` segundos
+    (worker que caiu no meio do upload, ou ``confirm`` que falhou depois do
+    commit) são retomadas — antes, ``verify_pending(chaves, dia)`` informa
+    quais delas já estão gravadas no banco; essas passam a gravadas em vez
+    de serem aceitas de novo.
+    """
+
+    def __init__(self, path: str, legacy_json: str = None, pending_timeout: float = 900.0,
+                 poll_interval: float = 0.5,
+                 verify_pending: Optional[Callable[[List[str], str], Set[str]]] = None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.pending_timeout = pending_timeout
+        self.poll_interval = poll_interval
+        self.verify_pending = verify_pending
+        self._local = threading.local()
+        self._purged_day = None
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def reset_after_fork(self):
+        """No processo filho: conexões SQLite não podem ser usadas dos dois lados de um fork"""
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexão SQLite exclusiva da thread atual"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self._ensure_schema()
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _ensure_schema(self):
+        with self._init_lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            is_new = not os.path.exists(self.path)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            try:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS chaves (
+                        dia TEXT NOT NULL,
+                        chave TEXT NOT NULL,
+                        pendente INTEGER NOT NULL DEFAULT 0,
+                        reservado_em REAL,
+                        PRIMARY KEY (dia, chave)
+                    ) WITHOUT ROWID
+                """)
+                # Arquivo de índice criado antes das reservas pendentes
+                columns = {row[1] for row in connection.execute('PRAGMA table_info(chaves)')}
+                if 'pendente' not in columns:
+                    connection.execute('ALTER TABLE chaves ADD COLUMN pendente INTEGER NOT NULL DEFAULT 0')
+                    connection.execute('ALTER TABLE chaves ADD COLUMN reservado_em REAL')
+                if is_new:
+                    self._import_legacy_json(connection)
+            finally:
+                connection.close()
+            self._initialized = True
+
+    def _import_legacy_json(self, connection: sqlite3.Connection):
+        """Importa as chaves do antigo duplicate_keys.json na criação do índice"""
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            return
+        try:
+            with open(self.legacy_json, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            connection.execute('BEGIN IMMEDIATE')
+            for day, keys in legacy.items():
+                connection.executemany(
+                    'INSERT OR IGNORE INTO chaves (dia, chave) VALUES (?, ?)',
+                    ((day, key) for key in keys)
+                )
+            connection.execute('COMMIT')
+            logging.info(f"Índice de duplicatas importado de {self.legacy_json}")
+        except Exception as e:
+            logging.error(f"Erro ao importar arquivo de duplicatas legado: {e}")
+
+    def _purge_previous_days(self, connection: sqlite3.Connection, day: str):
+        """Descarta chaves de dias anteriores (uma vez por dia por processo)"""
+        if self._purged_day == day:
+            return
+        connection.execute('DELETE FROM chaves WHERE dia < ?', (day,))
+        self._purged_day = day
+
+    def claim(self, keys: Iterable[str], day: str, pending: bool = True,
+              wait: float = 0.0) -> List[Optional[bool]]:
+        """
+        Reserva as chaves do dia de forma atômica.
+        Retorna, para cada chave, True se ela é nova (e agora está reservada),
+        False se já foi gravada — inclusive repetida dentro do próprio lote —
+        ou None se está reservada por outro upload ainda em andamento.
+        Com ``pending`` as chaves ficam pendentes até confirm/release; sem,
+        já entram como gravadas. Chaves em andamento são tentadas de novo
+        por até ``wait`` segundos.
+        """
+        keys = list(keys)
+        claimed = self._claim_once(keys, day, pending)
+        deadline = time.monotonic() + wait
+        while None in claimed and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            waiting = [i for i, status in enumerate(claimed) if status is None]
+            for i, status in zip(waiting, self._claim_once([keys[i] for i in waiting], day, pending)):
+                claimed[i] = status
+        return claimed
+
+    def _claim_once(self, keys: List[str], day: str, pending: bool) -> List[Optional[bool]]:
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._purge_previous_days(connection, day)
+            cursor = connection.cursor()
+            claimed = []
+            stale = []
+            seen = set()
+            for key in keys:
+                if key in seen:
+                    claimed.append(False)
+                    continue
+                seen.add(key)
+                cursor.execute(
+                    'INSERT OR IGNORE INTO chaves (dia, chave, pendente, reservado_em) VALUES (?, ?, ?, ?)',
+                    (day, key, int(pending), now)
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(True)
+                    continue
+                is_pending, reserved_at = cursor.execute(
+                    'SELECT pendente, reservado_em FROM chaves WHERE dia = ? AND chave = ?', (day, key)
+                ).fetchone()
+                if not is_pending:
+                    claimed.append(False)
+                elif reserved_at is not None and now - reserved_at < self.pending_timeout:
+                    claimed.append(None)
+                else:
+                    stale.append(len(claimed))
+                    claimed.append(None)
+            if stale:
+                self._resolve_stale(cursor, keys, claimed, stale, day, pending, now)
+            connection.execute('COMMIT')
+            return claimed
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _resolve_stale(self, cursor: sqlite3.Cursor, keys: List[str], claimed: List[Optional[bool]],
+                       stale: List[int], day: str, pending: bool, now: float):
+        """
+        Reservas abandonadas: as chaves já gravadas no banco viram gravadas,
+        as demais são assumidas. Roda dentro da transação da reserva (caminho
+        raro: só depois de uma queda ou falha do confirm).
+        """
+        stale_keys = [keys[i] for i in stale]
+        persisted = set()
+        if self.verify_pending is not None:
+            try:
+                persisted = self.verify_pending(stale_keys, day)
+            except Exception as e:
+                # Sem a conferência a chave não pode ser assumida: segue "em andamento"
+                logging.error(f"Erro ao conferir reservas abandonadas no banco: {e}")
+                return
+        for i, key in zip(stale, stale_keys):
+            if key in persisted:
+                cursor.execute('UPDATE chaves SET pendente = 0 WHERE dia = ? AND chave = ?', (day, key))
+                claimed[i] = False
+            else:
+                cursor.execute(
+                    'UPDATE chaves SET pendente = ?, reservado_em = ? WHERE dia = ? AND chave = ?',
+                    (int(pending), now, day, key)
+                )
+                claimed[i] = True
+
+    def confirm(self, keys: Iterable[str], day: str):
+        """Marca como gravadas as chaves reservadas cujo upload foi gravado no banco"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('UPDATE chaves SET pendente = 0 WHERE dia = ? AND chave = ?',
+                                   ((day, key) for key in keys))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def release(self, keys: Iterable[str], day: str):
+        """Libera chaves reservadas cujo upload não foi gravado no banco"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('DELETE FROM chaves WHERE dia = ? AND chave = ?',
+                                   ((day, key) for key in keys))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
@@ -0,0 +1,316 @@
+"""
+Leitores dos formatos aceitos no upload
+
+Cada formato tem um leitor que entrega o arquivo em DataFrames de até
+``chunk_rows`` linhas, sempre no mesmo formato: colunas com os valores
+originais (dtype object) e índice igual à posição da linha de dados. O
+UploadHandler valida e converte os blocos da mesma forma, qualquer que seja
+a origem.
+
+- xlsx: openpyxl em modo read_only (streaming);
+- xls: pd.read_excel (formato antigo, lido inteiro);
+- csv: leitor de CSV do Arrow em streaming, com detecção de separador e
+  codificação; sem o pyarrow instalado, pd.read_csv em blocos;
+- parquet: pyarrow.parquet por lotes de linhas (exige o pyarrow).
+
+O formato é detectado pela assinatura do arquivo (um .xls que na verdade é
+um .xlsx é lido certo) e, sem assinatura conhecida, pela extensão. Novos
+formatos entram com register_reader.
+"""
+import abc
+import codecs
+import csv
+import os
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from utils.lazy_imports import is_available, lazy_module
+
+# Importados no primeiro upload (ver utils/lazy_imports.py)
+pd = lazy_module('pandas')
+if is_available('pyarrow'):
+    pa = lazy_module('pyarrow')
+    pc = lazy_module('pyarrow.compute')
+    pa_csv = lazy_module('pyarrow.csv')
+    pa_parquet = lazy_module('pyarrow.parquet')
+else:  # pyarrow é opcional: CSV usa o pandas e Parquet fica indisponível
+    pa = None
+
+# Bytes lidos do início do arquivo para detectar separador e codificação do CSV
+CSV_SNIFF_BYTES = 64 * 1024
+CSV_DELIMITERS = (';', ',', '\t', '|')
+
+
+class FileReader(abc.ABC):
+    """Base dos leitores: ``read_chunks`` gera os blocos do arquivo"""
+
+    format: str = ''
+    extensions: Tuple[str, ...] = ()
+    # Bytes iniciais que identificam o formato
+    signatures: Tuple[bytes, ...] = ()
+
+    def available(self) -> bool:
+        return True
+
+    @abc.abstractmethod
+    def read_chunks(self, path: str, chunk_rows: int,
+                    numeric_columns: Iterable[str] = ()) -> Iterator['pd.DataFrame']:
+        """
+        DataFrames de até ``chunk_rows`` linhas. ``numeric_columns`` são as
+        colunas que serão convertidas para número, para leitores que precisam
+        normalizá-las (ex.: vírgula decimal no CSV).
+        """
+
+
+class XlsxFileReader(FileReader):
+    format = 'xlsx'
+    extensions = ('.xlsx',)
+    signatures = (b'PK\x03\x04',)
+
+    def read_chunks(self, path, chunk_rows, numeric_columns=()):
+        """
+        Primeira aba da planilha; linhas totalmente vazias são ignoradas.
+        As colunas ficam como object, com os valores das células: sem a
+        inferência de tipos do read_excel, um código numérico em uma coluna
+        com células vazias não vira float ('789...0') e o resultado não
+        depende de como as linhas caem nos blocos.
+        """
+        from openpyxl import load_workbook
+
+        # Arquivo aberto em vez do caminho: o openpyxl recusaria um .xlsx salvo como .xls
+        source = open(path, 'rb')
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                yield pd.DataFrame()
+                return
+            columns = [str(value) if value is not None else f"Unnamed: {i}" for i, value in enumerate(header)]
+            width = len(columns)
+            padding = (None,) * width
+
+            positions = []
+            chunk = []
+            produced = False
+            for position, row in enumerate(rows):
+                if all(value is None for value in row):
+                    continue
+                positions.append(position)
+                chunk.append(row[:width] if len(row) >= width else row + padding[len(row):])
+                if len(chunk) >= chunk_rows:
+                    yield pd.DataFrame(chunk, columns=columns, index=positions, dtype=object)
+                    positions, chunk = [], []
+                    produced = True
+            if chunk or not produced:
+                yield pd.DataFrame(chunk, columns=columns, index=positions, dtype=object)
+        finally:
+            workbook.close()
+            source.close()
+
+
+class XlsFileReader(FileReader):
+    format = 'xls'
+    extensions = ('.xls',)
+    signatures = (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',)
+
+    def read_chunks(self, path, chunk_rows, numeric_columns=()):
+        # O formato antigo não tem leitura em streaming
+        yield pd.read_excel(path, dtype=object)
+
+
+class CsvFileReader(FileReader):
+    format = 'csv'
+    extensions = ('.csv', '.txt')
+
+    def __init__(self, use_arrow: bool = True, block_size: int = 4 * 1024 * 1024):
+        self.use_arrow = use_arrow and pa is not None
+        # Bytes por bloco do leitor do Arrow; os blocos são reagrupados em chunk_rows linhas
+        self.block_size = block_size
+
+    def read_chunks(self, path, chunk_rows, numeric_columns=()):
+        """
+        Todas as colunas são lidas como texto (código com zeros à esquerda
+        continua igual) e campos vazios viram nulos, como células vazias.
+        Com separador ';' (padrão do Excel em português) os números usam
+        vírgula decimal e as colunas numéricas são normalizadas para ponto.
+        Linhas em branco são ignoradas e não contam na numeração dos erros.
+        """
+        delimiter, encoding, columns = sniff_csv(path)
+        if not columns:
+            yield pd.DataFrame()
+            return
+        decimal_comma = delimiter == ';'
+        numeric_columns = [col for col in numeric_columns if col in columns]
+        if self.use_arrow:
+            chunks = self._read_arrow(path, chunk_rows, delimiter, encoding, columns, decimal_comma,
+                                      numeric_columns)
+        else:
+            chunks = self._read_pandas(path, chunk_rows, delimiter, encoding, columns, decimal_comma,
+                                       numeric_columns)
+        offset = 0
+        produced = False
+        for df in chunks:
+            if df.empty and produced:
+                continue
+            df.index = pd.RangeIndex(offset, offset + len(df))
+            offset += len(df)
+            produced = True
+            yield df
+        if not produced:
+            yield pd.DataFrame(columns=columns, dtype=object)
+
+    def _read_arrow(self, path, chunk_rows, delimiter, encoding, columns, decimal_comma, numeric_columns):
+        reader = pa_csv.open_csv(
+            path,
+            read_options=pa_csv.ReadOptions(
+                encoding=encoding, column_names=columns, skip_rows=1, block_size=self.block_size),
+            parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={col: pa.string() for col in columns},
+                strings_can_be_null=True, null_values=[''])
+        )
+        for table in self._rebatch(reader, chunk_rows):
+            if decimal_comma and numeric_columns:
+                table = pa.Table.from_arrays(
+                    [pc.replace_substring(table.column(name), ',', '.') if name in numeric_columns
+                     else table.column(name) for name in table.schema.names],
+                    names=table.schema.names)
+            yield table.to_pandas()
+
+    @staticmethod
+    def _rebatch(batches, chunk_rows):
+        """
+        Tabelas de exatamente ``chunk_rows`` linhas (a última pode ter menos)
+        a partir dos blocos do leitor, que são por bytes (``block_size``).
+        As fatias não copiam os dados.
+        """
+        pending = []
+        pending_rows = 0
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunk_rows:
+                table = pa.Table.from_batches(pending)
+                yield table.slice(0, chunk_rows)
+                rest = table.slice(chunk_rows)
+                pending = rest.to_batches()
+                pending_rows = rest.num_rows
+        if pending_rows:
+            yield pa.Table.from_batches(pending)
+
+    @staticmethod
+    def _read_pandas(path, chunk_rows, delimiter, encoding, columns, decimal_comma, numeric_columns):
+        with pd.read_csv(path, sep=delimiter, encoding='utf-8-sig' if encoding == 'utf8' else encoding,
+                         names=columns, skiprows=1, dtype=str, keep_default_na=False, na_values=[''],
+                         chunksize=chunk_rows) as reader:
+            for df in reader:
+                df = df.astype(object).where(df.notna(), None)
+                if decimal_comma:
+                    for col in numeric_columns:
+                        df[col] = df[col].str.replace(',', '.', regex=False)
+                yield df
+
+
+class ParquetFileReader(FileReader):
+    format = 'parquet'
+    extensions = ('.parquet',)
+    signatures = (b'PAR1',)
+
+    def available(self):
+        return pa is not None
+
+    def read_chunks(self, path, chunk_rows, numeric_columns=()):
+        """
+        Colunas não numéricas gravadas com outro tipo (código como inteiro,
+        datas) são convertidas para texto no Arrow, antes do pandas: um
+        inteiro com nulos não passa por float ('123.0').
+        """
+        if pa is None:
+            raise ValueError("Leitura de Parquet exige o pacote pyarrow")
+        numeric_columns = set(numeric_columns)
+        parquet = pa_parquet.ParquetFile(path)
+        offset = 0
+        produced = False
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            arrays = [
+                column if name in numeric_columns or pa.types.is_string(column.type)
+                else pc.cast(column, pa.string())
+                for name, column in zip(batch.schema.names, batch.columns)
+            ]
+            df = pa.RecordBatch.from_arrays(arrays, names=batch.schema.names).to_pandas()
+            df.index = pd.RangeIndex(offset, offset + len(df))
+            offset += len(df)
+            produced = True
+            yield df
+        if not produced:
+            yield pd.DataFrame(columns=parquet.schema_arrow.names, dtype=object)
+
+
+_READERS: Dict[str, FileReader] = {}
+
+
+def register_reader(reader: FileReader):
+    """Registra (ou substitui) o leitor de um formato"""
+    _READERS[reader.format] = reader
+
+
+for _reader in (XlsxFileReader(), XlsFileReader(), CsvFileReader(), ParquetFileReader()):
+    register_reader(_reader)
+
+
+def upload_extensions() -> Tuple[str, ...]:
+    """Extensões aceitas no upload (formatos com leitor disponível)"""
+    return tuple(extension for reader in _READERS.values() if reader.available()
+                 for extension in reader.extensions)
+
+
+def detect_format(path: str, filename: Optional[str] = None) -> Optional[str]:
+    """Formato do arquivo pela assinatura e, se não houver, pela extensão"""
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    for reader in _READERS.values():
+        if any(head.startswith(signature) for signature in reader.signatures):
+            return reader.format
+    extension = os.path.splitext((filename or path).lower())[1]
+    for reader in _READERS.values():
+        if extension in reader.extensions:
+            return reader.format
+    return None
+
+
+def get_reader(file_format: str) -> FileReader:
+    reader = _READERS.get(file_format)
+    if reader is None:
+        raise ValueError(f"Formato de arquivo não suportado: {file_format}")
+    if not reader.available():
+        raise ValueError(f"Leitura de {file_format} exige o pacote pyarrow")
+    return reader
+
+
+def sniff_csv(path: str) -> Tuple[str, str, list]:
+    """
+    Separador, codificação e nomes das colunas do CSV, a partir do início
+    do arquivo. A codificação é UTF-8 (com ou sem BOM) quando o trecho lido
+    é UTF-8 válido; senão cp1252, a do Excel no Windows.
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(CSV_SNIFF_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        sample = sample[len(codecs.BOM_UTF8):]
+    try:
+        # Decodificador incremental: um caractere cortado no fim do trecho não é erro
+        text = codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        encoding = 'utf8'
+    except UnicodeDecodeError:
+        text = sample.decode('cp1252', errors='replace')
+        encoding = 'cp1252'
+
+    header = text.splitlines()[0] if text else ''
+    delimiter = max(CSV_DELIMITERS, key=header.count)
+    if not header.count(delimiter):
+        delimiter = ','
+    names = next(csv.reader([header], delimiter=delimiter), [])
+    columns = [name.strip() or f"Unnamed: {i}" for i, name in enumerate(names)]
+    return delimiter, encoding, columns
@@ -0,0 +1,94 @@
+"""
+Importação adiada das bibliotecas pesadas
+
+pandas, numpy e pyarrow levam a maior parte do tempo de ``import app`` e só
+são usados no upload e nas exportações. Os módulos que dependem deles usam
+``lazy_module``: o objeto devolvido tem a mesma interface do módulo, que só
+é importado no primeiro acesso a um atributo. As páginas, a listagem e as
+estatísticas não pagam esse custo; o primeiro upload ou exportação do
+processo paga (``preload_heavy_modules`` antecipa a importação, ver
+gunicorn.conf.py e PRELOAD_HEAVY_MODULES em config.py).
+
+Relatório do tempo de importação: benchmarks/bench_import_time.py.
+"""
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Dict
+
+# Importados por preload_heavy_modules, na ordem (pandas já traz o numpy)
+HEAVY_MODULES = ('pandas', 'openpyxl', 'pyarrow', 'pyarrow.compute', 'pyarrow.csv', 'pyarrow.parquet')
+
+# Segundos gastos em cada importação adiada feita neste processo
+load_times: Dict[str, float] = {}
+_load_lock = threading.Lock()
+
+
+class LazyModule(ModuleType):
+    """Substituto do módulo ``name`` que o importa no primeiro acesso"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_name = name
+        self._module = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with _load_lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._lazy_name)
+                    elapsed = time.perf_counter() - started
+                    load_times[self._lazy_name] = elapsed
+                    logging.info(f"Módulo {self._lazy_name} importado sob demanda em {elapsed:.2f}s")
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        # Só é chamado para atributos que não estão no próprio objeto
+        if attr.startswith('_lazy') or attr == '_module':
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'importado' if self._module is not None else 'não importado'
+        return f"<módulo adiado '{self._lazy_name}' ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def is_available(name: str) -> bool:
+    """Se o pacote está instalado, sem importá-lo"""
+    try:
+        return importlib.util.find_spec(name.split('.')[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def preload_heavy_modules() -> Dict[str, float]:
+    """
+    Importa agora as bibliotecas pesadas instaladas e devolve o tempo de
+    cada uma. No mestre do gunicorn, antes do fork, os workers (inclusive os
+    reciclados) herdam os módulos já carregados.
+    """
+    timings = {}
+    for name in HEAVY_MODULES:
+        if not is_available(name):
+            continue
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.error(f"Erro ao pré-carregar {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - started
+    logging.info(f"Bibliotecas pesadas pré-carregadas em {sum(timings.values()):.2f}s")
+    return timings
@@ -0,0 +1,201 @@
+"""
+Métricas do processo: latência de queries e de rotas, log de queries lentas
+
+Histogramas e contadores ficam em memória (por processo) e são expostos no
+formato texto do Prometheus em /metrics. Configuração por ambiente:
+
+- METRICS_ENABLED=0 desliga tudo (nenhuma medição, /metrics responde 404);
+- SLOW_QUERY_MS: queries acima deste tempo vão para o log (0 desliga).
+"""
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# Limites superiores dos buckets, em segundos
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+`?(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def query_name(query: str) -> str:
+    """Nome padrão de uma query sem nome explícito: comando + primeira tabela"""
+    words = query.split(None, 1)
+    command = words[0].lower() if words else 'query'
+    match = _TABLE_PATTERN.search(query)
+    return f"{command}_{match.group(1)}" if match else command
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus (um por combinação de rótulos)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True, slow_query_ms: float = 500.0):
+        self.enabled = enabled
+        self.slow_query_seconds = slow_query_ms / 1000.0
+        self._lock = threading.Lock()
+        self._query_latency: Dict[str, Histogram] = {}
+        self._query_rows: Dict[str, int] = {}
+        self._query_errors: Dict[str, int] = {}
+        self._slow_queries: Dict[str, int] = {}
+        self._request_latency: Dict[Tuple[str, str, int], Histogram] = {}
+        self._started = time.time()
+
+    def observe_query(self, name: str, seconds: float, rows: Optional[int] = None,
+                      query: Optional[str] = None, error: bool = False):
+        """Registra uma execução de query; acima do limite também vai para o log"""
+        if not self.enabled:
+            return
+        slow = 0 < self.slow_query_seconds <= seconds
+        with self._lock:
+            histogram = self._query_latency.get(name)
+            if histogram is None:
+                histogram = self._query_latency[name] = Histogram()
+            histogram.observe(seconds)
+            if rows and rows > 0:
+                self._query_rows[name] = self._query_rows.get(name, 0) + rows
+            if error:
+                self._query_errors[name] = self._query_errors.get(name, 0) + 1
+            if slow:
+                self._slow_queries[name] = self._slow_queries.get(name, 0) + 1
+        if slow:
+            sql = ' '.join(query.split())[:500] if query else ''
+            logging.warning(f"Query lenta [{name}]: {seconds * 1000:.0f} ms, {rows or 0} linhas {sql}")
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float):
+        if not self.enabled:
+            return
+        key = (endpoint, method, status)
+        with self._lock:
+            histogram = self._request_latency.get(key)
+            if histogram is None:
+                histogram = self._request_latency[key] = Histogram()
+            histogram.observe(seconds)
+
+    def instrument_blueprint(self, blueprint):
+        """Mede o tempo de cada requisição atendida pelo blueprint"""
+        if not self.enabled:
+            return
+        from flask import g, request
+
+        @blueprint.before_request
+        def _start_timer():
+            g.metrics_started = time.perf_counter()
+
+        @blueprint.after_request
+        def _record_timing(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                self.observe_request(request.endpoint or 'desconhecido', request.method,
+                                     response.status_code, time.perf_counter() - started)
+            return response
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, Dict[str, float]]]] = None,
+               counters: Optional[Dict[str, Tuple[str, Dict[str, float]]]] = None) -> str:
+        """
+        Texto no formato de exposição do Prometheus.
+        ``gauges`` (valores instantâneos) e ``counters`` (acumulados desde o
+        início do processo, nomes terminados em _total):
+        {nome_da_métrica: (descrição, {rótulo_ou_vazio: valor})}
+        """
+        with self._lock:
+            query_latency = {name: self._copy(h) for name, h in self._query_latency.items()}
+            request_latency = {key: self._copy(h) for key, h in self._request_latency.items()}
+            query_rows = dict(self._query_rows)
+            query_errors = dict(self._query_errors)
+            slow_queries = dict(self._slow_queries)
+
+        lines = []
+        self._render_histograms(
+            lines, 'embalagem_db_query_duration_seconds', 'Duração das queries por nome',
+            {(('query', name),): h for name, h in query_latency.items()})
+        self._render_counter(lines, 'embalagem_db_query_rows_total', 'Linhas lidas ou afetadas por query',
+                             'query', query_rows)
+        self._render_counter(lines, 'embalagem_db_query_errors_total', 'Queries com erro', 'query', query_errors)
+        self._render_counter(lines, 'embalagem_db_slow_queries_total',
+                             'Queries acima de SLOW_QUERY_MS', 'query', slow_queries)
+        self._render_histograms(
+            lines, 'embalagem_http_request_duration_seconds', 'Duração das requisições por rota',
+            {(('endpoint', e), ('method', m), ('status', str(s))): h
+             for (e, m, s), h in request_latency.items()})
+
+        for metric_type, metrics_values in (('gauge', gauges), ('counter', counters)):
+            for metric, (description, values) in (metrics_values or {}).items():
+                lines.append(f"# HELP {metric} {description}")
+                lines.append(f"# TYPE {metric} {metric_type}")
+                for label, value in values.items():
+                    lines.append(f"{metric}{label} {value}")
+
+        lines.append("# HELP embalagem_process_start_time_seconds Início do processo (epoch)")
+        lines.append("# TYPE embalagem_process_start_time_seconds gauge")
+        lines.append(f"embalagem_process_start_time_seconds {self._started}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._query_latency.clear()
+            self._query_rows.clear()
+            self._query_errors.clear()
+            self._slow_queries.clear()
+            self._request_latency.clear()
+
+    @staticmethod
+    def _copy(histogram: Histogram) -> Histogram:
+        copy = Histogram(histogram.buckets)
+        copy.counts = list(histogram.counts)
+        copy.sum = histogram.sum
+        copy.count = histogram.count
+        return copy
+
+    @staticmethod
+    def _labels(pairs) -> str:
+        return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+    def _render_histograms(self, lines, metric: str, description: str, histograms: Dict):
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} histogram")
+        for pairs, histogram in sorted(histograms.items()):
+            labels = self._labels(pairs)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{labels}}} {histogram.sum:.6f}')
+            lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+
+    def _render_counter(self, lines, metric: str, description: str, label: str, values: Dict[str, int]):
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} counter")
+        for name, value in sorted(values.items()):
+            lines.append(f'{metric}{{{self._labels(((label, name),))}}} {value}')
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Instância global das métricas
+metrics = MetricsRegistry(
+    enabled=os.getenv('METRICS_ENABLED', '1') == '1',
+    slow_query_ms=float(os.getenv('SLOW_QUERY_MS', '500'))
+)
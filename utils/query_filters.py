@@ -0,0 +1,148 @@
+"""
+Construção das cláusulas WHERE dos filtros do módulo de embalagem
+
+Os filtros de data viram intervalos semiabertos sobre a coluna
+Data_Registro (``>= início AND < fim``) em vez de ``DATE(Data_Registro)``,
+para que o MySQL possa usar os índices que começam por Data_Registro.
+
+Os filtros de texto (remessa, loja, código) aceitam três modos de busca
+(filtro ``busca``): ``exata`` e ``prefixo`` usam os índices B-tree; ``contem``
+(padrão) usa o índice FULLTEXT ngram da coluna quando ele existe e cai
+para ``LIKE '%valor%'`` (varredura) quando não existe.
+"""
+import base64
+from datetime import date, datetime, timedelta
+from typing import AbstractSet, Dict, List, Tuple
+
+# Filtro da tela -> coluna, para os filtros de texto
+TEXT_FILTER_COLUMNS = {'remessa': 'Remessa', 'loja': 'Loja', 'codigo': 'Codigo'}
+
+# Modos de busca dos filtros de texto
+MATCH_EXACT = 'exata'
+MATCH_PREFIX = 'prefixo'
+MATCH_CONTAINS = 'contem'
+MATCH_MODES = (MATCH_EXACT, MATCH_PREFIX, MATCH_CONTAINS)
+
+# ngram_token_size do servidor (padrão do MySQL): buscas mais curtas
+# não geram nenhum token e precisam do LIKE
+NGRAM_TOKEN_SIZE = 2
+
+# Registros do dia corrente (data do servidor MySQL), sem envolver a coluna em função
+TODAY_CONDITION = "Data_Registro >= CURDATE() AND Data_Registro < CURDATE() + INTERVAL 1 DAY"
+
+
+def parse_day(value) -> date:
+    """Converte 'AAAA-MM-DD' (ou date/datetime) em date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip()[:10], '%Y-%m-%d').date()
+
+
+def day_start(value) -> datetime:
+    """Início (00:00:00) do dia informado"""
+    return datetime.combine(parse_day(value), datetime.min.time())
+
+
+def next_day_start(value) -> datetime:
+    """Início do dia seguinte: limite superior exclusivo do intervalo"""
+    return day_start(value) + timedelta(days=1)
+
+
+def escape_like(value: str) -> str:
+    """Escapa os curingas do LIKE para que o valor seja comparado literalmente"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def match_mode(filters: Dict) -> str:
+    """Modo de busca dos filtros de texto; levanta ValueError se for inválido"""
+    mode = filters.get('busca') or MATCH_CONTAINS
+    if mode not in MATCH_MODES:
+        raise ValueError(f"Modo de busca inválido: {mode} (use {', '.join(MATCH_MODES)})")
+    return mode
+
+
+def text_condition(column: str, value: str, mode: str = MATCH_CONTAINS,
+                   fulltext_columns: AbstractSet[str] = frozenset()) -> Tuple[str, List]:
+    """
+    Condição de um filtro de texto no modo de busca informado.
+    No modo ``contem`` com índice FULLTEXT, o MATCH seleciona os candidatos
+    pelo índice e o LIKE confirma a substring exata.
+    """
+    value = str(value).strip()
+    if mode == MATCH_EXACT:
+        return f"{column} = %s", [value]
+    if mode == MATCH_PREFIX:
+        return f"{column} LIKE %s", [escape_like(value) + '%']
+    if mode != MATCH_CONTAINS:
+        raise ValueError(f"Modo de busca inválido: {mode} (use {', '.join(MATCH_MODES)})")
+
+    like = f"%{escape_like(value)}%"
+    # Espaços e aspas quebram a frase em tokens separados: nesses casos só o LIKE é exato
+    single_token = not any(char.isspace() or char == '"' for char in value)
+    if column in fulltext_columns and single_token and len(value) >= NGRAM_TOKEN_SIZE:
+        return (f"MATCH({column}) AGAINST (%s IN BOOLEAN MODE) AND {column} LIKE %s",
+                [f'"{value}"', like])
+    return f"{column} LIKE %s", [like]
+
+
+def build_where_clause(filters: Dict, fulltext_columns: AbstractSet[str] = frozenset()) -> Tuple[str, List]:
+    """
+    Monta a cláusula WHERE (com o prefixo " WHERE ") e os parâmetros
+    a partir dos filtros da tela de dados/exportação.
+    Filtros suportados: data_inicio, data_fim, status, remessa, loja, codigo
+    e busca (modo dos filtros de texto: exata, prefixo ou contem).
+    ``fulltext_columns``: colunas com índice FULLTEXT ngram disponível.
+    """
+    where_conditions = []
+    params = []
+
+    if filters.get('data_inicio'):
+        where_conditions.append("Data_Registro >= %s")
+        params.append(day_start(filters['data_inicio']))
+
+    if filters.get('data_fim'):
+        where_conditions.append("Data_Registro < %s")
+        params.append(next_day_start(filters['data_fim']))
+
+    if filters.get('status'):
+        where_conditions.append("Status = %s")
+        params.append(filters['status'])
+
+    mode = match_mode(filters)
+    for name, column in TEXT_FILTER_COLUMNS.items():
+        if filters.get(name):
+            condition, condition_params = text_condition(column, filters[name], mode, fulltext_columns)
+            where_conditions.append(condition)
+            params.extend(condition_params)
+
+    where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    return where_clause, params
+
+
+# Paginação por chave (keyset): a ordenação da listagem é
+# ORDER BY Data_Registro DESC, id DESC, e o cursor guarda a última linha vista.
+KEYSET_CONDITION = "(Data_Registro < %s OR (Data_Registro = %s AND id < %s))"
+
+
+def encode_cursor(data_registro: datetime, record_id: int) -> str:
+    """Gera o cursor opaco a partir da última linha (Data_Registro, id) da página"""
+    raw = f"{data_registro.isoformat()}|{int(record_id)}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodifica o cursor; levanta ValueError se ele for inválido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, record_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except Exception:
+        raise ValueError('Cursor de paginação inválido')
+
+
+def keyset_params(cursor: str) -> List:
+    """Parâmetros de KEYSET_CONDITION para o cursor informado"""
+    data_registro, record_id = decode_cursor(cursor)
+    return [data_registro, data_registro, record_id]
@@ -1,102 +1,292 @@
 """
 Manipulador de upload de planilhas
+
+Um upload pode trazer várias planilhas (ou um .zip com elas). O parse com
+openpyxl é CPU-bound e preso ao GIL, então as planilhas de um mesmo envio
+são lidas em paralelo em um pool de processos (UPLOAD_PARSE_WORKERS,
+padrão: número de CPUs) e os lotes resultantes voltam já em formato colunar.
+
+Os arquivos recebidos vão para disco (UPLOAD_SPOOL_DIR) e são lidos em
+blocos de UPLOAD_PARSE_CHUNK_ROWS linhas: o pico de memória do parse não
+acompanha o tamanho do arquivo. Além de Excel, o WMS exporta CSV e Parquet,
+bem mais baratos de ler; os leitores de cada formato ficam em
+utils/file_readers.py e todos alimentam a mesma validação e inserção.
 """
-import pandas as pd
-from typing import List, Optional
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
-from io import BytesIO
 
-from models.embalagem import TempEmbalagem
+from models.embalagem import DictionaryColumn, EmbalagemBatch, NumericColumn
+from utils import file_readers
+from utils.lazy_imports import lazy_module
+
+# Importados no primeiro upload (ver utils/lazy_imports.py)
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
 
 class UploadHandler:
-    def __init__(self):
+    # Limite de erros por linha devolvidos ao cliente (o total é sempre informado)
+    MAX_ROW_ERRORS = 100
+    # Limites de um .zip enviado: planilhas e tamanho total descompactado
+    MAX_ZIP_WORKBOOKS = 200
+    MAX_ZIP_UNCOMPRESSED = 512 * 1024 * 1024
+
+    def __init__(self, parse_workers: Optional[int] = None, chunk_rows: int = 10000,
+                 spool_dir: str = 'data'):
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        # Linhas por bloco na leitura em streaming do .xlsx
+        self.chunk_rows = chunk_rows
+        # Onde os uploads são gravados durante o processamento
+        self.spool_dir = spool_dir
+        self._pool = None
+        self._pool_lock = threading.Lock()
         self.required_columns = [
             'Loja', 'Remessa', 'Local', 'Ordem', 'Posicao_Deposito',
             'Codigo', 'Descricao_Produto', 'UM', 'Qtde_Emb', 'Qtde_CX',
             'Qtde_UM', 'Estoque', 'EAN'
         ]
-    
+        self.key_columns = ['Remessa', 'Loja', 'Codigo']
+        self.numeric_columns = ['Qtde_Emb', 'Qtde_CX', 'Qtde_UM', 'Estoque']
+        self.string_columns = ['Loja', 'Remessa', 'Local', 'Ordem', 'Posicao_Deposito',
+                               'Codigo', 'Descricao_Produto', 'UM']
+
     def validate_file_format(self, file) -> bool:
-        """Valida se o arquivo é uma planilha Excel válida"""
+        """Valida se o arquivo tem formato aceito (ou é um .zip de arquivos aceitos)"""
         try:
             filename = file.filename.lower()
-            return filename.endswith(('.xlsx', '.xls'))
+            return filename.endswith(file_readers.upload_extensions() + ('.zip',))
         except:
             return False
-    
-    def parse_excel_file(self, file) -> Optional[List[TempEmbalagem]]:
+
+    @contextmanager
+    def spool_uploads(self, files) -> Iterator[List[Tuple[str, str]]]:
+        """
+        Grava os arquivos enviados em um diretório temporário do upload e
+        devolve (nome, caminho) de cada planilha; arquivos .zip são extraídos
+        e cada planilha interna vira uma entrada. Nada fica inteiro em
+        memória, e o diretório é apagado na saída do bloco.
+        Levanta ValueError para .zip inválido ou acima dos limites.
+        """
+        with tempfile.TemporaryDirectory(prefix='upload_', dir=self.spool_dir) as workdir:
+            yield self._spool(files, workdir)
+
+    def _spool(self, files, workdir: str) -> List[Tuple[str, str]]:
+        workbooks = []
+        extensions = file_readers.upload_extensions()
+        for position, file in enumerate(files):
+            extension = os.path.splitext(file.filename.lower())[1]
+            path = os.path.join(workdir, f"{position}{extension}")
+            file.save(path)
+            if extension != '.zip':
+                workbooks.append((file.filename, path))
+                continue
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    members = [
+                        info for info in archive.infolist()
+                        if not info.is_dir() and info.filename.lower().endswith(extensions)
+                        and not os.path.basename(info.filename).startswith(('.', '~$'))
+                        and not info.filename.startswith('__MACOSX/')
+                    ]
+                    if len(members) > self.MAX_ZIP_WORKBOOKS:
+                        raise ValueError(f"{file.filename}: mais de {self.MAX_ZIP_WORKBOOKS} arquivos de dados")
+                    if sum(info.file_size for info in members) > self.MAX_ZIP_UNCOMPRESSED:
+                        raise ValueError(f"{file.filename}: conteúdo descompactado muito grande")
+                    if not members:
+                        raise ValueError(f"{file.filename}: nenhum arquivo em formato aceito ({', '.join(extensions)})")
+                    # O tamanho declarado no .zip pode mentir: o limite vale para o que é extraído
+                    remaining = self.MAX_ZIP_UNCOMPRESSED
+                    for index, info in enumerate(members):
+                        member_path = os.path.join(
+                            workdir, f"{position}_{index}{os.path.splitext(info.filename.lower())[1]}")
+                        with archive.open(info) as source, open(member_path, 'wb') as target:
+                            remaining -= self._copy_limited(source, target, remaining, file.filename)
+                        workbooks.append((f"{file.filename}/{info.filename}", member_path))
+            except zipfile.BadZipFile:
+                raise ValueError(f"{file.filename}: arquivo .zip inválido")
+            os.remove(path)
+        return workbooks
+
+    @staticmethod
+    def _copy_limited(source, target, limit: int, filename: str, buffer_size: int = 1024 * 1024) -> int:
+        copied = 0
+        while True:
+            data = source.read(buffer_size)
+            if not data:
+                return copied
+            copied += len(data)
+            if copied > limit:
+                raise ValueError(f"{filename}: conteúdo descompactado muito grande")
+            target.write(data)
+
+    def parse_many(self, workbooks: List[Tuple[str, str]]) -> List[Optional[Tuple[EmbalagemBatch, List[Dict]]]]:
         """
-        Faz o parse do arquivo Excel e retorna lista de objetos TempEmbalagem
+        Parse de várias planilhas (nome, caminho), em paralelo no pool de
+        processos. Resultados na ordem recebida, None para as que falharam.
         """
+        if len(workbooks) <= 1 or self.parse_workers <= 1:
+            return [self.parse_file(path, filename) for filename, path in workbooks]
         try:
-            # Ler arquivo Excel
-            df = pd.read_excel(BytesIO(file.read()))
-            
+            return list(self._get_pool().map(_parse_file, workbooks))
+        except BrokenProcessPool as e:
+            logging.error(f"Erro no pool de parse, processando sem paralelismo: {e}")
+            with self._pool_lock:
+                self._pool = None
+            return [self.parse_file(path, filename) for filename, path in workbooks]
+
+    def reset_after_fork(self):
+        """No processo filho: o pool de parse herdado não funciona (threads de controle ficam no pai)"""
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # spawn: o processo web tem threads (pool de conexões, tarefas), e um
+        # fork herdaria locks no meio do uso
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def parse_excel_file(self, file) -> Optional[Tuple[EmbalagemBatch, List[Dict]]]:
+        """
+        Faz o parse do arquivo enviado (Excel, CSV ou Parquet).
+        Retorna (lote, erros): os registros válidos em um EmbalagemBatch
+        (colunar, pronto para inserção) e a lista de erros por linha da planilha.
+        """
+        with tempfile.TemporaryDirectory(prefix='upload_', dir=self.spool_dir) as workdir:
+            path = os.path.join(workdir, 'planilha' + os.path.splitext(file.filename.lower())[1])
+            file.save(path)
+            return self.parse_file(path, file.filename)
+
+    def parse_file(self, path: str, filename: Optional[str] = None) -> Optional[Tuple[EmbalagemBatch, List[Dict]]]:
+        """
+        Parse de um arquivo gravado em disco (mesmo retorno de parse_excel_file),
+        em qualquer formato com leitor em utils.file_readers: o formato é
+        detectado pelo conteúdo e, na falta de assinatura, pela extensão de
+        ``filename`` (ou do próprio caminho). A leitura é feita em blocos de
+        ``chunk_rows`` linhas quando o formato permite: a memória de trabalho
+        não depende do tamanho do arquivo, só o lote colunar cresce com ele.
+        """
+        try:
+            file_format = file_readers.detect_format(path, filename)
+            if file_format is None:
+                logging.error(f"Formato de arquivo não reconhecido: {filename or path}")
+                return None
+            reader = file_readers.get_reader(file_format)
+            return self.parse_chunks(reader.read_chunks(path, self.chunk_rows, self.numeric_columns))
+
+        except Exception as e:
+            logging.error(f"Erro ao processar arquivo: {e}")
+            return None
+
+    def parse_chunks(self, frames: Iterable['pd.DataFrame']) -> Optional[Tuple[EmbalagemBatch, List[Dict]]]:
+        """Valida e converte os blocos de um arquivo em um único lote colunar"""
+        batches = []
+        errors = []
+        for df in frames:
             # Validar colunas obrigatórias
             missing_columns = [col for col in self.required_columns if col not in df.columns]
             if missing_columns:
                 logging.error(f"Colunas obrigatórias faltando: {missing_columns}")
                 return None
-            
-            # Limpar dados e converter tipos
-            df = df.dropna(subset=['Remessa', 'Loja', 'Codigo'])  # Remover linhas com valores obrigatórios nulos
-            
-            # Converter colunas numéricas para float (conforme estrutura da tabela)
-            numeric_columns = ['Qtde_Emb', 'Qtde_CX', 'Qtde_UM', 'Estoque']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-            
-            # Limpar e converter strings
-            string_columns = ['Loja', 'Remessa', 'Local', 'Ordem', 'Posicao_Deposito', 
-                            'Codigo', 'Descricao_Produto', 'UM']
-            for col in string_columns:
-                df[col] = df[col].astype(str).str.strip()
-            
-            # Tratar coluna EAN (pode ser nula)
-            df['EAN'] = df['EAN'].astype(str)
-            df['EAN'] = df['EAN'].replace('nan', None)
-            df['EAN'] = df['EAN'].replace('', None)
-            
-            # Converter para objetos TempEmbalagem
-            records = []
-            for _, row in df.iterrows():
-                try:
-                    # Tratar EAN especialmente
-                    ean_value = row['EAN']
-                    if pd.isna(ean_value) or str(ean_value).lower() in ['nan', 'none', '']:
-                        ean_value = None
-                    else:
-                        ean_value = str(ean_value)
-                    
-                    record = TempEmbalagem(
-                        Loja=str(row['Loja']),
-                        Remessa=str(row['Remessa']),
-                        Local=str(row['Local']),
-                        Ordem=str(row['Ordem']),
-                        Posicao_Deposito=str(row['Posicao_Deposito']),
-                        Codigo=str(row['Codigo']),
-                        Descricao_Produto=str(row['Descricao_Produto']),
-                        UM=str(row['UM']),
-                        Qtde_Emb=float(row['Qtde_Emb']),
-                        Qtde_CX=float(row['Qtde_CX']),
-                        Qtde_UM=float(row['Qtde_UM']),
-                        Estoque=float(row['Estoque']),
-                        EAN=ean_value,
-                        Status='Pendente',
-                        Usuario=None  # Pode ser definido posteriormente se necessário
-                    )
-                    records.append(record)
-                except Exception as e:
-                    logging.warning(f"Erro ao processar linha: {e}")
-                    logging.warning(f"Dados da linha: {row.to_dict()}")
-                    continue
-            
-            logging.info(f"Arquivo processado: {len(records)} registros válidos")
-            return records
-            
-        except Exception as e:
-            logging.error(f"Erro ao processar arquivo Excel: {e}")
-            return None
+
+            batch, chunk_errors = self.dataframe_to_batch(df)
+            batches.append(batch)
+            errors.extend(chunk_errors)
+
+        batch = EmbalagemBatch.concat(batches)
+
+        if errors:
+            logging.warning(f"Arquivo com {len(errors)} linhas com problemas")
+        logging.info(f"Arquivo processado: {len(batch)} registros válidos")
+        return batch, errors
+
+    def dataframe_to_batch(self, df: 'pd.DataFrame') -> Tuple[EmbalagemBatch, List[Dict]]:
+        """
+        Limpa e converte o DataFrame inteiro com operações por coluna e
+        monta o lote colunar direto dos arrays do pandas, sem objeto por linha.
+        """
+        # Número da linha na planilha (cabeçalho ocupa a linha 1)
+        line_numbers = pd.Series(df.index + 2, index=df.index)
+        errors = []
+
+        # Campos obrigatórios: nulos ou em branco invalidam a linha
+        key_values = df[self.key_columns]
+        missing = key_values.isna() | key_values.astype(str).apply(lambda col: col.str.strip() == '')
+        invalid_mask = missing.any(axis=1)
+        if invalid_mask.any():
+            for line, row_missing in zip(line_numbers[invalid_mask], missing[invalid_mask].to_numpy()):
+                fields = [col for col, is_missing in zip(self.key_columns, row_missing) if is_missing]
+                errors.append({'linha': int(line), 'erro': f"Campos obrigatórios vazios: {', '.join(fields)}"})
+            df = df[~invalid_mask]
+            line_numbers = line_numbers[~invalid_mask]
+
+        # Converter colunas numéricas para float (conforme estrutura da tabela)
+        numeric = {}
+        for col in self.numeric_columns:
+            converted = pd.to_numeric(df[col], errors='coerce')
+            not_numeric = converted.isna() & df[col].notna()
+            if not_numeric.any():
+                errors.extend(
+                    {'linha': int(line), 'erro': f"Valor não numérico em {col} convertido para 0"}
+                    for line in line_numbers[not_numeric]
+                )
+            numeric[col] = converted.fillna(0.0).astype(float)
+
+        # Limpar e converter strings (nulos viram texto vazio)
+        strings = {}
+        for col in self.string_columns:
+            values = df[col]
+            strings[col] = values.where(values.notna(), '').astype(str).str.strip()
+
+        # Tratar coluna EAN (pode ser nula)
+        ean = df['EAN'].astype(str)
+        ean_missing = df['EAN'].isna() | ean.str.strip().str.lower().isin(['nan', 'none', ''])
+        ean = ean.astype(object).where(~ean_missing, None)
+
+        errors.sort(key=lambda error: error['linha'])
+
+        columns = {col: self._dictionary_column(values) for col, values in strings.items()}
+        columns.update({col: self._numeric_column(values) for col, values in numeric.items()})
+        columns['EAN'] = self._dictionary_column(ean)
+        return EmbalagemBatch(columns), errors
+
+    @staticmethod
+    def _dictionary_column(values: 'pd.Series') -> DictionaryColumn:
+        """Codifica a coluna com pd.factorize (nulos viram o valor None)"""
+        codes, uniques = pd.factorize(values)
+        distinct = uniques.tolist()
+        if (codes < 0).any():
+            codes = np.where(codes < 0, len(distinct), codes)
+            distinct.append(None)
+        column_codes = array('i')
+        column_codes.frombytes(codes.astype(np.intc).tobytes())
+        return DictionaryColumn(column_codes, distinct)
+
+    @staticmethod
+    def _numeric_column(values: 'pd.Series') -> NumericColumn:
+        data = array('d')
+        data.frombytes(values.to_numpy(dtype=np.float64).tobytes())
+        return NumericColumn(data)
+
+
+def _parse_file(workbook: Tuple[str, str]) -> Optional[Tuple[EmbalagemBatch, List[Dict]]]:
+    """Tarefa executada nos processos do pool (usa a instância global do processo filho)"""
+    filename, path = workbook
+    return upload_handler.parse_file(path, filename)
 
 # Instância global do handler
-upload_handler = UploadHandler()
\ No newline at end of file
+upload_handler = UploadHandler(
+    parse_workers=int(os.getenv('UPLOAD_PARSE_WORKERS', '0')) or None,
+    chunk_rows=int(os.getenv('UPLOAD_PARSE_CHUNK_ROWS', '10000')),
+    spool_dir=os.getenv('UPLOAD_SPOOL_DIR', 'data')
+)
@@ -0,0 +1,10 @@
+"""
+Ponto de entrada WSGI (perfil de produção por padrão)
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+os.environ.setdefault('APP_ENV', 'production')
+
+from app import app  # noqa: E402